@@ -0,0 +1,212 @@
+"""
+界面操作的统一执行者。
+图形界面的工作线程、定时任务以及 Flask 的请求线程都可能同时操作同一个微信，而每个操作都会移动真实鼠标、覆盖剪切板，同时进行会把消息打乱。
+UIActuator 是唯一真正执行界面操作的线程：各个来源提交的操作按来源分别排队，轮流执行（每个来源每轮执行一个），
+某个来源提交了大量操作（例如批量发送）时，其他来源的操作也能及时得到执行。提交操作时返回 Future，
+调用方在等待结果的同时可以继续做解析、渲染等不需要界面的工作。
+微信无响应或掉线时可以暂停执行（pause），已提交的操作继续排队，恢复（resume）后按原来的顺序执行。
+    actuator = UIActuator()
+    actuator.start()
+    wechat = actuator.bind(WeChat(path), "gui")    # 之后对 wechat 的调用都经过 actuator 执行
+    future = wechat.submit("send_msg", "文件传输助手", None, "你好")
+"""
+import contextlib
+import inspect
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Dict
+
+_END = object()
+
+
+class UIActuator(threading.Thread):
+    def __init__(self, name: str = "ui-actuator"):
+        super().__init__(daemon=True, name=name)
+        # 来源 -> 等待执行的操作，按轮转顺序排列
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._cond = threading.Condition()
+        self.running = True
+        # 已经开始执行的操作数量，操作执行期间可以读取，用来判断两次操作之间界面是否被其他操作改变过
+        self.sequence = 0
+        self.current_source = None
+        # 最近一次操作结束的时间，用来判断界面是否空闲
+        self.last_active = time.time()
+        # 暂停的原因，None 代表正常执行
+        self.paused = None
+        self.executed = Counter()
+        self.wait_seconds = Counter()
+        self.run_seconds = Counter()
+
+    def submit(self, source: str, func: Callable, *args, **kwargs) -> Future:
+        """
+        提交一个操作
+        Args:
+            source: 操作的来源，例如 "gui"、"http"、"clock"，不同来源之间轮流执行
+            func: 要执行的函数
+        Return:
+            future: 操作的结果
+        """
+        future = Future()
+        # 操作内部再次提交时直接执行，不能等待自己
+        if threading.current_thread() is self:
+            self._execute(source, func, args, kwargs, future, time.time())
+            return future
+
+        with self._cond:
+            if not self.running:
+                raise RuntimeError("UIActuator 已经停止")
+            self._queues.setdefault(source, deque()).append((func, args, kwargs, future, time.time()))
+            self._cond.notify()
+        return future
+
+    def call(self, source: str, func: Callable, *args, **kwargs):
+        """提交一个操作并等待结果"""
+        return self.submit(source, func, *args, **kwargs).result()
+
+    def bind(self, target, source: str) -> "ActuatedProxy":
+        """
+        返回 target 的代理，对代理的方法调用都以 source 的名义经过 actuator 执行
+        """
+        return ActuatedProxy(target, self, source)
+
+    def pending(self) -> Dict[str, int]:
+        with self._cond:
+            return {source: len(q) for source, q in self._queues.items() if q}
+
+    def stats(self) -> Dict:
+        return {
+            "sequence": self.sequence,
+            "current_source": self.current_source,
+            "paused": self.paused,
+            "pending": self.pending(),
+            "executed": dict(self.executed),
+            "avg_wait_seconds": {s: self.wait_seconds[s] / n for s, n in self.executed.items() if n},
+            "avg_run_seconds": {s: self.run_seconds[s] / n for s, n in self.executed.items() if n},
+        }
+
+    def pause(self, reason: str = "") -> None:
+        """暂停执行，正在执行的操作不受影响，之后的操作继续排队，直到 resume"""
+        with self._cond:
+            self.paused = reason
+
+    def resume(self) -> None:
+        with self._cond:
+            self.paused = None
+            self._cond.notify_all()
+
+    def stop(self) -> None:
+        """停止执行，尚未执行的操作被取消"""
+        with self._cond:
+            self.running = False
+            for q in self._queues.values():
+                for job in q:
+                    job[3].cancel()
+                q.clear()
+            self._cond.notify_all()
+
+    def _next_job(self):
+        with self._cond:
+            while self.running and (self.paused is not None or not any(self._queues.values())):
+                self._cond.wait()
+            if not self.running:
+                return None
+            # 取第一个有操作的来源，执行后把它移到队尾，实现来源之间的轮转
+            for source, q in self._queues.items():
+                if q:
+                    self._queues.move_to_end(source)
+                    return (source,) + q.popleft()
+
+    def _execute(self, source, func, args, kwargs, future, queued_at):
+        if not future.set_running_or_notify_cancel():
+            return
+        self.sequence += 1
+        previous, self.current_source = self.current_source, source
+        self.executed[source] += 1
+        self.wait_seconds[source] += time.time() - queued_at
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self._finish(source, future, start)
+            future.set_exception(e)
+        else:
+            self._finish(source, future, start)
+            future.set_result(result)
+        finally:
+            self.current_source = previous
+            self.last_active = time.time()
+
+    def _fail_pending(self, error: BaseException) -> None:
+        """线程退出时让还在排队的操作得到异常，而不是一直等待"""
+        with self._cond:
+            self.running = False
+            for q in self._queues.values():
+                for job in q:
+                    if job[3].set_running_or_notify_cancel():
+                        job[3].set_exception(error)
+                q.clear()
+            self._cond.notify_all()
+
+    def _finish(self, source, future, start):
+        # 操作本身的耗时（不含排队等待），在结果可见之前记录到 future.run_seconds
+        future.run_seconds = time.perf_counter() - start
+        self.run_seconds[source] += future.run_seconds
+
+    def run(self):
+        # 没有安装 uiautomation（例如在 Linux 上使用模拟的微信）时不需要初始化 COM
+        try:
+            import uiautomation as auto
+            initializer = auto.UIAutomationInitializerInThread()
+        except ImportError:
+            initializer = contextlib.nullcontext()
+
+        error = RuntimeError("UIActuator 已经停止")
+        try:
+            # uiautomation 需要在每个线程中初始化 COM
+            with initializer:
+                while True:
+                    job = self._next_job()
+                    if job is None:
+                        break
+                    self._execute(*job)
+        except BaseException as e:
+            error = RuntimeError(f"UIActuator 异常退出：{e}")
+            raise
+        finally:
+            self._fail_pending(error)
+
+
+class ActuatedProxy:
+    """
+    把对象（通常是 WeChat）的方法调用转交给 UIActuator 执行，属性的读写直接作用于原对象。
+    生成器方法（例如 iter_dialogs）的每一步都作为单独的操作执行，两步之间其他来源的操作可以插入
+    """
+    def __init__(self, target, actuator: UIActuator, source: str):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_actuator", actuator)
+        object.__setattr__(self, "_source", source)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        if inspect.isgeneratorfunction(getattr(type(self._target), name, None)):
+            return lambda *args, **kwargs: self._iterate(attr, args, kwargs)
+        return lambda *args, **kwargs: self._actuator.call(self._source, attr, *args, **kwargs)
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def submit(self, method: str, *args, **kwargs) -> Future:
+        """提交一次方法调用，不等待结果"""
+        return self._actuator.submit(self._source, getattr(self._target, method), *args, **kwargs)
+
+    def _iterate(self, func, args, kwargs):
+        generator = func(*args, **kwargs)
+        while True:
+            item = self._actuator.call(self._source, next, generator, _END)
+            if item is _END:
+                return
+            yield item
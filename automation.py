@@ -19,6 +19,9 @@ def usage():
 <Color=Cyan>-n</Color>      show control full <Color=Cyan>name</Color>, if it is null, show first 30 characters of control's name in console,
         always show full name in log file @AutomationLog.txt
 <Color=Cyan>-p</Color>      show <Color=Cyan>process id</Color> of controls
+<Color=Cyan>-j</Color>      fast <Color=Cyan>json</Color> dump, write the tree to a JSON Lines file instead of logging it (gzip if the file ends with .gz)
+<Color=Cyan>-s</Color>      only dump the <Color=Cyan>subtree</Color> of controls matching ControlType or ControlType:Name, used with -j
+<Color=Cyan>--diff</Color>  compare two dumps and show controls which moved depth or changed name, optional --type=ControlType
 
 if <Color=Red>UnicodeError</Color> or <Color=Red>LookupError</Color> occurred when printing,
 try to change the active code page of console window by using <Color=Cyan>chcp</Color> or see the log file <Color=Cyan>@AutomationLog.txt</Color>
@@ -30,16 +33,41 @@ examples:
 automation.py -t3
 automation.py -t3 -r -d1 -m -n
 automation.py -c -t3
+automation.py -t3 -j wechat.jsonl
+automation.py -t3 -j wechat.jsonl.gz -s "ListControl:消息"
+automation.py --diff old.jsonl new.jsonl --type=ButtonControl
 
 """, writeToFile=False)
 
 
+def dumpControl(control, path, depth, subtree):
+    import tree_dump
+    start = time.time()
+    count = tree_dump.dump_tree(control, path, depth, subtree)
+    auto.Logger.ColorfullyWrite('dumped <Color=Cyan>{}</Color> controls to <Color=Cyan>{}</Color> in {:.2f} seconds\n'.format(
+        count, path, time.time() - start), writeToFile=False)
+
+
+def diffDumps(paths, controlType):
+    import tree_dump
+    if len(paths) != 2:
+        auto.Logger.Write('--diff needs two dump files\n', auto.ConsoleColor.Yellow, writeToFile=False)
+        sys.exit(1)
+    _, old = tree_dump.load_dump(paths[0])
+    _, new = tree_dump.load_dump(paths[1])
+    colors = {'moved': 'Yellow', 'renamed': 'Cyan', 'added': 'Green', 'removed': 'Red'}
+    changes = tree_dump.diff_dumps(old, new, controlType)
+    for kind, desc in changes:
+        auto.Logger.ColorfullyWrite('<Color={}>{:8}</Color> {}\n'.format(colors[kind], kind, desc), writeToFile=False)
+    auto.Logger.Write('{} changes\n'.format(len(changes)), writeToFile=False)
+
+
 def main():
     import getopt
     auto.Logger.Write('UIAutomation {} (Python {}.{}.{}, {} bit)\n'.format(auto.VERSION, sys.version_info.major, sys.version_info.minor, sys.version_info.micro, 64 if sys.maxsize > 0xFFFFFFFF else 32))
-    options, args = getopt.getopt(sys.argv[1:], 'hrfcanpd:t:',
+    options, args = getopt.getopt(sys.argv[1:], 'hrfcanpd:t:j:s:',
                                   ['help', 'root', 'focus', 'cursor', 'ancestor', 'showAllName', 'depth=',
-                                   'time='])
+                                   'time=', 'json=', 'subtree=', 'diff', 'type='])
     root = False
     focus = False
     cursor = False
@@ -49,6 +77,10 @@ def main():
     depth = 0xFFFFFFFF
     seconds = 3
     showPid = False
+    jsonPath = None
+    subtree = None
+    diff = False
+    controlType = None
     for (o, v) in options:
         if o in ('-h', '-help'):
             usage()
@@ -73,6 +105,17 @@ def main():
             depth = int(v)
         elif o in ('-t', '-time'):
             seconds = int(v)
+        elif o in ('-j', '--json'):
+            jsonPath = v
+        elif o in ('-s', '--subtree'):
+            subtree = v
+        elif o == '--diff':
+            diff = True
+        elif o == '--type':
+            controlType = v
+    if diff:
+        diffDumps(args, controlType)
+        return
     if seconds > 0:
         auto.Logger.Write('please wait for {0} seconds\n\n'.format(seconds), writeToFile=False)
         time.sleep(seconds)
@@ -109,8 +152,12 @@ def main():
                 control = controlList[1]
                 if foreground:
                     indent = 1
-                    auto.LogControl(controlList[0], 0, showAllName, showPid)
-        auto.EnumAndLogControl(control, depth, showAllName, showPid, startDepth=indent)
+                    if not jsonPath:
+                        auto.LogControl(controlList[0], 0, showAllName, showPid)
+        if jsonPath:
+            dumpControl(control, jsonPath, depth, subtree)
+        else:
+            auto.EnumAndLogControl(control, depth, showAllName, showPid, startDepth=indent)
     auto.Logger.Log('Ends\n')
 
 
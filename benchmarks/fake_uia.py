@@ -0,0 +1,390 @@
+"""
+uiautomation 的脚本化替身，只实现 ui_auto_wechat 用到的部分接口。
+控件树完全在内存中，由 fake_wechat.py 搭建；每次跨进程调用（搜索访问的节点、GetChildren、属性读取、
+点击、按键、剪切板写入）都会计入 STATS，用于衡量各个操作真正发起了多少次 UI 调用。
+install() 会把本模块注册为 uiautomation，并替换剪切板、pyautogui 等桌面相关的模块，保证基准测试不会动到真实桌面。
+"""
+import contextlib
+import re
+import sys
+import time
+import types
+import weakref
+from collections import Counter
+
+# 调用计数
+STATS = Counter()
+
+# 被替换前的 time.sleep
+_real_sleep = time.sleep
+
+_desktop = None
+_foreground = None
+_focused = None
+_registry = weakref.WeakValueDictionary()
+_serial = 0
+
+# 模拟的剪切板内容
+clipboard = {"text": "", "files": None}
+
+VERSION = "fake"
+
+
+def _count(kind: str, n: int = 1) -> None:
+    STATS[kind] += n
+    STATS["ui_calls"] += n
+
+
+def reset_stats() -> None:
+    STATS.clear()
+
+
+class Rect:
+    def __init__(self, left, top, right, bottom):
+        self.left, self.top, self.right, self.bottom = left, top, right, bottom
+
+    def width(self):
+        return self.right - self.left
+
+    def height(self):
+        return self.bottom - self.top
+
+
+class ScrollPattern:
+    """模拟的 ScrollPattern，滚动时调用 on_scroll(percent)"""
+    def __init__(self, on_scroll, view_size: float = 100.0):
+        self.on_scroll = on_scroll
+        self.VerticalScrollPercent = 0.0
+        self.VerticalViewSize = view_size
+
+    def SetScrollPercent(self, horizontalPercent, verticalPercent, waitTime=0):
+        _count("scroll")
+        if verticalPercent >= 0:
+            self.VerticalScrollPercent = verticalPercent * 100 if verticalPercent <= 1 else verticalPercent
+            self.on_scroll(min(1.0, self.VerticalScrollPercent / 100))
+        return True
+
+
+class PatternId:
+    InvokePattern = 10000
+    ValuePattern = 10002
+
+
+class InvokePattern:
+    """模拟的 InvokePattern，Invoke 时调用 on_invoke()"""
+    def __init__(self, on_invoke):
+        self.on_invoke = on_invoke
+
+    def Invoke(self, waitTime=0):
+        _count("pattern")
+        self.on_invoke()
+        return True
+
+
+class ValuePattern:
+    """模拟的 ValuePattern，读写通过 getter 和 setter"""
+    def __init__(self, getter, setter, read_only: bool = False):
+        self.getter = getter
+        self.setter = setter
+        self.IsReadOnly = read_only
+
+    @property
+    def Value(self):
+        _count("pattern")
+        return self.getter()
+
+    def SetValue(self, value, waitTime=0):
+        _count("pattern")
+        self.setter(value)
+        return True
+
+
+class Control:
+    ControlTypeName = "Control"
+
+    def __new__(cls, searchFromControl=None, foundIndex=1, Compare=None, **searchProperties):
+        # 与 uiautomation 一样，直接构造控件代表按条件搜索
+        return _search(cls, searchFromControl or _desktop, foundIndex, Compare, searchProperties)
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    @classmethod
+    def node(cls, name: str = "", children=(), provider=None, class_name: str = "", **attrs):
+        """
+        创建控件树中的节点
+        Args:
+            name: 控件名称
+            children: 固定的子控件
+            provider: 返回当前子控件列表的函数，用于会随界面状态变化的列表
+        """
+        global _serial
+        obj = object.__new__(cls)
+        _serial += 1
+        obj._serial = _serial
+        obj._name = name
+        obj._children = list(children)
+        obj._provider = provider
+        obj._parent = None
+        obj.ClassName = class_name
+        obj.AutomationId = ""
+        obj.ProcessId = attrs.pop("process_id", 1000)
+        obj.NativeWindowHandle = attrs.pop("handle", 0)
+        obj.on_click = None
+        obj.on_double_click = None
+        obj.on_keys = None
+        obj.scroll_pattern = None
+        # PatternId -> 支持的模式
+        obj.patterns = {}
+        for key, value in attrs.items():
+            setattr(obj, key, value)
+        for child in obj._children:
+            child._parent = obj
+        _registry[obj._serial] = obj
+        return obj
+
+    @property
+    def Name(self):
+        _count("property")
+        return self._name
+
+    @property
+    def BoundingRectangle(self):
+        _count("property")
+        return Rect(self._serial, 0, self._serial + 1, 1)
+
+    def _kids(self):
+        if self._provider is not None:
+            children = self._provider()
+            for child in children:
+                child._parent = self
+            return children
+        return self._children
+
+    def GetChildren(self):
+        children = self._kids()
+        _count("get_children", 1 + len(children))
+        return list(children)
+
+    def GetFirstChildControl(self):
+        _count("get_children")
+        children = self._kids()
+        return children[0] if children else None
+
+    def GetLastChildControl(self):
+        _count("get_children")
+        children = self._kids()
+        return children[-1] if children else None
+
+    def GetParentControl(self):
+        _count("get_parent")
+        return self._parent
+
+    def GetPosition(self):
+        _count("property")
+        return self._serial, 0
+
+    def GetScrollPattern(self):
+        _count("pattern")
+        return self.scroll_pattern
+
+    def GetPattern(self, patternId):
+        _count("pattern")
+        return self.patterns.get(patternId)
+
+    def Exists(self, maxSearchSeconds=0, searchIntervalSeconds=0):
+        return True
+
+    def SetActive(self, waitTime=0):
+        global _foreground
+        _count("activate")
+        _foreground = self
+        return True
+
+    def SendKeys(self, text, interval=0.01, waitTime=0, charMode=True):
+        global _focused
+        _focused = self
+        SendKeys(text)
+
+    def Click(self, *args, **kwargs):
+        Click(self._serial, 0)
+
+    def DoubleClick(self, *args, **kwargs):
+        _count("click")
+        if self.on_double_click is not None:
+            self.on_double_click()
+
+    def __getattr__(self, item):
+        # control.ButtonControl(...) 在子孙控件中搜索
+        cls = globals().get(item)
+        if isinstance(cls, type) and issubclass(cls, Control):
+            return lambda **kwargs: cls(searchFromControl=self, **kwargs)
+        raise AttributeError(item)
+
+
+def _search(cls, root, foundIndex, compare, props):
+    depth_limit = props.pop("Depth", None)
+    name = props.pop("Name", None)
+    props.pop("searchDepth", None)
+    _count("search")
+
+    found = 0
+    stack = [(child, 1) for child in reversed(root._kids())]
+    while stack:
+        node, depth = stack.pop()
+        _count("search_visit")
+        if depth_limit is None or depth == depth_limit:
+            if (cls is Control or isinstance(node, cls)) and (name is None or node._name == name) \
+                    and (compare is None or compare(node, depth)):
+                found += 1
+                if found == foundIndex:
+                    return node
+        if depth_limit is None or depth < depth_limit:
+            stack.extend((child, depth + 1) for child in reversed(node._kids()))
+    STATS["search_miss"] += 1
+    raise LookupError(f"Find Control Timeout: {cls.__name__}({name!r}, Depth={depth_limit})")
+
+
+# ui_auto_wechat 用到的控件类型
+for _type_name in ["WindowControl", "PaneControl", "ButtonControl", "EditControl", "ListControl",
+                   "ListItemControl", "TextControl", "TabItemControl", "MenuItemControl", "DocumentControl"]:
+    globals()[_type_name] = type(_type_name, (Control,), {"ControlTypeName": _type_name})
+
+ControlTypeNames = {}
+
+
+def GetRootControl():
+    return _desktop
+
+
+def GetForegroundControl():
+    _count("foreground")
+    return _foreground
+
+
+def GetFocusedControl():
+    _count("focused")
+    return _focused
+
+
+def ControlFromHandle(handle):
+    _count("from_handle")
+    for control in list(_registry.values()):
+        if control.NativeWindowHandle == handle:
+            return control
+    return None
+
+
+def ControlsAreSame(control1, control2):
+    return control1 is control2
+
+
+def SetCursorPos(x, y):
+    _count("cursor")
+
+
+def Click(x, y, waitTime=0):
+    global _focused
+    _count("click")
+    control = _registry.get(x)
+    if control is None:
+        return
+    _focused = control
+    if control.on_click is not None:
+        control.on_click()
+
+
+def RightClick(x, y, waitTime=0):
+    _count("click")
+
+
+def SendKeys(text, interval=0.01, waitTime=0, charMode=True):
+    _count("keys")
+    target = _focused
+    while target is not None and target.on_keys is None:
+        target = target._parent
+    if target is not None:
+        for special, char in re.findall(r"\{(\w+)\}|(.)", text, re.S):
+            target.on_keys(special.lower() if special else None, char)
+
+
+def PostMessage(handle, msg, wParam, lParam):
+    _count("post_message")
+    return True
+
+
+def IsIconic(handle):
+    return False
+
+
+def ShowWindow(handle, cmdShow):
+    return True
+
+
+class SW:
+    ShowNoActivate = 4
+
+
+SpecialKeyNames = {"ENTER": 0x0D, "UP": 0x26, "CTRL": 0x11, "V": 0x56}
+
+
+@contextlib.contextmanager
+def UIAutomationInitializerInThread(debug=False):
+    yield
+
+
+def set_desktop(desktop, foreground=None):
+    """设置模拟桌面的根控件和前台窗口"""
+    global _desktop, _foreground, _focused
+    _desktop = desktop
+    _foreground = foreground
+    _focused = foreground
+
+
+def _virtual_sleep(seconds):
+    STATS["sleeps"] += 1
+    STATS["sleep_ms"] += int(seconds * 1000)
+
+
+def install(virtual_sleep: bool = True) -> None:
+    """
+    注册为 uiautomation 并替换桌面相关模块
+    Args:
+        virtual_sleep: 是否把 time.sleep 换成只计数不等待的版本
+    """
+    module = sys.modules[__name__]
+    sys.modules["uiautomation"] = module
+
+    # 剪切板
+    win32clipboard = types.ModuleType("win32clipboard")
+    win32clipboard.CF_HDROP = 15
+    win32clipboard.OpenClipboard = lambda *args: None
+    win32clipboard.CloseClipboard = lambda: None
+    win32clipboard.EmptyClipboard = lambda: None
+
+    def set_clipboard_data(fmt, data):
+        _count("clipboard")
+        clipboard["files"] = data
+        clipboard["text"] = ""
+
+    win32clipboard.SetClipboardData = set_clipboard_data
+    win32clipboard.GetClipboardData = lambda fmt: clipboard["files"]
+    sys.modules["win32clipboard"] = win32clipboard
+
+    import pyperclip
+
+    def copy(text):
+        _count("clipboard")
+        clipboard["text"] = text
+        clipboard["files"] = None
+
+    pyperclip.copy = copy
+    pyperclip.paste = lambda: clipboard["text"]
+
+    # 鼠标滚轮
+    pyautogui = types.ModuleType("pyautogui")
+    pyautogui.scroll = lambda clicks, *args, **kwargs: _count("scroll")
+    sys.modules["pyautogui"] = pyautogui
+
+    if virtual_sleep:
+        time.sleep = _virtual_sleep
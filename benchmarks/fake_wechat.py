@@ -0,0 +1,303 @@
+"""
+在 fake_uia 上搭建的模拟微信，控件深度与 ui_auto_wechat.py 注释中记录的真实微信一致。
+支持搜索联系人、粘贴和发送消息、分页加载聊天记录（“查看更多消息”）、通讯录管理界面的滚动读取以及新消息提示。
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import fake_uia as auto
+from wechat_locale import WeChatLocale
+
+# 每次点击“查看更多消息”加载的条数，以及界面上同时可见的列表行数
+PAGE_SIZE = 30
+VISIBLE_ROWS = 20
+# 每隔多少条消息出现一个时间信息
+TIME_BLOCK = 8
+# 相邻两条聊天记录之间相隔的分钟数
+MESSAGE_MINUTES = 3
+
+_WEEKDAYS = {"en-US": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+             "zh-CN": ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"],
+             "zh-TW": ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]}
+
+
+def time_header(when: datetime, now: datetime, locale: str) -> str:
+    """
+    按微信的规则显示时间信息：当天只显示时间，然后是昨天、一周以内的星期几，更早的显示完整日期
+    """
+    clock = when.strftime("%H:%M")
+    days = (now.date() - when.date()).days
+    if days == 0:
+        return clock
+    if days == 1:
+        return f"{'Yesterday' if locale == 'en-US' else '昨天'} {clock}"
+    if days < 7:
+        return f"{_WEEKDAYS[locale][when.weekday()]} {clock}"
+    if locale == "en-US":
+        return f"{when.month}/{when.day}/{when.year % 100:02d} {clock}"
+    return f"{when.year}年{when.month}月{when.day}日 {clock}"
+
+
+def _chain(depth_from: int, depth_to: int, leaf):
+    """
+    用多层 PaneControl 把 leaf 放到指定深度，depth_from 为第一层 Pane 的深度
+    """
+    node = leaf
+    for _ in range(depth_to - depth_from):
+        node = auto.PaneControl.node("", [node])
+    return node
+
+
+class FakeWeChatApp:
+    def __init__(self, n_contacts: int = 5000, n_groups: int = 800, n_history: int = 10000,
+                 n_chats: int = 200, n_unread: int = 20, locale: str = "zh-CN", seed: int = 0,
+                 patterns: bool = True):
+        """
+        Args:
+            n_contacts: 通讯录联系人数量
+            n_groups: 群聊数量
+            n_history: 每个聊天的历史消息数量
+            n_chats: 左侧会话列表中的会话数量
+            n_unread: 有新消息的会话数量
+            patterns: 搜索框、输入框、发送按钮和列表项是否支持 ValuePattern、InvokePattern
+        """
+        self.patterns = patterns
+        self.lc = WeChatLocale(locale)
+        self.locale = locale
+        # 最后一条聊天记录的时间，更早的记录每条往前 MESSAGE_MINUTES 分钟
+        self.now = datetime.now().replace(second=0, microsecond=0)
+        self.rng = random.Random(seed)
+        self.n_history = n_history
+        self.contacts = [(f"联系人{i:05d}", f"备注{i}", f"标签{i % 17}") for i in range(n_contacts)]
+        self.groups = [(f"群聊{i:04d}、成员{i % 7}", 3 + i % 400) for i in range(n_groups)]
+        self.chats = [name for name, _, _ in self.contacts[:n_chats]]
+        self.unread = set(self.rng.sample(self.chats, min(n_unread, len(self.chats))))
+        # 搜索框可以搜到的名称（顿号替换为空格后） -> 聊天名称
+        targets = self.chats + [name for name, _, _ in self.contacts] + [name for name, _ in self.groups]
+        self._target_keys = {name.replace("、", " "): name for name in targets}
+        self.histories: Dict[str, List] = {}
+        self.loaded: Dict[str, int] = {}
+
+        self.current_chat = None
+        self.search_text = ""
+        self.edit_buffer = ""
+        self.manager_mode = "contacts"
+        self.manager_offset = 0
+        self.chat_top = 0
+
+        self._build()
+
+    # ---------- 数据 ----------
+    def _history(self, chat: str) -> List:
+        if chat not in self.histories:
+            history = []
+            for i in range(self.n_history):
+                if i % TIME_BLOCK == 0:
+                    history.append(("time", "", time_header(self.message_time(i), self.now, self.locale)))
+                elif i % 97 == 0:
+                    history.append(("marker", "", f"{chat}{self.lc.recalled}"))
+                else:
+                    history.append(("user", chat if i % 3 else "我", f"消息{i}"))
+            self.histories[chat] = history
+            self.loaded[chat] = PAGE_SIZE
+        return self.histories[chat]
+
+    def message_time(self, i: int) -> datetime:
+        """第 i 条聊天记录（从最早的一条开始数）的时间"""
+        return self.now - timedelta(minutes=(self.n_history - 1 - i) * MESSAGE_MINUTES)
+
+    # ---------- 控件 ----------
+    def _message_item(self, kind: str, sender: str, text: str):
+        if kind == "time":
+            return auto.ListItemControl.node(text, [auto.TextControl.node(text)])
+        if kind == "user":
+            content = auto.PaneControl.node("", [auto.TextControl.node(text)])
+            return auto.ListItemControl.node(text, [auto.PaneControl.node("", [
+                auto.ButtonControl.node(sender), content])])
+        return auto.ListItemControl.node(text, [auto.PaneControl.node("", [])])
+
+    def _messages(self):
+        if self.current_chat is None:
+            return []
+        history = self._history(self.current_chat)
+        loaded = min(self.loaded[self.current_chat], len(history))
+        items = [self._message_item(*msg) for msg in history[len(history) - loaded:]]
+        if loaded < len(history):
+            more = auto.ListItemControl.node(self.lc.view_more_messages, [auto.PaneControl.node("", [])])
+            more.on_click = self._load_more
+            self._add_invoke(more)
+            items.insert(0, more)
+        return items
+
+    def _load_more(self):
+        self.loaded[self.current_chat] += PAGE_SIZE
+
+    def _chat_items(self):
+        items = []
+        order = self.chats[self.chat_top:] + self.chats[:self.chat_top]
+        for name in order:
+            badges = [auto.TextControl.node(""), auto.TextControl.node(""), auto.TextControl.node("1")]
+            pane = auto.PaneControl.node("", badges if name in self.unread else badges[:2])
+            item = auto.ListItemControl.node(name, [pane, auto.ButtonControl.node(name)])
+            item.on_click = lambda name=name: self._open_chat(name)
+            self._add_invoke(item)
+            items.append(item)
+        return items
+
+    def _add_invoke(self, control) -> None:
+        if self.patterns:
+            control.patterns[auto.PatternId.InvokePattern] = auto.InvokePattern(control.on_click)
+
+    def _set_search_text(self, text: str) -> None:
+        self.search_text = text
+
+    def _set_edit_buffer(self, text: str) -> None:
+        self.edit_buffer = text
+
+    def _next_unread(self):
+        # 双击“聊天”按钮跳转到下一个有新消息的会话
+        for i, name in enumerate(self.chats):
+            if name in self.unread:
+                self.chat_top = i
+                return
+
+    def _open_chat(self, name: str):
+        self.unread.discard(name)
+        self.current_chat = name
+        self._history(name)
+        # 与真实微信相同，输入框和聊天标题的名称就是当前聊天的名称
+        self.message_edit._name = name
+        self.chat_title._name = name
+
+    def _search_hit(self, text: str):
+        """搜索框中回车打开的聊天：完全匹配的名称，否则是第一个包含搜索内容的名称（顿号按空格处理）"""
+        if text in self._target_keys:
+            return self._target_keys[text]
+        return next((name for key, name in self._target_keys.items() if text in key), None)
+
+    def _manager_rows(self):
+        if self.manager_mode == "contacts":
+            rows = self.contacts[self.manager_offset:self.manager_offset + VISIBLE_ROWS]
+            return [auto.ListItemControl.node("", [
+                auto.ButtonControl.node(""), auto.TextControl.node(name),
+                auto.ButtonControl.node(note), auto.ButtonControl.node(label)]) for name, note, label in rows]
+        rows = self.groups[self.manager_offset:self.manager_offset + VISIBLE_ROWS]
+        return [auto.ListItemControl.node("", [
+            auto.ButtonControl.node(""), auto.TextControl.node(name), auto.TextControl.node(f"({members})")])
+            for name, members in rows]
+
+    def _manager_scroll(self, percent: float):
+        total = len(self.contacts) if self.manager_mode == "contacts" else len(self.groups)
+        self.manager_offset = int(round(percent * max(0, total - VISIBLE_ROWS)))
+
+    def _show_manager(self):
+        self.manager_mode = "contacts"
+        self.manager_offset = 0
+        self.manager_list.scroll_pattern.VerticalScrollPercent = 0.0
+        self.desktop._children.append(self.manager) if self.manager not in self.desktop._children else None
+        self.manager._parent = self.desktop
+        auto.set_desktop(self.desktop, self.manager)
+
+    def _show_groups(self):
+        self.manager_mode = "groups"
+        self.manager_offset = 0
+        # 与真实列表一样，VerticalViewSize 为可见部分占整个列表的百分比
+        self.manager_list.scroll_pattern.VerticalViewSize = min(100.0, VISIBLE_ROWS / max(1, len(self.groups)) * 100)
+
+    def _on_search_keys(self, special, char):
+        if special == "enter":
+            hit = self._search_hit(self.search_text)
+            self.search_text = ""
+            if hit is None:
+                # 没有搜索结果时焦点留在搜索框
+                return
+            self._open_chat(hit)
+            auto._focused = self.message_edit
+        elif special == "ctrl":
+            pass
+        elif char == "v" and auto.clipboard["text"]:
+            self.search_text += auto.clipboard["text"]
+        elif char:
+            self.search_text += char
+
+    def _on_edit_keys(self, special, char):
+        if special in ("ctrl", "up"):
+            return
+        if special == "enter":
+            return
+        if char == "v":
+            self.edit_buffer += auto.clipboard["text"] or "[文件]"
+        elif char:
+            self.edit_buffer += char
+
+    def _send(self):
+        if self.current_chat is None or not self.edit_buffer:
+            return
+        history = self._history(self.current_chat)
+        history.append(("user", "我", self.edit_buffer))
+        self.loaded[self.current_chat] += 1
+        self.edit_buffer = ""
+
+    def _build(self):
+        lc = self.lc
+        # 左侧导航
+        chats_button = auto.ButtonControl.node(lc.chats)
+        chats_button.on_double_click = self._next_unread
+        contacts_button = auto.ButtonControl.node(lc.contacts)
+        navigation = _chain(2, 4, auto.PaneControl.node("", [chats_button, contacts_button]))
+
+        # 搜索框，深度 8
+        self.search_box = auto.EditControl.node(lc.search)
+        self.search_box.on_keys = self._on_search_keys
+        search = _chain(2, 8, self.search_box)
+
+        # 会话列表，列表项深度 10
+        chat_list = auto.ListControl.node("会话", provider=self._chat_items)
+        sessions = _chain(2, 9, chat_list)
+
+        # 通讯录列表中的“通讯录管理”按钮
+        manage_button = auto.ButtonControl.node(lc.manage_contacts)
+        manage_button.on_click = self._show_manager
+        contact_list = auto.ListControl.node(lc.contact, [manage_button])
+        contact_list.scroll_pattern = auto.ScrollPattern(lambda percent: None)
+        contacts = _chain(2, 9, contact_list)
+
+        # 聊天区域：消息列表、聊天记录按钮（深度 14）、输入框以及发送按钮（深度 15）
+        self.message_list = auto.ListControl.node(lc.message, provider=self._messages)
+        self.message_list.scroll_pattern = auto.ScrollPattern(lambda percent: None)
+        self.message_edit = auto.EditControl.node("输入")
+        self.message_edit.on_keys = self._on_edit_keys
+        send_button = auto.ButtonControl.node(lc.send)
+        send_button.on_click = self._send
+        self._add_invoke(send_button)
+        if self.patterns:
+            self.search_box.patterns[auto.PatternId.ValuePattern] = auto.ValuePattern(
+                lambda: self.search_text, self._set_search_text)
+            self.message_edit.patterns[auto.PatternId.ValuePattern] = auto.ValuePattern(
+                lambda: self.edit_buffer, self._set_edit_buffer)
+        history_button = auto.ButtonControl.node(lc.chat_history)
+        # 聊天标题（深度 14）
+        self.chat_title = auto.ButtonControl.node("")
+        chat_area = auto.PaneControl.node("", [
+            _chain(3, 12, self.message_list),
+            _chain(3, 14, history_button),
+            _chain(3, 14, self.message_edit),
+            _chain(3, 15, send_button),
+            _chain(3, 14, self.chat_title),
+        ])
+
+        self.window = auto.WindowControl.node(lc.weixin, [navigation, search, sessions, contacts, chat_area],
+                                              class_name="WeChatMainWndForPC", handle=0x1001, process_id=4242)
+
+        # 通讯录管理窗口
+        groups_button = auto.ButtonControl.node(lc.recent_group_chats)
+        groups_button.on_click = self._show_groups
+        self.manager_list = auto.ListControl.node("", provider=self._manager_rows)
+        self.manager_list.scroll_pattern = auto.ScrollPattern(self._manager_scroll)
+        self.manager = auto.WindowControl.node(lc.manage_contacts, [groups_button, self.manager_list],
+                                               handle=0x1002, process_id=4242)
+
+        self.desktop = auto.PaneControl.node("桌面", [self.window])
+        self.window._parent = self.desktop
+        auto.set_desktop(self.desktop, self.window)
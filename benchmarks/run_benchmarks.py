@@ -0,0 +1,240 @@
+"""
+WeChat 核心操作的基准测试。
+在 fake_wechat.py 搭建的模拟微信上（默认 5000 个联系人、800 个群聊、每个聊天 10000 条历史消息）运行各个操作，
+统计每次操作发起的 UI 调用次数、等待时间、耗时分位数，并与 baseline.json 中保存的基线比较。
+
+    python benchmarks/run_benchmarks.py                   # 运行全部操作并与基线比较，变慢时返回非零
+    python benchmarks/run_benchmarks.py -o get_dialogs    # 只运行指定操作
+    python benchmarks/run_benchmarks.py --save-baseline   # 把本次结果保存为新的基线
+
+“模拟耗时” = 实际耗时 + 代码中 sleep 的时间 + UI 调用次数 × 单次调用延迟（--call-latency），
+用来近似在真实微信上的耗时；与基线比较时使用 UI 调用次数和模拟耗时，不受测试机器快慢的影响太大。
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from datetime import timedelta
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# 无桌面环境下创建 QApplication
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import fake_uia
+
+fake_uia.install()
+
+import ui_auto_wechat
+from fake_wechat import MESSAGE_MINUTES, TIME_BLOCK, FakeWeChatApp
+from ui_auto_wechat import WeChat
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+
+class _FakePopen:
+    """打开微信时不启动任何进程"""
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+ui_auto_wechat.subprocess.Popen = _FakePopen
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    pos = (len(values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+# ---------- 各个操作 ----------
+def op_send_msg(wechat: WeChat, app: FakeWeChatApp, i: int):
+    name = app.chats[i % len(app.chats)]
+    assert wechat.send_msg(name, None, f"基准测试消息{i}")
+
+
+def op_send_file(wechat: WeChat, app: FakeWeChatApp, i: int):
+    wechat.send_file(app.chats[i % len(app.chats)], os.path.abspath(__file__))
+
+
+def op_send_files(wechat: WeChat, app: FakeWeChatApp, i: int):
+    # 同一批 10 个文件发送给 20 个聊天
+    paths = [os.path.abspath(__file__)] * 10
+    assert not wechat.send_files(app.chats[:20], paths)
+
+
+def op_get_dialogs(wechat: WeChat, app: FakeWeChatApp, i: int):
+    dialogs = wechat.get_dialogs(app.chats[i % len(app.chats)], 200)
+    assert len(dialogs) == 200
+
+
+def op_get_dialogs_by_time_blocks(wechat: WeChat, app: FakeWeChatApp, i: int):
+    groups = wechat.get_dialogs_by_time_blocks(app.chats[i % len(app.chats)], 20)
+    assert len(groups) == 20
+
+
+def op_get_dialogs_since(wechat: WeChat, app: FakeWeChatApp, i: int):
+    # 最近 24 小时的聊天记录，读取的数量应当与返回的数量相当
+    since = app.now - timedelta(hours=24)
+    dialogs = wechat.get_dialogs_since(app.chats[i % len(app.chats)], since, now=app.now)
+    assert dialogs and all(when >= since for _, _, _, when in dialogs)
+    assert len(dialogs) >= 24 * 60 // MESSAGE_MINUTES - TIME_BLOCK
+
+
+def op_find_all_contacts(wechat: WeChat, app: FakeWeChatApp, i: int):
+    contacts = wechat.find_all_contacts()
+    assert len(contacts) == len(app.contacts)
+
+
+def op_find_all_groups(wechat: WeChat, app: FakeWeChatApp, i: int):
+    groups = wechat.find_all_groups()
+    assert len(groups) == len(app.groups)
+
+
+def op_check_new_msg(wechat: WeChat, app: FakeWeChatApp, i: int):
+    wechat.check_new_msg()
+    assert not app.unread
+
+
+def _reset_unread(app: FakeWeChatApp):
+    app.unread = set(app.rng.sample(app.chats, 20))
+
+
+# 操作名: (函数, 默认重复次数, 每次运行前的准备)
+OPERATIONS: Dict[str, tuple] = {
+    "send_msg": (op_send_msg, 20, None),
+    "send_file": (op_send_file, 20, None),
+    "send_files": (op_send_files, 3, None),
+    "get_dialogs": (op_get_dialogs, 10, None),
+    "get_dialogs_by_time_blocks": (op_get_dialogs_by_time_blocks, 5, None),
+    "get_dialogs_since": (op_get_dialogs_since, 5, None),
+    "find_all_contacts": (op_find_all_contacts, 1, None),
+    "find_all_groups": (op_find_all_groups, 3, None),
+    "check_new_msg": (op_check_new_msg, 5, _reset_unread),
+}
+
+
+def run_operation(name: str, repeat: int, call_latency: float, sizes: Dict) -> Dict:
+    func, default_repeat, prepare = OPERATIONS[name]
+    repeat = repeat or default_repeat
+
+    # 每个操作使用新的模拟微信，互不影响
+    app = FakeWeChatApp(**sizes)
+    wechat = WeChat("WeChat.exe")
+
+    walls, modeled, calls, searches, sleeps = [], [], [], [], []
+    for i in range(repeat):
+        if prepare is not None:
+            prepare(app)
+        fake_uia.reset_stats()
+        start = time.perf_counter()
+        # 屏蔽被测代码中的 print
+        with contextlib.redirect_stdout(io.StringIO()):
+            func(wechat, app, i)
+        wall = time.perf_counter() - start
+
+        stats = fake_uia.STATS
+        walls.append(wall * 1000)
+        calls.append(stats["ui_calls"])
+        searches.append(stats["search_visit"])
+        sleeps.append(stats["sleep_ms"])
+        modeled.append(wall * 1000 + stats["sleep_ms"] + stats["ui_calls"] * call_latency)
+
+    return {
+        "runs": repeat,
+        "ui_calls": sum(calls) / repeat,
+        "search_visits": sum(searches) / repeat,
+        "sleep_ms": sum(sleeps) / repeat,
+        "wall_p50_ms": percentile(walls, 0.5),
+        "wall_p90_ms": percentile(walls, 0.9),
+        "wall_p99_ms": percentile(walls, 0.99),
+        "modeled_p50_ms": percentile(modeled, 0.5),
+        "modeled_p90_ms": percentile(modeled, 0.9),
+        "modeled_p99_ms": percentile(modeled, 0.99),
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """
+    与基线比较，返回变慢的操作说明
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key in ("ui_calls", "modeled_p50_ms"):
+            if base.get(key) and result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {base[key]:.1f} -> {result[key]:.1f} "
+                                   f"(+{(result[key] / base[key] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict], baseline: Dict[str, Dict]) -> None:
+    header = f"{'operation':<28}{'runs':>5}{'ui_calls':>12}{'sleep_ms':>10}" \
+             f"{'wall p50':>10}{'p90':>9}{'p99':>9}{'modeled p50':>13}{'p99':>10}{'baseline':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        base = baseline.get(name, {}).get("modeled_p50_ms")
+        print(f"{name:<28}{r['runs']:>5}{r['ui_calls']:>12.0f}{r['sleep_ms']:>10.0f}"
+              f"{r['wall_p50_ms']:>10.1f}{r['wall_p90_ms']:>9.1f}{r['wall_p99_ms']:>9.1f}"
+              f"{r['modeled_p50_ms']:>13.1f}{r['modeled_p99_ms']:>10.1f}"
+              f"{base if base is not None else float('nan'):>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WeChat 核心操作基准测试")
+    parser.add_argument("-o", "--operation", action="append", choices=list(OPERATIONS),
+                        help="只运行指定操作，可以重复指定")
+    parser.add_argument("-n", "--repeat", type=int, default=0, help="每个操作的运行次数，默认按操作设定")
+    parser.add_argument("--contacts", type=int, default=5000)
+    parser.add_argument("--groups", type=int, default=800)
+    parser.add_argument("--history", type=int, default=10000)
+    parser.add_argument("--call-latency", type=float, default=1.0, help="单次 UI 调用的模拟延迟（毫秒）")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument("--save-baseline", action="store_true", help="保存本次结果为基线")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许比基线慢的比例")
+    parser.add_argument("--json", default=None, help="把结果另存为 JSON 文件")
+    args = parser.parse_args()
+
+    sizes = {"n_contacts": args.contacts, "n_groups": args.groups, "n_history": args.history}
+    results = {}
+    for name in args.operation or list(OPERATIONS):
+        results[name] = run_operation(name, args.repeat, args.call_latency, sizes)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["operations"]
+
+    print_table(results, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"sizes": sizes, "call_latency": args.call_latency, "operations": baseline}, f, indent=4)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
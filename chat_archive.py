@@ -0,0 +1,280 @@
+"""
+聊天记录的本地归档。
+把 get_dialogs 返回的（信息类型，发送人，发送内容）连同所属的时间信息增量同步到 SQLite 中，并建立全文索引（FTS5）。
+每次同步只向上翻到已经保存的最后几条消息为止，只保存更新的消息；按关键词、发送人或时间范围的查询直接在本地完成，不需要操作微信。
+    python chat_archive.py sync 测试群 --path "D:\\Program Files (x86)\\WeChat\\WeChat.exe"
+    python chat_archive.py search --chat 测试群 --keyword 吃饭
+"""
+import argparse
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from time_header import to_datetime
+
+DEFAULT_DB = "chat_archive.db"
+
+# 不属于聊天内容的提示，不保存
+SKIPPED_TYPES = {'"查看更多消息"标志', '"以下是新消息"标志'}
+TIME_TYPE = '时间信息'
+
+# 用来确认新旧消息衔接位置的已保存消息数量
+ANCHOR_SIZE = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    chat TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    text TEXT NOT NULL,
+    time_header TEXT,
+    ts REAL,
+    synced_at REAL NOT NULL,
+    UNIQUE (chat, seq)
+);
+CREATE INDEX IF NOT EXISTS messages_sender ON messages (chat, sender);
+CREATE INDEX IF NOT EXISTS messages_ts ON messages (chat, ts);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, sender, content='messages', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, text, sender) VALUES (new.id, new.text, new.sender);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text, sender) VALUES ('delete', old.id, old.text, old.sender);
+END;
+"""
+
+def parse_time_header(header: str, now: datetime = None) -> Optional[float]:
+    """
+    把时间信息转换为时间戳，支持的格式见 time_header.py，无法识别时返回 None
+    """
+    parsed = to_datetime(header, now)
+    return parsed.timestamp() if parsed is not None else None
+
+
+class ChatArchive:
+    def __init__(self, db_path: str = DEFAULT_DB):
+        """
+        Args:
+            db_path: SQLite 数据库路径
+        """
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.conn:
+            self.conn.executescript(_SCHEMA)
+            # 部分 SQLite 没有编译 FTS5 或 trigram 分词，此时关键词查询退回到 LIKE
+            try:
+                self.conn.executescript(_FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError:
+                self.fts = False
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # ---------- 同步 ----------
+    def high_water_mark(self, chat: str) -> int:
+        """
+        已保存的最后一条消息的序号，没有记录时返回 0
+        """
+        row = self.conn.execute("SELECT MAX(seq) FROM messages WHERE chat = ?", (chat,)).fetchone()
+        return row[0] or 0
+
+    def _tail(self, chat: str, n: int) -> List[sqlite3.Row]:
+        """
+        已保存的最后 n 条消息，不包含时间信息（“18:30”第二天会显示为“昨天 18:30”，不能用来衔接）
+        """
+        rows = self.conn.execute(
+            "SELECT type, sender, text FROM messages WHERE chat = ? AND type != ? ORDER BY seq DESC LIMIT ?",
+            (chat, TIME_TYPE, n)).fetchall()
+        return rows[::-1]
+
+    def _last_header(self, chat: str) -> Tuple[Optional[str], Optional[float]]:
+        """已保存的最后一条消息所属的时间信息及其时间戳"""
+        row = self.conn.execute(
+            "SELECT time_header, ts FROM messages WHERE chat = ? ORDER BY seq DESC LIMIT 1", (chat,)).fetchone()
+        return (row["time_header"], row["ts"]) if row else (None, None)
+
+    @staticmethod
+    def _find_anchor(dialogs: Sequence[Tuple], anchor: Sequence[Tuple]) -> int:
+        """
+        在获取的聊天记录中查找已保存的最后几条消息（跳过时间信息），返回其后第一条新消息的下标，找不到时返回 -1
+        """
+        positions = [i for i, msg in enumerate(dialogs) if msg[0] != TIME_TYPE]
+        messages = [tuple(dialogs[i]) for i in positions]
+        k = len(anchor)
+        for end in range(len(messages), k - 1, -1):
+            if messages[end - k:end] == list(anchor):
+                return positions[end - 1] + 1
+        return -1
+
+    def sync(self, wechat, chat: str, batch: int = 50, initial: int = 1000, max_msgs: int = 20000) -> int:
+        """
+        把聊天记录中新的消息同步到本地
+        Args:
+            wechat: WeChat 实例
+            chat: 聊天窗口的名字
+            batch: 增量同步时第一次获取的消息数量，找不到已保存的消息时加倍
+            initial: 第一次同步时获取的消息数量
+            max_msgs: 单次同步最多获取的消息数量
+        Return:
+            count: 新保存的消息数量
+        """
+        anchor = [(r["type"], r["sender"], r["text"]) for r in self._tail(chat, ANCHOR_SIZE)]
+
+        n_msg = batch if anchor else initial
+        search_user = True
+        prev_len = -1
+        while True:
+            dialogs = [d for d in wechat.get_dialogs(chat, n_msg, search_user) if d[0] not in SKIPPED_TYPES]
+            search_user = False
+            start = self._find_anchor(dialogs, anchor) if anchor else 0
+            # 找到了衔接位置，或者已经没有更早的消息，或者达到上限
+            if start >= 0 or len(dialogs) == prev_len or n_msg >= max_msgs:
+                break
+            prev_len = len(dialogs)
+            n_msg = min(n_msg * 2, max_msgs)
+
+        # 为每条消息找到所属的时间信息，新消息之前没有时间信息时沿用已保存的最后一个及其时间戳，
+        # 不重新解析（“18:30”这样的相对时间在第二天解析会得到错误的日期）
+        header, ts = self._last_header(chat)
+        for msg in dialogs[:max(start, 0)]:
+            if msg[0] == TIME_TYPE:
+                header, ts = msg[2], parse_time_header(msg[2])
+        return self._append(chat, dialogs[max(start, 0):], header, ts, dedupe=start < 0 and bool(anchor))
+
+    def _exists(self, chat: str, msg_type: str, sender: str, text: str, ts: Optional[float]) -> bool:
+        if msg_type == TIME_TYPE:
+            # 时间信息的文字随日期变化，只比较时间戳
+            return self.conn.execute(
+                "SELECT 1 FROM messages WHERE chat = ? AND ts IS ? AND type = ? LIMIT 1",
+                (chat, ts, msg_type)).fetchone() is not None
+        return self.conn.execute(
+            "SELECT 1 FROM messages WHERE chat = ? AND ts IS ? AND type = ? AND sender = ? AND text = ? LIMIT 1",
+            (chat, ts, msg_type, sender, text)).fetchone() is not None
+
+    def _append(self, chat: str, dialogs: Sequence[Tuple], header: Optional[str], ts: Optional[float],
+                dedupe: bool = False) -> int:
+        """
+        Args:
+            header, ts: 第一条时间信息之前的消息所属的时间信息及其时间戳
+            dedupe: 找不到衔接位置时为 True，跳过时间和内容都与已保存记录相同的消息，而不是把整段聊天记录重复保存
+        """
+        now = time.time()
+        rows = []
+        with self.lock, self.conn:
+            seq = self.high_water_mark(chat)
+            for msg_type, sender, text in dialogs:
+                if msg_type == TIME_TYPE:
+                    header = text
+                    ts = parse_time_header(text)
+                if dedupe and self._exists(chat, msg_type, sender, text, ts):
+                    continue
+                seq += 1
+                rows.append((chat, seq, msg_type, sender, text, header, ts, now))
+            self.conn.executemany(
+                "INSERT INTO messages (chat, seq, type, sender, text, time_header, ts, synced_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    # ---------- 查询 ----------
+    def search(self, chat: str = None, keyword: str = None, sender: str = None,
+               start: float = None, end: float = None, limit: int = 100) -> List[Dict]:
+        """
+        在本地查询聊天记录，条件之间为“且”的关系
+        Args:
+            chat: 聊天窗口的名字
+            keyword: 内容中包含的关键词
+            sender: 发送人
+            start, end: 时间范围（时间戳），根据消息所属的时间信息判断
+            limit: 最多返回的数量（按时间倒序）
+        Return:
+            messages: [{"chat", "seq", "type", "sender", "text", "time_header", "ts"}, ...]
+        """
+        where, params = [], []
+        table = "messages m"
+        if keyword:
+            # trigram 分词要求关键词至少 3 个字符，更短的关键词使用 LIKE
+            if self.fts and len(keyword) >= 3:
+                table = "messages_fts f JOIN messages m ON m.id = f.rowid"
+                where.append("messages_fts MATCH ?")
+                params.append('text : "' + keyword.replace('"', '""') + '"')
+            else:
+                where.append("m.text LIKE ? ESCAPE '\\'")
+                params.append("%" + re.sub(r"([%_\\])", r"\\\1", keyword) + "%")
+        if chat is not None:
+            where.append("m.chat = ?")
+            params.append(chat)
+        if sender is not None:
+            where.append("m.sender = ?")
+            params.append(sender)
+        if start is not None:
+            where.append("m.ts >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("m.ts < ?")
+            params.append(end)
+
+        sql = f"SELECT m.chat, m.seq, m.type, m.sender, m.text, m.time_header, m.ts FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY m.chat, m.seq DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def chats(self) -> List[Dict]:
+        """
+        已归档的聊天及其消息数量
+        """
+        rows = self.conn.execute(
+            "SELECT chat, COUNT(*) AS count, MAX(synced_at) AS synced_at FROM messages GROUP BY chat").fetchall()
+        return [dict(row) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="聊天记录本地归档")
+    parser.add_argument("--db", default=DEFAULT_DB, help="数据库路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = subparsers.add_parser("sync", help="同步聊天记录")
+    sync_parser.add_argument("chats", nargs="+", help="聊天窗口的名字")
+    sync_parser.add_argument("--path", required=True, help="微信打开路径")
+    sync_parser.add_argument("--locale", default="zh-CN")
+
+    search_parser = subparsers.add_parser("search", help="查询已归档的聊天记录")
+    search_parser.add_argument("--chat", default=None)
+    search_parser.add_argument("--keyword", default=None)
+    search_parser.add_argument("--sender", default=None)
+    search_parser.add_argument("--since", default=None, help="开始时间，例如 2025-05-01 或 \"2025-05-01 18:00\"")
+    search_parser.add_argument("--until", default=None, help="结束时间")
+    search_parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    archive = ChatArchive(args.db)
+    if args.command == "sync":
+        from ui_auto_wechat import WeChat
+
+        wechat = WeChat(args.path, locale=args.locale)
+        for chat in args.chats:
+            print(f"{chat}: {archive.sync(wechat, chat)} new messages")
+    else:
+        since = datetime.fromisoformat(args.since).timestamp() if args.since else None
+        until = datetime.fromisoformat(args.until).timestamp() if args.until else None
+        for msg in archive.search(args.chat, args.keyword, args.sender, since, until, args.limit):
+            print(f"[{msg['chat']}] {msg['time_header'] or ''} {msg['sender']}: {msg['text']}")
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
+import threading
 import win32clipboard
+import metrics
 from ctypes import *
 
 
+# 剪切板是全局资源，多个线程或多个微信窗口同时操作时需要串行使用
+clipboard_lock = threading.RLock()
+
+
 class DROPFILES(Structure):
 	_fields_ = [
 		("pFiles", c_uint),
@@ -12,16 +18,27 @@ class DROPFILES(Structure):
 	]
 
 
-def setClipboardFiles(paths):
+def encodeClipboardFiles(paths):
+	"""把文件路径编码为 CF_HDROP 格式的数据，同一批文件发送给多个人时只需要编码一次"""
 	files = ("\0".join(paths)).replace("/", "\\")
 	data = files.encode("U16")[2:] + b"\0\0"
-	win32clipboard.OpenClipboard()
-	try:
-		win32clipboard.EmptyClipboard()
-		win32clipboard.SetClipboardData(
-			win32clipboard.CF_HDROP, matedata + data)
-	finally:
-		win32clipboard.CloseClipboard()
+	return matedata + data
+
+
+def setClipboardPayload(payload):
+	"""把 encodeClipboardFiles 编码好的数据写入剪切板"""
+	metrics.count("clipboard_writes")
+	with clipboard_lock:
+		win32clipboard.OpenClipboard()
+		try:
+			win32clipboard.EmptyClipboard()
+			win32clipboard.SetClipboardData(win32clipboard.CF_HDROP, payload)
+		finally:
+			win32clipboard.CloseClipboard()
+
+
+def setClipboardFiles(paths):
+	setClipboardPayload(encodeClipboardFiles(paths))
 
 
 def readClipboardFilePaths():
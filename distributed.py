@@ -0,0 +1,453 @@
+"""
+多台自动化主机的分布式模式。
+协调器（coordinator）对外提供 /send 和 /batch 接口，根据账号或聊天归属把请求转发给已注册的工作节点（worker），
+工作节点通过心跳上报状态，无法连接时改派，结果不确定时带幂等键在原节点上重试。每个工作节点包装一个 WeChat 实例并复用 WeChatFlaskServer 的接口。
+在一台 Linux 机器上可以用模拟的工作节点进行测试：
+    python distributed.py simulate --workers 3
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from flask import Flask, request, jsonify
+
+from flask_server import WeChatFlaskServer
+
+
+def _post_json(url: str, data: Dict, timeout: float) -> Dict:
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        # 工作节点返回的错误信息同样是 JSON；代理返回的 HTML 错误页或空响应只保留状态码
+        try:
+            payload = json.loads(e.read().decode("utf-8") or "{}")
+        except ValueError:
+            payload = {}
+        if not isinstance(payload, dict):
+            payload = {}
+        payload.setdefault("error", f"HTTP {e.code}")
+        payload.setdefault("status", e.code)
+        return payload
+
+
+def _not_sent(error: Exception) -> bool:
+    """
+    请求是否在到达工作节点之前就失败了（连接被拒绝、域名无法解析），此时可以放心改派；
+    超时等其他错误时工作节点可能已经发送了消息
+    """
+    reason = error.reason if isinstance(error, urllib.error.URLError) else error
+    return isinstance(reason, (ConnectionRefusedError, socket.gaierror))
+
+
+class WorkerInfo:
+    """协调器记录的工作节点状态"""
+    def __init__(self, worker_id: str, url: str, accounts: List[str]):
+        self.worker_id = worker_id
+        self.url = url.rstrip("/")
+        self.accounts = accounts
+        self.last_heartbeat = time.time()
+        self.queued = 0
+        self.inflight = 0
+        self.sent = 0
+        self.failed = 0
+
+    def alive(self, timeout: float) -> bool:
+        return time.time() - self.last_heartbeat < timeout
+
+    def load(self) -> int:
+        return self.inflight + self.queued
+
+    def to_dict(self, timeout: float) -> Dict:
+        return {
+            "worker_id": self.worker_id,
+            "url": self.url,
+            "accounts": self.accounts,
+            "alive": self.alive(timeout),
+            "last_heartbeat": self.last_heartbeat,
+            "queued": self.queued,
+            "inflight": self.inflight,
+            "sent": self.sent,
+            "failed": self.failed,
+        }
+
+
+class LatencyWindow:
+    """保存最近一段时间的完成时间和耗时，用于计算吞吐量和延迟分位数"""
+    def __init__(self, size: int = 1000, window_seconds: float = 60):
+        self.window_seconds = window_seconds
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self.lock:
+            self.samples.append((time.time(), seconds))
+
+    def summary(self) -> Dict:
+        now = time.time()
+        with self.lock:
+            recent = [s for t, s in self.samples if now - t <= self.window_seconds]
+        ordered = sorted(recent)
+
+        def percentile(p):
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+        return {
+            "count": len(ordered),
+            "per_min": len(ordered) / self.window_seconds * 60,
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "max": ordered[-1] if ordered else 0.0,
+        }
+
+
+class CoordinatorServer:
+    def __init__(self, port: int = 7000, heartbeat_timeout: float = 15, max_retries: int = 2,
+                 request_timeout: float = 120, max_parallel: int = 32):
+        """
+        Args:
+            port: 协调器端口
+            heartbeat_timeout: 超过该时间没有心跳的工作节点不再分配任务
+            max_retries: 转发失败时的最大重试次数
+            request_timeout: 转发到工作节点的超时时间
+            max_parallel: 批量发送时同时转发的最大请求数
+        """
+        self.port = port
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_retries = max_retries
+        self.request_timeout = request_timeout
+        self.workers: Dict[str, WorkerInfo] = {}
+        # 聊天归属：同一个聊天对象固定由同一个工作节点发送，保证顺序
+        self.owners: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_parallel)
+        self.started = time.time()
+        self.pending = 0
+        self.queue_latency = LatencyWindow()
+        self.total_latency = LatencyWindow()
+        self.app = Flask(__name__)
+        self.server_thread = None
+        self._setup_routes()
+
+    def _alive_workers(self) -> List[WorkerInfo]:
+        return [w for w in self.workers.values() if w.alive(self.heartbeat_timeout)]
+
+    def _route(self, recipient: str, account: Optional[str], exclude: set) -> Optional[WorkerInfo]:
+        """
+        选择工作节点：指定账号时使用拥有该账号的节点，否则优先使用聊天归属的节点，最后选择负载最低的节点
+        """
+        with self.lock:
+            alive = [w for w in self._alive_workers() if w.worker_id not in exclude]
+            if account:
+                candidates = [w for w in alive if account in w.accounts]
+                return min(candidates, key=WorkerInfo.load) if candidates else None
+
+            owner = self.workers.get(self.owners.get(recipient))
+            if owner is not None and owner in alive:
+                return owner
+            if not alive:
+                return None
+            worker = min(alive, key=WorkerInfo.load)
+            self.owners[recipient] = worker.worker_id
+            return worker
+
+    def dispatch(self, item: Dict, received: float = None) -> Dict:
+        """
+        将一条发送请求转发到工作节点。只有确定没有发送（连接被拒绝，或者工作节点在操作微信之前拒绝，例如 503）时才改派到其他节点；
+        超时时工作节点可能已经发送，只带同一个幂等键在同一个节点上重试，由工作节点去重；其余失败直接返回
+        Args:
+            item: {"recipient":..., "message":..., "at": [...], "account": 可选}
+            received: 协调器收到请求的时间
+        """
+        received = received or time.time()
+        recipient = item.get("recipient")
+        account = item.get("account")
+        tried = set()
+        last_error = "no available worker"
+        attempts = 0
+        # 同一条消息的所有尝试使用同一个幂等键
+        payload = dict(item, idempotency_key=item.get("idempotency_key") or uuid.uuid4().hex)
+        # 结果不确定的节点，之后只能在这个节点上重试
+        pinned = None
+
+        for attempt in range(self.max_retries + 1):
+            worker = pinned or self._route(recipient, account, tried)
+            if worker is None:
+                break
+            attempts += 1
+            if attempt == 0:
+                self.queue_latency.add(time.time() - received)
+
+            with self.lock:
+                worker.inflight += 1
+            try:
+                result = _post_json(worker.url + "/send", payload, self.request_timeout)
+                retry = "reassign" if result.get("status") == 503 else None
+            except Exception as e:
+                if _not_sent(e):
+                    result = {"error": "Worker unreachable", "details": str(e)}
+                    # 连接失败的节点视为失联，直到下一次心跳
+                    worker.last_heartbeat = 0
+                    retry = "reassign"
+                else:
+                    result = {"error": "Worker timed out, the message may have been sent", "details": str(e)}
+                    retry = "same"
+            finally:
+                with self.lock:
+                    worker.inflight -= 1
+
+            if result.get("success"):
+                worker.sent += 1
+                self.total_latency.add(time.time() - received)
+                result["worker_id"] = worker.worker_id
+                result["attempts"] = attempt + 1
+                return result
+
+            worker.failed += 1
+            last_error = result.get("details") or result.get("error")
+            if retry == "same":
+                pinned = worker
+            elif retry is None or pinned is not None:
+                # 发送失败，或者之前的尝试结果不确定而该节点已经无法访问，改派可能重复发送
+                break
+            else:
+                # 指定账号时只能在拥有该账号的节点上重试，否则改派到其他节点
+                if not account:
+                    tried.add(worker.worker_id)
+                with self.lock:
+                    if self.owners.get(recipient) == worker.worker_id:
+                        del self.owners[recipient]
+            time.sleep(min(0.5 * 2 ** attempt, 5))
+
+        self.total_latency.add(time.time() - received)
+        result = {"success": False, "recipient": recipient, "error": last_error, "attempts": attempts}
+        if pinned is not None:
+            result["may_have_been_sent"] = True
+        return result
+
+    def _setup_routes(self):
+        """Setup coordinator routes"""
+
+        @self.app.route('/workers/register', methods=['POST'])
+        def register():
+            data = request.get_json() or {}
+            if not data.get("url"):
+                return jsonify({"error": "Missing required parameters", "required": ["url"]}), 400
+            worker_id = data.get("worker_id") or uuid.uuid4().hex[:8]
+            with self.lock:
+                self.workers[worker_id] = WorkerInfo(worker_id, data["url"], data.get("accounts", []))
+            return jsonify({"success": True, "worker_id": worker_id, "heartbeat_interval": self.heartbeat_timeout / 3})
+
+        @self.app.route('/workers/heartbeat', methods=['POST'])
+        def heartbeat():
+            data = request.get_json() or {}
+            worker = self.workers.get(data.get("worker_id"))
+            if worker is None:
+                # 协调器重启后要求工作节点重新注册
+                return jsonify({"error": "Unknown worker", "register": True}), 404
+            worker.last_heartbeat = time.time()
+            worker.queued = data.get("queued", 0)
+            if "accounts" in data:
+                worker.accounts = data["accounts"]
+            return jsonify({"success": True})
+
+        @self.app.route('/workers', methods=['GET'])
+        def list_workers():
+            return jsonify({"workers": [w.to_dict(self.heartbeat_timeout) for w in self.workers.values()]})
+
+        @self.app.route('/send', methods=['POST'])
+        def send_message():
+            received = time.time()
+            data = request.get_json()
+            if not data or not data.get("recipient") or not data.get("message"):
+                return jsonify({"error": "Missing required parameters", "required": ["recipient", "message"]}), 400
+            with self.lock:
+                self.pending += 1
+            try:
+                result = self.dispatch(data, received)
+            finally:
+                with self.lock:
+                    self.pending -= 1
+            return jsonify(result), (200 if result.get("success") else 502)
+
+        @self.app.route('/batch', methods=['POST'])
+        def batch():
+            received = time.time()
+            data = request.get_json() or {}
+            items = data.get("items")
+            if not isinstance(items, list):
+                return jsonify({"error": "Missing required parameters", "required": ["items"]}), 400
+            with self.lock:
+                self.pending += len(items)
+
+            def run(item):
+                try:
+                    return self.dispatch(item, received)
+                finally:
+                    with self.lock:
+                        self.pending -= 1
+
+            results = list(self.executor.map(run, items))
+            return jsonify({
+                "success": all(r.get("success") for r in results),
+                "sent": sum(1 for r in results if r.get("success")),
+                "results": results,
+            })
+
+        @self.app.route('/stats', methods=['GET'])
+        def stats():
+            return jsonify({
+                "uptime": time.time() - self.started,
+                "pending": self.pending,
+                "workers_alive": len(self._alive_workers()),
+                "throughput": self.total_latency.summary(),
+                "queue_latency": self.queue_latency.summary(),
+                "workers": [w.to_dict(self.heartbeat_timeout) for w in self.workers.values()],
+            })
+
+    def start(self, block: bool = False):
+        kwargs = {'host': '0.0.0.0', 'port': self.port, 'debug': False, 'use_reloader': False, 'threaded': True}
+        if block:
+            self.app.run(**kwargs)
+            return
+        self.server_thread = threading.Thread(target=self.app.run, kwargs=kwargs, daemon=True)
+        self.server_thread.start()
+
+
+class WorkerAgent:
+    def __init__(self, wechat, coordinator_url: str, port: int = 6001, advertise_host: str = "127.0.0.1",
+                 accounts: List[str] = None, worker_id: str = None):
+        """
+        Args:
+            wechat: WeChat 实例（或模拟实例）
+            coordinator_url: 协调器地址，例如 http://10.0.0.2:7000
+            port: 本节点 HTTP 服务端口
+            advertise_host: 协调器访问本节点使用的地址
+            accounts: 本节点登录的微信账号
+            worker_id: 节点 ID，为空时由协调器分配
+        """
+        self.wechat = wechat
+        self.coordinator_url = coordinator_url.rstrip("/")
+        self.url = f"http://{advertise_host}:{port}"
+        self.accounts = accounts or []
+        self.worker_id = worker_id
+        self.heartbeat_interval = 5
+        # 服务的 UIActuator 串行执行本机的所有界面操作，它的排队数量随心跳上报给协调器
+        self.server = WeChatFlaskServer(self.wechat, port=port)
+        self.running = False
+
+    def register(self) -> None:
+        result = _post_json(self.coordinator_url + "/workers/register",
+                            {"worker_id": self.worker_id, "url": self.url, "accounts": self.accounts}, 10)
+        self.worker_id = result["worker_id"]
+        self.heartbeat_interval = result.get("heartbeat_interval", self.heartbeat_interval)
+
+    def _heartbeat_loop(self) -> None:
+        while self.running:
+            try:
+                result = _post_json(self.coordinator_url + "/workers/heartbeat",
+                                    {"worker_id": self.worker_id,
+                                     "queued": sum(self.server.actuator.pending().values())}, 10)
+                if result.get("register"):
+                    self.register()
+            except Exception as e:
+                print(f"Heartbeat failed: {e}")
+            time.sleep(self.heartbeat_interval)
+
+    def start(self) -> None:
+        self.server.start()
+        self.running = True
+        # 协调器可能晚于工作节点启动，注册失败时等待心跳线程重试
+        try:
+            self.register()
+        except Exception as e:
+            print(f"Register failed: {e}")
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+
+    def stop(self) -> None:
+        self.running = False
+        self.server.stop()
+
+
+class SimulatedWeChat:
+    """
+    模拟的 WeChat，用于在没有微信的机器上测试分布式模式
+    """
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, failure_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.sent = []
+
+    def send_msg(self, name, at_names: List[str] = None, text: str = None, search_user: bool = True) -> bool:
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        if random.random() < self.failure_rate:
+            raise RuntimeError("simulated failure")
+        self.sent.append((name, at_names, text))
+        return True
+
+    def find_all_contacts(self, as_dataframe: bool = True):
+        return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EasyChat 分布式模式")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    coordinator_parser = subparsers.add_parser("coordinator", help="启动协调器")
+    coordinator_parser.add_argument("--port", type=int, default=7000)
+
+    worker_parser = subparsers.add_parser("worker", help="启动工作节点")
+    worker_parser.add_argument("--coordinator", required=True, help="协调器地址")
+    worker_parser.add_argument("--path", required=True, help="微信打开路径")
+    worker_parser.add_argument("--locale", default="zh-CN")
+    worker_parser.add_argument("--port", type=int, default=6001)
+    worker_parser.add_argument("--host", default="127.0.0.1", help="协调器访问本节点使用的地址")
+    worker_parser.add_argument("--account", action="append", default=[], help="本节点登录的微信账号，可以指定多次")
+
+    simulate_parser = subparsers.add_parser("simulate", help="在本机启动协调器和多个模拟工作节点")
+    simulate_parser.add_argument("--port", type=int, default=7000)
+    simulate_parser.add_argument("--workers", type=int, default=3)
+    simulate_parser.add_argument("--latency", type=float, default=0.5)
+    simulate_parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.command == "coordinator":
+        CoordinatorServer(args.port).start(block=True)
+
+    elif args.command == "worker":
+        from ui_auto_wechat import WeChat
+        agent = WorkerAgent(WeChat(args.path, args.locale), args.coordinator, args.port, args.host, args.account)
+        agent.start()
+        while True:
+            time.sleep(3600)
+
+    elif args.command == "simulate":
+        coordinator = CoordinatorServer(args.port)
+        coordinator.start()
+        time.sleep(0.5)
+        coordinator_url = f"http://127.0.0.1:{args.port}"
+        for i in range(args.workers):
+            wechat = SimulatedWeChat(args.latency, failure_rate=args.failure_rate)
+            WorkerAgent(wechat, coordinator_url, args.port + 1 + i, accounts=[f"account{i}"],
+                        worker_id=f"sim{i}").start()
+        print(f"Coordinator: {coordinator_url}  (GET /stats, POST /send, POST /batch)")
+        while True:
+            time.sleep(3600)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,120 @@
 import threading
 import json
+import queue
 import time
-from flask import Flask, request, jsonify
-from ui_auto_wechat import WeChat
+import uuid
+from flask import Flask, Response, request, jsonify, stream_with_context
+
+import metrics
+from actuator import ActuatedProxy, UIActuator
+from idempotency import DuplicateWindow, IdempotencyCache, IdempotencyConflict
+from message_events import EventBus, MessageWatcher
+from profiler import Profiler
+from wechat_watchdog import WeChatWatchdog
+
+
+class DialogSession:
+    """
+    A paginated scrape of one chat's history, newest message first.
+    Recently streamed messages are kept (up to max_cached) so that repeated or retried pages within
+    the TTL are served without touching the UI; older pages are re-scraped on demand.
+    """
+    def __init__(self, server, chat, max_cached=2000):
+        self.server = server
+        self.chat = chat
+        self.session_id = uuid.uuid4().hex[:12]
+        self.max_cached = max_cached
+        self.messages = []
+        self.base = 0
+        self.iterator = None
+        self.iter_pos = 0
+        self.generation = None
+        self.end = None
+        self.headers = set()
+        self.last_used = time.time()
+
+    def get(self, index):
+        """Message at position index (0 = newest), or None when the history is exhausted"""
+        if self.base <= index < self.base + len(self.messages):
+            return self.messages[index - self.base]
+        if self.end is not None and index >= self.end:
+            return None
+
+        msg = self.server.actuator.call("http", self._step, index)
+        if msg is None:
+            self.end = index
+            return None
+        self.iter_pos += 1
+        self.messages.append(msg)
+        if msg[0] == '时间信息':
+            self.headers.add(index)
+        if len(self.messages) > self.max_cached:
+            drop = len(self.messages) // 2
+            self.messages = self.messages[drop:]
+            self.base += drop
+        return msg
+
+    def _step(self, index):
+        """Read the message at index; runs on the actuator thread so nothing else can touch the UI meanwhile"""
+        # Another UI operation ran since our last step, or the page is not next in line: scrape again
+        actuator = self.server.actuator
+        if self.iterator is None or self.generation != actuator.sequence - 1 or self.iter_pos != index:
+            self.iterator = self.server.raw_wechat.iter_dialogs(self.chat, skip=index)
+            self.iter_pos = index
+            if index != self.base + len(self.messages):
+                self.messages, self.base = [], index
+        self.generation = actuator.sequence
+        return next(self.iterator, None)
+
+    def blocks_before(self, index):
+        """Number of time headers seen above the newest message and before index"""
+        return sum(1 for i in self.headers if i < index)
 
 
 class WeChatFlaskServer:
-    def __init__(self, wechat_instance, port=6001):
-        self.wechat = wechat_instance
+    def __init__(self, wechat_instance, port=6001, trace_path=None,
+                 idempotency_ttl=600, idempotency_max_entries=10000, dedupe_window=0, dialog_ttl=30, watch_interval=None,
+                 actuator=None):
+        # Every UI call goes through a single actuator thread, shared with the GUI when it passes its own,
+        # so request threads, the watcher and GUI batches never drive the mouse or clipboard at the same time
+        if isinstance(wechat_instance, ActuatedProxy):
+            actuator = actuator or wechat_instance._actuator
+            wechat_instance = wechat_instance._target
+        if actuator is None:
+            actuator = UIActuator()
+        if not actuator.is_alive() and actuator.running:
+            actuator.start()
+        self.actuator = actuator
+        self.raw_wechat = wechat_instance
+        self.wechat = actuator.bind(wechat_instance, "http")
         self.port = port
+
+        # Results of /send keyed by the client's idempotency key, so retries never drive the UI twice
+        self.idempotency = IdempotencyCache(ttl=idempotency_ttl, max_entries=idempotency_max_entries)
+        # Optional suppression of the same message to the same recipient within dedupe_window seconds
+        self.duplicates = DuplicateWindow(window=dedupe_window) if dedupe_window > 0 else None
+
+        # Guards the /dialogs sessions; paused scrapes notice other UI work through actuator.sequence
+        self.ui_lock = threading.RLock()
+        # Short-lived /dialogs sessions keyed by chat
+        self.dialog_sessions = {}
+        self.dialog_ttl = dialog_ttl
+
+        # New-message events: one background scan of the UI, fanned out to /events and webhooks
+        self.events = EventBus()
+        self.watcher = None
+        self.watch_interval = watch_interval
+        # Optional health probes; while WeChat is unhealthy the actuator is paused and /send answers 503
+        self.watchdog = None
+        # Only one /debug/profile capture at a time
+        self.profile_lock = threading.Lock()
         self.app = Flask(__name__)
         self.server_thread = None
         self.is_running = False
+
+        # Optionally write every timing span to a JSON Lines trace file
+        if trace_path:
+            metrics.enable_trace(trace_path)
         
         # Configure Flask routes
         self._setup_routes()
@@ -29,7 +132,14 @@ class WeChatFlaskServer:
                     "/": "GET - This documentation",
                     "/status": "GET - Service status",
                     "/send": "POST - Send message to WeChat contact",
-                    "/health": "GET - Health check"
+                    "/health": "GET - Health check; 503 while the watchdog finds WeChat hung, closed or logged out",
+                    "/contacts": "GET - List all contacts",
+                    "/metrics": "GET - Timing spans and counters in Prometheus format",
+                    "/dialogs": "GET - Stream chat history as NDJSON, newest first",
+                    "/events": "GET - Server-Sent Events stream of new messages",
+                    "/webhooks": "GET/POST - List or register webhooks for new messages",
+                    "/webhooks/<id>": "DELETE - Remove a webhook",
+                    "/debug/profile": "GET - Profile the UI thread for N seconds and download the result"
                 },
                 "usage": {
                     "/send": {
@@ -38,13 +148,32 @@ class WeChatFlaskServer:
                         "parameters": {
                             "recipient": "string - WeChat contact name (required)",
                             "message": "string - message content (required)",
-                            "at": "array - list of people to @ (optional)"
+                            "at": "array - list of people to @ (optional)",
+                            "idempotency_key": "string - repeated requests with the same key return the first result (optional, or use the Idempotency-Key header)"
                         },
                         "example": {
                             "recipient": "张三",
                             "message": "你好，这是一条测试消息",
                             "at": ["李四"]
                         }
+                    },
+                    "/dialogs": {
+                        "method": "GET",
+                        "parameters": {
+                            "chat": "string - chat name (required)",
+                            "limit": "int - messages per page (optional, default 100)",
+                            "cursor": "string - next_cursor from the previous page (optional)",
+                            "blocks": "int - stop after this many time blocks (optional)"
+                        },
+                        "response": "one JSON object per line; the last line has next_cursor and done"
+                    },
+                    "/debug/profile": {
+                        "method": "GET",
+                        "parameters": {
+                            "seconds": "float - capture window, up to 300 (optional, default 10)",
+                            "format": "string - speedscope (sampled stacks + UIA timeline) or pstats (cProfile) (optional, default speedscope)"
+                        },
+                        "response": "downloadable profile of the UI thread; other requests keep running meanwhile"
                     }
                 }
             })
@@ -56,16 +185,61 @@ class WeChatFlaskServer:
                 "status": "running",
                 "port": self.port,
                 "wechat_connected": self.wechat is not None,
-                "service": "EasyChat Flask API"
+                "service": "EasyChat Flask API",
+                "actuator": self.actuator.stats()
             })
 
         @self.app.route('/health', methods=['GET'])
         def health():
-            """Health check endpoint"""
-            return jsonify({
-                "status": "healthy",
-                "timestamp": time.time()
+            """Health check endpoint; reflects the watchdog's probes of the WeChat client when one is running"""
+            if self.watchdog is None:
+                return jsonify({
+                    "status": "healthy",
+                    "timestamp": time.time()
+                })
+            response = jsonify({
+                "status": "healthy" if self.watchdog.healthy else "unhealthy",
+                "timestamp": time.time(),
+                "wechat": self.watchdog.stats(),
+                "queue_paused": self.actuator.paused is not None
             })
+            if not self.watchdog.healthy:
+                response.status_code = 503
+            return response
+
+        @self.app.route('/metrics', methods=['GET'])
+        def metrics_endpoint():
+            """Prometheus metrics endpoint"""
+            return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+        @self.app.route('/debug/profile', methods=['GET'])
+        def debug_profile():
+            """Profile the actuator thread while it keeps serving the GUI, the watcher and other requests"""
+            try:
+                seconds = float(request.args.get('seconds', 10))
+            except ValueError:
+                return jsonify({"error": "seconds must be a number"}), 400
+            if not 0 < seconds <= 300:
+                return jsonify({"error": "seconds must be between 0 and 300"}), 400
+            fmt = request.args.get('format', 'speedscope')
+            if fmt not in ('speedscope', 'pstats'):
+                return jsonify({"error": "format must be speedscope or pstats"}), 400
+            if not self.profile_lock.acquire(blocking=False):
+                return jsonify({"error": "A profile is already being captured"}), 409
+            try:
+                profiler = Profiler(self.actuator, mode="cprofile" if fmt == 'pstats' else "sample")
+                profiler.run(seconds)
+            finally:
+                self.profile_lock.release()
+
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            if fmt == 'pstats':
+                body, mimetype, filename = profiler.to_pstats(), "application/octet-stream", f"easychat-{stamp}.pstats"
+            else:
+                body = json.dumps(profiler.to_speedscope(), ensure_ascii=False)
+                mimetype, filename = "application/json", f"easychat-{stamp}.speedscope.json"
+            return Response(body, mimetype=mimetype,
+                            headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
         @self.app.route('/send', methods=['POST'])
         def send_message():
@@ -87,24 +261,37 @@ class WeChatFlaskServer:
                         "provided": list(data.keys())
                     }), 400
                 
-                # Send message using WeChat automation
-                try:
-                    self.wechat.send_msg(recipient, at_list, message)
-                    
-                    return jsonify({
-                        "success": True,
-                        "recipient": recipient,
-                        "message": message,
-                        "at": at_list,
-                        "timestamp": time.time()
-                    })
-                    
-                except Exception as e:
+                # Refuse instead of queueing behind a paused actuator; not cached, so retries go through once WeChat recovers
+                if self.watchdog is not None and not self.watchdog.healthy:
                     return jsonify({
-                        "error": "Failed to send message",
-                        "details": str(e),
+                        "error": "WeChat is unhealthy",
+                        "details": self.watchdog.reason,
                         "recipient": recipient
-                    }), 500
+                    }), 503
+
+                key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+                if key:
+                    # Only successful sends are cached, so a retry after a failure drives the UI again.
+                    # A key reused for a different message is rejected instead of replaying an unrelated result
+                    fingerprint = IdempotencyCache.fingerprint(recipient, message, at_list)
+                    try:
+                        (body, code), replayed = self.idempotency.run(
+                            key, lambda: self._send(recipient, message, at_list),
+                            cacheable=lambda r: r[1] < 300, fingerprint=fingerprint)
+                    except IdempotencyConflict as e:
+                        return jsonify({
+                            "error": "Idempotency key reused with a different request",
+                            "details": str(e),
+                            "idempotency_key": key
+                        }), 422
+                else:
+                    (body, code), replayed = self._send(recipient, message, at_list), False
+
+                response = jsonify(body)
+                response.status_code = code
+                if replayed:
+                    response.headers['Idempotent-Replayed'] = 'true'
+                return response
                     
             except Exception as e:
                 return jsonify({
@@ -112,11 +299,71 @@ class WeChatFlaskServer:
                     "details": str(e)
                 }), 500
 
+        @self.app.route('/dialogs', methods=['GET'])
+        def get_dialogs():
+            """Stream chat history as NDJSON while the chat is being scrolled"""
+            chat = request.args.get('chat')
+            if not chat:
+                return jsonify({"error": "Missing required parameters", "required": ["chat"]}), 400
+            try:
+                limit = max(1, int(request.args.get('limit', 100)))
+                blocks = int(request.args['blocks']) if request.args.get('blocks') else None
+                session, offset, seen_blocks = self._dialog_session(chat, request.args.get('cursor'))
+            except ValueError as e:
+                return jsonify({"error": "Invalid parameters", "details": str(e)}), 400
+
+            return Response(stream_with_context(self._stream_dialogs(session, offset, limit, blocks, seen_blocks)),
+                            mimetype='application/x-ndjson')
+
+        @self.app.route('/events', methods=['GET'])
+        def events():
+            """Server-Sent Events stream of new-message events"""
+            subscription = self.events.subscribe()
+
+            def stream():
+                try:
+                    yield "retry: 3000\n\n"
+                    while True:
+                        try:
+                            event = subscription.get(timeout=15)
+                        except queue.Empty:
+                            # Keep idle connections from being closed by proxies
+                            yield ": keepalive\n\n"
+                            continue
+                        yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                finally:
+                    self.events.unsubscribe(subscription)
+
+            return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+        @self.app.route('/webhooks', methods=['GET'])
+        def list_webhooks():
+            """List registered webhooks"""
+            return jsonify(self.events.stats())
+
+        @self.app.route('/webhooks', methods=['POST'])
+        def add_webhook():
+            """Register a webhook that receives batches of new-message events"""
+            data = request.get_json(silent=True) or {}
+            url = data.get('url')
+            if not url or not url.startswith(('http://', 'https://')):
+                return jsonify({"error": "Missing or invalid parameter", "required": ["url"]}), 400
+            options = {k: data[k] for k in ('batch_size', 'batch_interval', 'max_retries') if k in data}
+            webhook = self.events.add_webhook(url, **options)
+            return jsonify(webhook.to_dict()), 201
+
+        @self.app.route('/webhooks/<webhook_id>', methods=['DELETE'])
+        def remove_webhook(webhook_id):
+            """Remove a webhook"""
+            if not self.events.remove_webhook(webhook_id):
+                return jsonify({"error": "Webhook not found"}), 404
+            return jsonify({"success": True, "id": webhook_id})
+
         @self.app.route('/contacts', methods=['GET'])
         def get_contacts():
             """Get list of all contacts"""
             try:
-                contacts = self.wechat.find_all_contacts()
+                contacts = self.wechat.find_all_contacts(as_dataframe=False)
                 return jsonify({
                     "contacts": contacts.to_dict('records') if hasattr(contacts, 'to_dict') else list(contacts),
                     "count": len(contacts)
@@ -129,16 +376,123 @@ class WeChatFlaskServer:
 
         @self.app.errorhandler(404)
         def not_found(error):
-            return jsonify({"error": "Endpoint not found", "available_endpoints": ["/", "/status", "/send", "/health", "/contacts"]}), 404
+            return jsonify({"error": "Endpoint not found", "available_endpoints": ["/", "/status", "/send", "/health", "/contacts", "/metrics", "/dialogs", "/events", "/webhooks", "/debug/profile"]}), 404
 
         @self.app.errorhandler(500)
         def internal_error(error):
             return jsonify({"error": "Internal server error"}), 500
 
+    def _dialog_session(self, chat, cursor):
+        """
+        Return (session, offset, time headers above offset) for a /dialogs request.
+        A cursor whose session expired or was replaced gets a fresh session that resumes the scrape at its offset.
+        """
+        now = time.time()
+        with self.ui_lock:
+            for name in [n for n, sess in self.dialog_sessions.items() if now - sess.last_used > self.dialog_ttl]:
+                del self.dialog_sessions[name]
+
+            session = self.dialog_sessions.get(chat)
+            offset, seen_blocks = 0, 0
+            if cursor:
+                session_id, offset, seen = (cursor.split(':') + [None])[:3]
+                offset = int(offset)
+                if session is None or session.session_id != session_id:
+                    session = None
+                seen_blocks = int(seen) if seen else (session.blocks_before(offset) if session else 0)
+            if session is None:
+                session = self.dialog_sessions[chat] = DialogSession(self, chat)
+            session.last_used = now
+            return session, offset, seen_blocks
+
+    def _stream_dialogs(self, session, offset, limit, blocks, seen_blocks=0):
+        index = offset
+        done = False
+        try:
+            while index < offset + limit:
+                if blocks is not None and seen_blocks >= blocks:
+                    done = True
+                    break
+                # Lock one step at a time, never across a yield, so a slow client cannot stall other scrapes
+                with self.ui_lock:
+                    msg = session.get(index)
+                    session.last_used = time.time()
+                if msg is None:
+                    done = True
+                    break
+                yield json.dumps({"index": index, "type": msg[0], "sender": msg[1], "text": msg[2]},
+                                 ensure_ascii=False) + "\n"
+                if msg[0] == '时间信息':
+                    seen_blocks += 1
+                index += 1
+        except Exception as e:
+            yield json.dumps({"error": "Failed to read dialogs", "details": str(e)}) + "\n"
+            return
+
+        # The cursor carries the offset and the header count, so it can resume even after the session is gone
+        yield json.dumps({"next_cursor": None if done else f"{session.session_id}:{index}:{seen_blocks}",
+                          "done": done, "count": index - offset}) + "\n"
+
+    def _send(self, recipient, message, at_list):
+        """Send a message and return (response body, status code)"""
+        if self.duplicates is not None:
+            last = self.duplicates.check(recipient, message, at_list)
+            if last is not None:
+                return {
+                    "error": "Duplicate message suppressed",
+                    "recipient": recipient,
+                    "previous_timestamp": last
+                }, 409
+
+        # Send message using WeChat automation
+        try:
+            self.wechat.send_msg(recipient, at_list, message)
+
+            return {
+                "success": True,
+                "recipient": recipient,
+                "message": message,
+                "at": at_list,
+                "timestamp": time.time()
+            }, 200
+
+        except Exception as e:
+            # The message was not sent, so a retry must not be suppressed as a duplicate
+            if self.duplicates is not None:
+                self.duplicates.release(recipient, message, at_list)
+            return {
+                "error": "Failed to send message",
+                "details": str(e),
+                "recipient": recipient
+            }, 500
+
+    def start_watcher(self, interval=None):
+        """Start scanning WeChat for new messages in the background and publish them as events"""
+        if self.watcher is None:
+            self.watcher = MessageWatcher(self.actuator.bind(self.raw_wechat, "watcher"), self.events,
+                                          interval or self.watch_interval or 5)
+            self.watcher.start()
+        return self.watcher
+
+    def start_watchdog(self, interval=30, keepalive_interval=3600, on_change=None):
+        """Start probing WeChat's health; unhealthy clients pause the queue and publish a "health" event"""
+        if self.watchdog is None:
+            def changed(healthy, reason):
+                self.events.publish({"type": "health", "healthy": healthy, "reason": reason})
+                if on_change is not None:
+                    on_change(healthy, reason)
+
+            self.watchdog = WeChatWatchdog(self.actuator, self.raw_wechat, interval=interval,
+                                           keepalive_interval=keepalive_interval, on_change=changed)
+            self.watchdog.start()
+        return self.watchdog
+
     def start(self):
         """Start the Flask server in a separate thread"""
         try:
             if not self.is_running:
+                if self.watch_interval:
+                    self.start_watcher()
                 self.server_thread = threading.Thread(
                     target=self.app.run,
                     kwargs={'host': '0.0.0.0', 'port': self.port, 'debug': False, 'use_reloader': False},
@@ -154,6 +508,12 @@ class WeChatFlaskServer:
 
     def stop(self):
         """Stop the Flask server"""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            self.watchdog = None
         if self.is_running:
             # Note: Flask's development server doesn't have a clean shutdown method
             # In production, use a proper WSGI server like gunicorn
@@ -0,0 +1,146 @@
+"""
+发送接口的幂等与去重。
+IdempotencyCache 按客户端传入的幂等键缓存结果：重复的请求直接返回缓存的结果，第一次请求还在执行时等待它完成并共享结果，不会再次操作微信。
+DuplicateWindow 按“接收人 + 消息内容哈希”在时间窗口内去重，用于没有传幂等键的客户端。
+两者都只在字典头部清理过期记录，每个请求的开销为 O(1)。
+同一个幂等键用于内容不同的请求时抛出 IdempotencyConflict，而不是返回无关请求的结果。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+
+class IdempotencyConflict(ValueError):
+    """同一个幂等键被用于内容不同的请求"""
+
+
+class IdempotencyCache:
+    def __init__(self, ttl: float = 600, max_entries: int = 10000):
+        """
+        Args:
+            ttl: 结果的缓存时间（秒），从结果产生时开始计算
+            max_entries: 最多缓存的结果数量，超过时丢弃最早的记录；正在执行的请求不计入，也不会被丢弃
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # 幂等键 -> (Future, 请求内容的指纹)，正在执行的请求
+        self._running: Dict[str, Tuple[Future, Optional[str]]] = {}
+        # 幂等键 -> (过期时间, Future, 请求内容的指纹)，已经完成的请求，按完成顺序排列，因此也按过期时间排列
+        self._entries: "OrderedDict[str, Tuple[float, Future, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge(self, now: float) -> None:
+        while self._entries:
+            key, (expires, _, _) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def fingerprint(*parts) -> str:
+        """请求内容的指纹，用于发现被重复使用的幂等键"""
+        content = "\0".join(str(part) for part in parts)
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+    def run(self, key: str, func: Callable, cacheable: Callable = None, fingerprint: str = None):
+        """
+        执行 func 并按幂等键缓存结果，键已经存在时返回缓存或正在执行的结果
+        Args:
+            key: 幂等键
+            func: 无参数的函数
+            cacheable: 判断结果是否可以缓存，返回 False 时与出错一样不缓存（例如发送失败的响应），
+                之后带同样幂等键的重试会重新执行
+            fingerprint: 请求内容的指纹（见 fingerprint），与第一次请求不同时抛出 IdempotencyConflict
+        Return:
+            (result, replayed): 结果，以及结果是否来自之前的请求
+        """
+        with self._lock:
+            self._purge(time.time())
+            if key in self._running:
+                future, first = self._running[key]
+            elif key in self._entries:
+                _, future, first = self._entries[key]
+            else:
+                future, first = None, None
+            if future is None:
+                future = Future()
+                self._running[key] = (future, fingerprint)
+                replayed = False
+            else:
+                if first != fingerprint:
+                    raise IdempotencyConflict(f"幂等键“{key}”已经用于内容不同的请求")
+                replayed = True
+
+        if replayed:
+            return future.result(), True
+
+        try:
+            result = func()
+        except BaseException as e:
+            # 出错时不缓存，等待中的重复请求收到同样的异常
+            with self._lock:
+                self._running.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._running.pop(key, None)
+            if cacheable is None or cacheable(result):
+                self._entries[key] = (time.time() + self.ttl, future, fingerprint)
+        future.set_result(result)
+        return result, False
+
+    def __len__(self):
+        return len(self._running) + len(self._entries)
+
+
+class DuplicateWindow:
+    def __init__(self, window: float = 60, max_entries: int = 100000):
+        """
+        Args:
+            window: 相同接收人、相同内容的消息在该时间（秒）内只发送一次
+            max_entries: 最多记录的消息数量
+        """
+        self.window = window
+        self.max_entries = max_entries
+        # (接收人, 内容哈希) -> 最近一次发送的时间
+        self._seen = {}
+        self._order = deque()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(recipient: str, message: str, at_list=None) -> Tuple[str, str]:
+        content = message + "\0" + "\0".join(at_list or [])
+        return recipient, hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+    def check(self, recipient: str, message: str, at_list=None) -> Optional[float]:
+        """
+        检查并记录一条消息
+        Return:
+            上一次发送相同消息的时间，不重复时返回 None
+        """
+        key = self.fingerprint(recipient, message, at_list)
+        now = time.time()
+        with self._lock:
+            # 清理过期记录；同一个键被重新记录过时，以字典中的时间为准
+            while self._order and (self._order[0][0] <= now - self.window or len(self._order) > self.max_entries):
+                ts, old = self._order.popleft()
+                if self._seen.get(old) == ts:
+                    del self._seen[old]
+
+            last = self._seen.get(key)
+            if last is not None and last > now - self.window:
+                return last
+            self._seen[key] = now
+            self._order.append((now, key))
+            return None
+
+    def release(self, recipient: str, message: str, at_list=None) -> None:
+        """
+        撤销 check 的记录，发送失败时调用，客户端的重试不会被当作重复消息拦截
+        """
+        key = self.fingerprint(recipient, message, at_list)
+        with self._lock:
+            self._seen.pop(key, None)
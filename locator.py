@@ -0,0 +1,236 @@
+"""
+微信控件定位表。
+控件的类型、名称（WeChatLocale 中的键）、深度以及祖先路径保存在 locators.json 中，与代码分离。
+运行时优先沿着缓存的祖先路径逐层查找（代价与路径长度成正比），失败时再退回到按深度搜索。
+微信更新导致定位失效时，先用 automation.py -j 导出控件树，再运行
+    python locator.py learn wechat.jsonl --locale zh-CN
+即可根据导出结果更新定位表。
+"""
+import argparse
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+import metrics
+from wechat_locale import WeChatLocale
+
+DEFAULT_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locators.json")
+
+
+class LocatorTable:
+    """
+    定位表，每个逻辑控件对应一条记录：
+        {"type": 控件类型, "name": WeChatLocale 中的键（为空代表名称不固定）, "depth": 搜索深度,
+         "path": [{"type": 控件类型, "name": WeChatLocale 中的键或空, "index": 在父控件中的下标}, ...],
+         "scope": 可选，"desktop" 代表控件不在微信主窗口内（例如聊天记录窗口、右键菜单）}
+    path 从桌面下的顶层窗口开始，到目标控件本身为止。
+    """
+    def __init__(self, path: str = DEFAULT_TABLE):
+        self.path = path
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.version = data.get("version", 1)
+        self.wechat_version = data.get("wechat_version", "")
+        self.updated = data.get("updated", 0)
+        self.elements: Dict[str, Dict] = data["elements"]
+
+    def get(self, key: str) -> Dict:
+        return self.elements[key]
+
+    def save(self, path: str = None) -> None:
+        data = {
+            "version": self.version,
+            "wechat_version": self.wechat_version,
+            "updated": self.updated,
+            "elements": self.elements,
+        }
+        with open(path or self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+
+
+class Locator:
+    def __init__(self, lc: WeChatLocale, table: LocatorTable = None, window: Callable = None):
+        """
+        Args:
+            lc: 微信使用的语言
+            table: 定位表，默认读取 locators.json
+            window: 返回指定微信主窗口的函数，多开微信时用来把查找限制在该窗口内，为空时从桌面开始查找
+        """
+        self.lc = lc
+        self.table = table if table is not None else LocatorTable()
+        self.window = window
+        # 运行时修正过的路径下标，避免每次都在兄弟控件中重新查找（每个窗口的定位器各自缓存）
+        self._indices: Dict[str, List[int]] = {}
+
+    def _resolve_name(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        return getattr(self.lc, key)
+
+    def _matches(self, control, control_type: Optional[str], name: Optional[str]) -> bool:
+        if control_type is not None and control.ControlTypeName != control_type:
+            return False
+        return name is None or control.Name == name
+
+    def _window(self, entry: Dict):
+        """
+        返回查找该控件时使用的主窗口，不在主窗口内的控件返回 None
+        """
+        if self.window is None or entry.get("scope") == "desktop":
+            return None
+        return self.window()
+
+    def _walk(self, key: str, entry: Dict, name: Optional[str]):
+        """
+        沿着缓存的祖先路径逐层查找控件，找不到时返回 None
+        """
+        import uiautomation as auto
+
+        steps = entry.get("path") or []
+        if not steps:
+            return None
+
+        indices = self._indices.get(key) or [step["index"] for step in steps]
+        resolved = []
+        window = self._window(entry)
+        if window is not None:
+            # 第一步是顶层窗口，直接使用指定的窗口
+            node = window
+            resolved.append(indices[0])
+            steps, indices = steps[1:], indices[1:]
+        else:
+            node = auto.GetRootControl()
+        for n, (step, index) in enumerate(zip(steps, indices)):
+            step_name = name if n == len(steps) - 1 else self._resolve_name(step.get("name"))
+            children = node.GetChildren()
+            if 0 <= index < len(children) and self._matches(children[index], step["type"], step_name):
+                node = children[index]
+            else:
+                # 下标变化时在兄弟控件中查找
+                for index, child in enumerate(children):
+                    if self._matches(child, step["type"], step_name):
+                        node = child
+                        break
+                else:
+                    return None
+            resolved.append(index)
+
+        self._indices[key] = resolved
+        return node
+
+    def find(self, key: str, name: str = None, **kwargs):
+        """
+        查找逻辑控件
+        Args:
+            key: 定位表中的键，例如 "search_box"
+            name: 覆盖定位表中的名称，用于名称不固定的控件（例如聊天标题）
+            kwargs: 退回按深度搜索时额外传给 uiautomation 的参数，例如 foundIndex
+        """
+        with metrics.span(f"find:{key}"):
+            return self._find(key, name, **kwargs)
+
+    def _find(self, key: str, name: str = None, **kwargs):
+        import uiautomation as auto
+
+        metrics.count("uia_searches")
+        entry = self.table.get(key)
+        if name is None:
+            name = self._resolve_name(entry.get("name"))
+
+        window = self._window(entry)
+        if window is not None and entry.get("depth") == 1:
+            return window
+
+        if not kwargs:
+            control = self._walk(key, entry, name)
+            if control is not None:
+                return control
+
+        # 退回到按深度搜索
+        if name is not None:
+            kwargs["Name"] = name
+        if window is not None:
+            kwargs["searchFromControl"] = window
+            if entry.get("depth") is not None:
+                kwargs["Depth"] = entry["depth"] - 1
+        elif entry.get("depth") is not None:
+            kwargs["Depth"] = entry["depth"]
+        control = getattr(auto, entry["type"])(**kwargs)
+        # uiautomation 的控件在第一次读取属性时才搜索，在这里完成搜索，耗时才计入 find:key；
+        # 控件还没出现时不等待，之后读取属性时仍然按 uiautomation 的超时等待它出现
+        control.Exists(0, 0)
+        return control
+
+
+def learn(table: LocatorTable, records: List[Dict], lc: WeChatLocale, meta: Dict = None) -> List[str]:
+    """
+    根据 automation.py -j 导出的控件树更新定位表
+    Args:
+        table: 定位表
+        records: tree_dump.load_dump 读取的控件记录
+        lc: 导出时微信使用的语言
+        meta: 导出文件信息
+    Return:
+        changes: 变化说明
+    """
+    by_path = {tuple(r["path"]): r for r in records}
+
+    changes = []
+    for key, entry in table.elements.items():
+        if entry.get("name") is None:
+            changes.append(f"{key}: skipped (name is not fixed)")
+            continue
+
+        name = getattr(lc, entry["name"])
+        candidates = [r for r in records if r["type"] == entry["type"] and r["name"] == name]
+        if not candidates:
+            changes.append(f"{key}: not found in dump")
+            continue
+
+        # 有多个候选时选择深度最接近原记录的控件
+        old_depth = entry.get("depth")
+        record = min(candidates, key=lambda r: abs(r["depth"] - old_depth) if old_depth is not None else 0)
+
+        steps = []
+        for n in range(1, len(record["path"]) + 1):
+            ancestor = by_path.get(tuple(record["path"][:n]))
+            steps.append({
+                "type": ancestor["type"] if ancestor else None,
+                "name": WeChatLocale.key_of(ancestor["name"]) if ancestor else None,
+                "index": record["path"][n - 1],
+            })
+
+        if old_depth is not None and old_depth != record["depth"]:
+            changes.append(f"{key}: depth {old_depth} -> {record['depth']}")
+        if old_depth is not None:
+            entry["depth"] = record["depth"]
+        entry["path"] = steps
+
+    table.updated = time.time()
+    if meta and meta.get("wechat_version"):
+        table.wechat_version = meta["wechat_version"]
+    return changes
+
+
+def main():
+    import tree_dump
+
+    parser = argparse.ArgumentParser(description="微信控件定位表工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    learn_parser = subparsers.add_parser("learn", help="根据导出的控件树更新定位表")
+    learn_parser.add_argument("dump", help="automation.py -j 导出的文件")
+    learn_parser.add_argument("--locale", default="zh-CN", choices=list(WeChatLocale.getSupportedLocales()))
+    learn_parser.add_argument("--table", default=DEFAULT_TABLE, help="定位表路径")
+    learn_parser.add_argument("--output", default=None, help="输出路径，默认覆盖定位表")
+    args = parser.parse_args()
+
+    meta, records = tree_dump.load_dump(args.dump)
+    table = LocatorTable(args.table)
+    for change in learn(table, records, WeChatLocale(args.locale), meta):
+        print(change)
+    table.save(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+新消息的推送。
+MessageWatcher 在后台线程中定期调用一次 check_new_msg，把每个会话中上次发布之后的消息作为事件发布到 EventBus；
+EventBus 把事件分发给所有订阅者（例如 Flask 的 /events SSE 连接）以及注册的 webhook。
+无论有多少个订阅者，微信界面都只扫描一次。webhook 按批发送，失败时按指数退避重试。
+"""
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+TIME_TYPE = '时间信息'
+
+
+class EventBus:
+    def __init__(self, subscriber_queue_size: int = 1000):
+        """
+        Args:
+            subscriber_queue_size: 每个订阅者最多积压的事件数量，超过时丢弃最早的事件
+        """
+        self.subscriber_queue_size = subscriber_queue_size
+        self.subscribers: List[queue.Queue] = []
+        self.webhooks: Dict[str, "WebhookDispatcher"] = {}
+        self.lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, event: Dict) -> None:
+        event.setdefault("id", uuid.uuid4().hex)
+        event.setdefault("timestamp", time.time())
+        with self.lock:
+            self.published += 1
+            subscribers = list(self.subscribers)
+            webhooks = list(self.webhooks.values())
+        for q in subscribers:
+            # 订阅者读取太慢时丢弃最早的事件，不阻塞扫描线程
+            while True:
+                try:
+                    q.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+        for webhook in webhooks:
+            webhook.put(event)
+
+    def subscribe(self) -> queue.Queue:
+        q = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self.lock:
+            self.subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self.lock:
+            if q in self.subscribers:
+                self.subscribers.remove(q)
+
+    def add_webhook(self, url: str, **kwargs) -> "WebhookDispatcher":
+        webhook = WebhookDispatcher(url, **kwargs)
+        webhook.start()
+        with self.lock:
+            self.webhooks[webhook.webhook_id] = webhook
+        return webhook
+
+    def remove_webhook(self, webhook_id: str) -> bool:
+        with self.lock:
+            webhook = self.webhooks.pop(webhook_id, None)
+        if webhook is None:
+            return False
+        webhook.stop()
+        return True
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "published": self.published,
+                "subscribers": len(self.subscribers),
+                "webhooks": [w.to_dict() for w in self.webhooks.values()],
+            }
+
+
+class WebhookDispatcher(threading.Thread):
+    """向一个 webhook 地址按批发送事件"""
+    def __init__(self, url: str, batch_size: int = 50, batch_interval: float = 1.0,
+                 max_retries: int = 5, timeout: float = 10, max_pending: int = 10000):
+        """
+        Args:
+            url: webhook 地址，事件以 {"events": [...]} 的形式 POST
+            batch_size: 每批最多发送的事件数量
+            batch_interval: 收到第一个事件后最多等待多久凑成一批（秒）
+            max_retries: 发送失败时的最大重试次数，之后丢弃该批事件
+            timeout: 单次请求的超时时间
+            max_pending: 最多积压的事件数量
+        """
+        super().__init__(daemon=True, name=f"webhook-{url}")
+        self.webhook_id = uuid.uuid4().hex[:12]
+        self.url = url
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.events = queue.Queue(maxsize=max_pending)
+        self.running = True
+        self.delivered = 0
+        self.dropped = 0
+        self.last_error: Optional[str] = None
+
+    def put(self, event: Dict) -> None:
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        self.running = False
+        self.events.put(None)
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.webhook_id,
+            "url": self.url,
+            "pending": self.events.qsize(),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "last_error": self.last_error,
+        }
+
+    def _next_batch(self) -> List[Dict]:
+        event = self.events.get()
+        if event is None:
+            return []
+        batch = [event]
+        deadline = time.time() + self.batch_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                event = self.events.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if event is None:
+                self.running = False
+                break
+            batch.append(event)
+        return batch
+
+    def _post(self, batch: List[Dict]) -> None:
+        body = json.dumps({"events": batch}, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            resp.read()
+
+    def run(self):
+        while self.running:
+            batch = self._next_batch()
+            if not batch:
+                break
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self._post(batch)
+                    self.delivered += len(batch)
+                    self.last_error = None
+                    break
+                except (urllib.error.URLError, OSError, ValueError) as e:
+                    self.last_error = str(e)
+                    if attempt == self.max_retries or not self.running:
+                        self.dropped += len(batch)
+                        break
+                    time.sleep(min(0.5 * 2 ** attempt, 30))
+
+
+class MessageWatcher(threading.Thread):
+    """
+    定期扫描微信的新消息并发布到 EventBus。
+    每个会话记录已经发布的最后几条消息（衔接点），下次只发布衔接点之后的消息，不会重复发布，两次扫描之间收到再多消息也不会遗漏
+    """
+    # 衔接点包含的消息数量
+    ANCHOR_SIZE = 3
+
+    def __init__(self, wechat, bus: EventBus, interval: float = 5, n_msg: int = 5,
+                 ui_lock=None, on_scan: Callable = None, max_msgs: int = 200):
+        """
+        Args:
+            wechat: WeChat 实例
+            bus: 事件发布的目标
+            interval: 两次扫描之间的间隔（秒）
+            n_msg: 第一次发布某个会话时附带的最新消息数量
+            ui_lock: 与其他界面操作共用的锁
+            on_scan: 每次扫描前调用，例如通知其他模块界面状态已经改变
+            max_msgs: 找不到衔接点时最多往上读取的消息数量
+        """
+        super().__init__(daemon=True, name="message-watcher")
+        self.wechat = wechat
+        self.bus = bus
+        self.interval = interval
+        self.n_msg = n_msg
+        self.ui_lock = ui_lock or threading.RLock()
+        self.on_scan = on_scan
+        self.running = True
+        self.scans = 0
+        self.max_msgs = max_msgs
+        self.last_error: Optional[str] = None
+        # 会话 -> 已经发布的最后几条消息（不含时间信息），从早到晚排列
+        self.anchors: Dict[str, Tuple] = {}
+
+    def _unseen(self, chat: str) -> Tuple[List, bool]:
+        """
+        从最新的消息往上读到衔接点为止
+        Return:
+            (衔接点之后的消息，从早到晚排列, 是否因为达到 max_msgs 而没有读到衔接点)
+        """
+        anchor = self.anchors.get(chat)
+        # 从新到旧排列的衔接点
+        wanted = list(anchor[::-1]) if anchor else None
+        read, positions = [], []
+        truncated = False
+        new = None
+        # 会话已经由 check_new_msg 打开，不需要再搜索
+        for msg in self.wechat.iter_dialogs(chat, None, False):
+            if wanted is None and len(read) >= self.n_msg:
+                break
+            if len(read) >= self.max_msgs:
+                truncated = True
+                break
+            read.append(tuple(msg))
+            if msg[0] != TIME_TYPE:
+                positions.append(len(read) - 1)
+                if wanted and len(positions) >= len(wanted) and \
+                        [read[i] for i in positions[-len(wanted):]] == wanted:
+                    new = read[:positions[-len(wanted)]]
+                    break
+        if new is None:
+            new = read
+
+        latest = [read[i] for i in positions[:self.ANCHOR_SIZE]]
+        if latest:
+            self.anchors[chat] = tuple(latest[::-1])
+        return new[::-1], truncated
+
+    def _publish(self, chat: str, _dialogs: List) -> None:
+        dialogs, truncated = self._unseen(chat)
+        if not dialogs:
+            return
+        event = {
+            "type": "new_message",
+            "chat": chat,
+            "messages": [{"type": t, "sender": sender, "text": text} for t, sender, text in dialogs],
+        }
+        if truncated:
+            event["truncated"] = True
+        self.bus.publish(event)
+
+    def scan(self) -> List[str]:
+        with self.ui_lock:
+            if self.on_scan is not None:
+                self.on_scan()
+            # 消息由 _publish 按衔接点读取，check_new_msg 不需要再读取
+            names = self.wechat.check_new_msg(self._publish, 0)
+        self.scans += 1
+        return names
+
+    def stop(self) -> None:
+        self.running = False
+
+    def run(self):
+        import uiautomation as auto
+
+        # uiautomation 需要在每个线程中初始化 COM
+        with auto.UIAutomationInitializerInThread():
+            while self.running:
+                try:
+                    self.scan()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                time.sleep(self.interval)
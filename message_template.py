@@ -0,0 +1,148 @@
+"""
+个性化的批量消息。
+接收人和字段保存在 CSV 或 XLSX 文件中（第一行为表头，例如 name,order_id），消息模板中用 {name}、{order_id} 引用字段。
+模板只解析一次，渲染时直接拼接；文件逐行读取，PreRenderer 在后台线程中提前渲染好后面的消息，发送循环不需要等待渲染。
+    template = MessageTemplate("你好 {name}，你的订单 {order_id} 已发货")
+    for name, text in PreRenderer(template, iter_recipients("recipients.csv")):
+        wechat.send_msg(name, text=text)
+"""
+import csv
+import os
+import queue
+import string
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 表格文件的扩展名
+TABLE_EXTENSIONS = (".csv", ".xlsx")
+
+
+class MessageTemplate:
+    def __init__(self, text: str):
+        """
+        Args:
+            text: 模板内容，{字段名} 会被替换为接收人对应的字段，{{ 和 }} 代表花括号本身
+        """
+        self.text = text
+        # 解析结果：字面文本和字段名交替出现，字段名为 None 代表只有字面文本
+        self.parts: List[Tuple[str, Optional[str]]] = []
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if field is not None and (spec or conversion or not field.isidentifier()):
+                raise ValueError(f"不支持的模板字段：{{{field}}}")
+            self.parts.append((literal, field))
+        self.fields = list(dict.fromkeys(f for _, f in self.parts if f is not None))
+
+    def check(self, columns: Iterable[str]) -> None:
+        """
+        确认模板用到的字段都在表头中
+        """
+        missing = [f for f in self.fields if f not in set(columns)]
+        if missing:
+            raise KeyError(f"表格中缺少模板字段：{', '.join(missing)}")
+
+    def render(self, row: Dict[str, str]) -> str:
+        return "".join(literal + ("" if field is None else str(row[field])) for literal, field in self.parts)
+
+
+def _iter_csv(path: str) -> Iterator[Dict[str, str]]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def _iter_xlsx(path: str) -> Iterator[Dict[str, str]]:
+    # 只在读取 XLSX 时导入，read_only 模式逐行读取，不会把整个表格读入内存
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(c).strip() if c is not None else "" for c in next(rows, ())]
+        for values in rows:
+            yield {k: "" if v is None else str(v) for k, v in zip(header, values)}
+    finally:
+        workbook.close()
+
+
+def iter_recipients(path: str, name_column: str = None) -> Iterator[Dict[str, str]]:
+    """
+    逐行读取接收人表格
+    Args:
+        path: CSV（UTF-8）或 XLSX 文件路径，第一行为表头
+        name_column: 接收人所在的列，默认为第一列
+    Return:
+        每行一个字典，接收人保存在 "name" 以及原来的列名中，空行被跳过
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in TABLE_EXTENSIONS:
+        raise ValueError(f"不支持的文件类型：{ext}")
+    rows = _iter_csv(path) if ext == ".csv" else _iter_xlsx(path)
+    for row in rows:
+        name_column = name_column or next(iter(row), None)
+        name = (row.get(name_column) or "").strip()
+        if name:
+            row.setdefault("name", name)
+            yield row
+
+
+class PreRenderer(threading.Thread):
+    """
+    在后台线程中读取接收人并渲染消息，结果放入有界队列，迭代时得到 (接收人, 消息)
+    """
+    _END = object()
+
+    def __init__(self, template: MessageTemplate, rows: Iterable[Dict[str, str]], ahead: int = 200,
+                 name_column: str = "name"):
+        """
+        Args:
+            template: 消息模板
+            rows: 接收人和字段，例如 iter_recipients() 的结果
+            ahead: 最多提前渲染的消息数量
+            name_column: 接收人所在的字段
+        """
+        super().__init__(daemon=True, name="message-prerenderer")
+        self.template = template
+        self.rows = rows
+        self.name_column = name_column
+        self.results = queue.Queue(maxsize=ahead)
+        self.running = True
+        self.error: Optional[BaseException] = None
+
+    def _put(self, item) -> bool:
+        # 消费者停止迭代后不再阻塞
+        while self.running:
+            try:
+                self.results.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(self):
+        try:
+            checked = False
+            for row in self.rows:
+                if not checked:
+                    self.template.check(row.keys())
+                    checked = True
+                if not self._put((row[self.name_column], self.template.render(row))):
+                    return
+        except BaseException as e:
+            self.error = e
+        self._put(self._END)
+
+    def stop(self) -> None:
+        self.running = False
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        if not self.is_alive() and self.ident is None:
+            self.start()
+        try:
+            while True:
+                item = self.results.get()
+                if item is self._END:
+                    break
+                yield item
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.stop()
@@ -0,0 +1,219 @@
+"""
+WeChat 操作的耗时统计。
+用 span 记录嵌套的操作耗时（例如 send_msg/get_contact/find:search_box），用计数器记录 UIA 搜索、点击、剪切板写入和等待次数，
+结果可以导出为 Prometheus 文本格式（WeChatFlaskServer 的 /metrics），也可以逐条写入 JSON Lines 追踪文件。
+每次记录只有一次 perf_counter 和几次字典更新，可以在生产环境中常开。
+"""
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+# 耗时直方图的分桶上限（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 计数器说明
+COUNTERS = {
+    "uia_searches": "Number of UIA control searches.",
+    "clicks": "Number of mouse or window message clicks.",
+    "clipboard_writes": "Number of clipboard writes.",
+    "pattern_calls": "Number of inputs through UIA Invoke and Value patterns.",
+    "sleeps": "Number of sleep calls.",
+    "sleep_seconds": "Seconds spent in sleep calls.",
+}
+
+# 设置为 False 后 span 和计数器都不再记录
+enabled = True
+
+_lock = threading.Lock()
+_local = threading.local()
+# span 路径 -> [各分桶计数, 总耗时, 次数]
+_histograms: Dict[str, List] = {}
+# (计数器, 最外层 span) -> 数值
+_counters: Dict[Tuple[str, str], float] = {}
+_trace_file = None
+# span 结束时调用 listener(路径, 开始时间, 耗时, 线程名)，开始时间为 perf_counter，用于性能分析等临时的记录
+_listeners: List[Callable[[str, float, float, str], None]] = []
+
+
+def _stack() -> List[str]:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _observe(path: str, seconds: float) -> None:
+    with _lock:
+        hist = _histograms.get(path)
+        if hist is None:
+            hist = _histograms[path] = [[0] * len(BUCKETS), 0.0, 0]
+        index = bisect.bisect_left(BUCKETS, seconds)
+        if index < len(BUCKETS):
+            hist[0][index] += 1
+        hist[1] += seconds
+        hist[2] += 1
+
+
+@contextmanager
+def span(name: str):
+    """
+    记录一段代码的耗时，嵌套的 span 以 "/" 连接成路径
+    """
+    if not enabled:
+        yield
+        return
+
+    stack = _stack()
+    stack.append(name)
+    path = "/".join(stack)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        stack.pop()
+        _observe(path, seconds)
+        if _trace_file is not None:
+            _write_trace({"ts": time.time(), "span": path, "seconds": seconds,
+                          "thread": threading.current_thread().name, "error": error})
+        for listener in _listeners:
+            listener(path, start, seconds, threading.current_thread().name)
+
+
+def timed(name: str = None):
+    """
+    装饰器，记录函数每次调用的耗时，默认使用函数名作为 span 名称
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(counter: str, n: float = 1) -> None:
+    """
+    累加计数器，按当前线程最外层的 span（例如 send_msg）分别统计
+    """
+    if not enabled:
+        return
+    stack = getattr(_local, "stack", None)
+    key = (counter, stack[0] if stack else "")
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def sleep(seconds: float) -> None:
+    """
+    带计数的 time.sleep
+    """
+    count("sleeps")
+    count("sleep_seconds", seconds)
+    with span("sleep"):
+        time.sleep(seconds)
+
+
+def enable_trace(path: str) -> None:
+    """
+    把之后结束的每个 span 追加写入 JSON Lines 文件，path 为空时关闭
+    """
+    global _trace_file
+    with _lock:
+        if _trace_file is not None:
+            _trace_file.close()
+        _trace_file = open(path, "a", encoding="utf-8", buffering=1) if path else None
+
+
+def add_listener(listener: Callable[[str, float, float, str], None]) -> None:
+    """
+    注册 span 结束时的回调，回调在结束 span 的线程中执行，应当尽快返回
+    """
+    global _listeners
+    with _lock:
+        # 复制后替换，span 遍历时不需要加锁
+        _listeners = _listeners + [listener]
+
+
+def remove_listener(listener: Callable[[str, float, float, str], None]) -> None:
+    global _listeners
+    with _lock:
+        _listeners = [l for l in _listeners if l is not listener]
+
+
+def _write_trace(record: Dict) -> None:
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _lock:
+        if _trace_file is not None:
+            _trace_file.write(line)
+
+
+def reset() -> None:
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def snapshot() -> Dict:
+    """
+    当前统计结果
+    Return:
+        {"spans": {路径: {"count": 次数, "sum": 总耗时, "buckets": 各分桶计数}},
+         "counters": {计数器: {最外层 span: 数值}}}
+    """
+    with _lock:
+        spans = {path: {"count": c, "sum": s, "buckets": list(b)} for path, (b, s, c) in _histograms.items()}
+        counters = {}
+        for (counter, op), value in _counters.items():
+            counters.setdefault(counter, {})[op] = value
+    return {"spans": spans, "counters": counters}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render_prometheus() -> str:
+    """
+    导出为 Prometheus 文本格式
+    """
+    data = snapshot()
+    lines = [
+        "# HELP easychat_span_seconds Duration of WeChat automation steps.",
+        "# TYPE easychat_span_seconds histogram",
+    ]
+    for path in sorted(data["spans"]):
+        item = data["spans"][path]
+        label = _escape(path)
+        cumulative = 0
+        for le, n in zip(BUCKETS, item["buckets"]):
+            cumulative += n
+            lines.append(f'easychat_span_seconds_bucket{{span="{label}",le="{le}"}} {cumulative}')
+        lines.append(f'easychat_span_seconds_bucket{{span="{label}",le="+Inf"}} {item["count"]}')
+        lines.append(f'easychat_span_seconds_sum{{span="{label}"}} {item["sum"]}')
+        lines.append(f'easychat_span_seconds_count{{span="{label}"}} {item["count"]}')
+
+    for counter, description in COUNTERS.items():
+        metric = f"easychat_{counter}_total"
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} counter")
+        for op, value in sorted(data["counters"].get(counter, {}).items()):
+            lines.append(f'{metric}{{op="{_escape(op)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+# 通过环境变量开启追踪文件，例如 EASYCHAT_TRACE=trace.jsonl
+if os.environ.get("EASYCHAT_TRACE"):
+    enable_trace(os.environ["EASYCHAT_TRACE"])
@@ -7,6 +7,7 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from ui_auto_wechat import WeChat
+from name_index import NameIndex
 from functools import partial
 
 
@@ -20,7 +21,7 @@ class ClockThread(QThread):
         self.send_func = None
         # 定时列表
         self.clocks = None
-        # 是否防止自动下线
+        # 是否防止自动下线（图形界面改为由 wechat_watchdog 在空闲时执行，避免插入批量发送中）
         self.prevent_offline = False
         self.prevent_func = None
         # 每隔多少分钟进行一次防止自动下线操作
@@ -216,4 +217,125 @@ class MySpinBox(QWidget):
         self.setLayout(layout)
 
     # def valuechange(self):
-    #     self.label.setText(f"{self.desc}: {self.spin_box.value()}")
\ No newline at end of file
+    #     self.label.setText(f"{self.desc}: {self.spin_box.value()}")
+
+class NameListModel(QAbstractListModel):
+    """
+    NameIndex 的列表模型，可以按前缀或拼音首字母过滤。
+    多个模型可以共用同一个索引，索引追加名称时只插入新增的行，不会重置整个视图
+    """
+    def __init__(self, index: NameIndex, parent=None) -> None:
+        super().__init__(parent)
+        self.index = index
+        self.query = ""
+        # 过滤后的行对应的名称下标，为 None 时显示全部名称
+        self.rows = None
+        self.count = len(index)
+        index.subscribe(self.on_extend)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return self.count if self.rows is None else len(self.rows)
+
+    def data(self, model_index: QModelIndex, role=Qt.DisplayRole):
+        if not model_index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        row = model_index.row()
+        return self.index.names[row if self.rows is None else self.rows[row]]
+
+    def on_extend(self, start: int, end: int) -> None:
+        """索引追加或清空时调用"""
+        if end == 0:
+            self.beginResetModel()
+            self.count = 0
+            self.rows = None if not self.query else []
+            self.endResetModel()
+            return
+
+        new_rows = None if self.rows is None else self.index.search(self.query, start)
+        first = self.rowCount()
+        added = end - start if new_rows is None else len(new_rows)
+        if added:
+            self.beginInsertRows(QModelIndex(), first, first + added - 1)
+        self.count = end
+        if new_rows is not None:
+            self.rows.extend(new_rows)
+        if added:
+            self.endInsertRows()
+
+    def set_filter(self, query: str) -> None:
+        self.beginResetModel()
+        self.query = query.strip()
+        self.rows = self.index.search(self.query)
+        self.endResetModel()
+
+
+class NameListView(QWidget):
+    """
+    带过滤框的名称列表，只绘制可见的行，几万个名称也不会卡顿
+    """
+    # 双击某个名称
+    name_activated = pyqtSignal(str)
+
+    def __init__(self, index: NameIndex, placeholder: str = "按名称或拼音首字母过滤", parent=None) -> None:
+        super().__init__(parent)
+        self.model = NameListModel(index, self)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        filter_layout = QHBoxLayout()
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText(placeholder)
+        self.filter_input.setClearButtonEnabled(True)
+        filter_layout.addWidget(self.filter_input)
+        self.count_label = QLabel()
+        filter_layout.addWidget(self.count_label)
+        layout.addLayout(filter_layout)
+
+        self.view = QListView()
+        self.view.setModel(self.model)
+        # 所有行高度相同，视图不需要逐行计算尺寸
+        self.view.setUniformItemSizes(True)
+        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.view.doubleClicked.connect(lambda i: self.name_activated.emit(i.data()))
+        layout.addWidget(self.view)
+
+        # 输入停顿后再过滤，连续输入时不会每个字符都查询一次
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(150)
+        self.filter_timer.timeout.connect(lambda: self.model.set_filter(self.filter_input.text()))
+        self.filter_input.textChanged.connect(self.filter_timer.start)
+
+        self.model.modelReset.connect(self.update_count)
+        self.model.rowsInserted.connect(self.update_count)
+        self.update_count()
+
+    def update_count(self, *_) -> None:
+        self.count_label.setText(f"{self.model.rowCount()}/{len(self.model.index)}")
+
+    def selected_names(self) -> list:
+        return [i.data() for i in self.view.selectionModel().selectedRows()]
+
+
+class NameComboBox(QComboBox):
+    """
+    可编辑的名称下拉框，下拉列表和输入时的补全列表都由 NameIndex 的模型提供
+    """
+    def __init__(self, index: NameIndex, parent=None) -> None:
+        super().__init__(parent)
+        self.setEditable(True)
+        self.setInsertPolicy(QComboBox.NoInsert)
+        self.setModel(NameListModel(index, self))
+        self.view().setUniformItemSizes(True)
+
+        # 补全列表使用单独的过滤模型，由输入内容通过索引过滤，而不是由 QCompleter 逐行比较
+        self.completion_model = NameListModel(index, self)
+        completer = QCompleter(self.completion_model, self)
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.popup().setUniformItemSizes(True)
+        self.setCompleter(completer)
+        self.lineEdit().textEdited.connect(self.completion_model.set_filter)
@@ -0,0 +1,196 @@
+"""
+多开微信的并行调度。
+每个微信窗口对应一个 WeChat 实例（通过窗口句柄或进程 ID 绑定，各自维护控件定位缓存）和一个工作线程，
+发送消息时优先使用窗口消息输入，只有剪切板、真实鼠标键盘这类全局资源才需要在账号之间串行使用。
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List
+
+import uiautomation as auto
+
+from ui_auto_wechat import WeChat, input_lock
+from wechat_locale import WeChatLocale
+
+# 微信主窗口的类名
+MAIN_WINDOW_CLASS = "WeChatMainWndForPC"
+
+# 只操作主窗口内控件、可以完全通过窗口消息完成的操作，其余操作需要独占真实鼠标键盘
+MESSAGE_SAFE_METHODS = {"send_msg", "get_contact", "get_dialogs", "get_dialogs_by_time_blocks", "prevent_offline"}
+
+
+def find_windows() -> List[Dict]:
+    """
+    查找桌面上所有的微信主窗口
+    Return:
+        windows: [{"handle": 窗口句柄, "process_id": 进程 ID, "name": 窗口名称}, ...]
+    """
+    windows = []
+    for control in auto.GetRootControl().GetChildren():
+        if control.ClassName == MAIN_WINDOW_CLASS or WeChatLocale.key_of(control.Name) == "weixin":
+            windows.append({"handle": control.NativeWindowHandle, "process_id": control.ProcessId, "name": control.Name})
+    return windows
+
+
+class AccountStats:
+    """单个账号的吞吐统计"""
+    def __init__(self):
+        self.started = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def to_dict(self) -> Dict:
+        elapsed = max(time.time() - self.started, 1e-6)
+        done = self.completed + self.failed
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "throughput_per_min": self.completed / elapsed * 60,
+            "avg_seconds": self.busy_seconds / done if done else 0.0,
+            "avg_wait_seconds": self.wait_seconds / done if done else 0.0,
+            "utilization": self.busy_seconds / elapsed,
+        }
+
+
+class AccountWorker(threading.Thread):
+    """单个账号的工作线程，按顺序执行该账号的任务"""
+    def __init__(self, account: str, wechat: WeChat):
+        super().__init__(daemon=True, name=f"wechat-{account}")
+        self.account = account
+        self.wechat = wechat
+        self.jobs = queue.Queue()
+        self.stats = AccountStats()
+        self.busy = False
+
+    def load(self) -> int:
+        return self.jobs.qsize() + (1 if self.busy else 0)
+
+    def run(self):
+        # uiautomation 需要在每个线程中初始化 COM
+        with auto.UIAutomationInitializerInThread():
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    break
+                method, args, kwargs, future, queued_at = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                self.busy = True
+                start = time.time()
+                self.stats.wait_seconds += start - queued_at
+                try:
+                    result = self._call(method, args, kwargs)
+                except Exception as e:
+                    self.stats.failed += 1
+                    future.set_exception(e)
+                else:
+                    # send_msg 返回 False 代表发送后没有确认成功
+                    if result is False:
+                        self.stats.failed += 1
+                    else:
+                        self.stats.completed += 1
+                    future.set_result(result)
+                finally:
+                    self.stats.busy_seconds += time.time() - start
+                    self.busy = False
+
+    def _call(self, method: str, args, kwargs):
+        func = getattr(self.wechat, method)
+        if self.wechat.input_mode == "message" and method in MESSAGE_SAFE_METHODS:
+            return func(*args, **kwargs)
+
+        # 需要真实鼠标键盘的操作独占输入设备，并先把该账号的窗口切换到前台
+        with input_lock:
+            self.wechat.get_wechat().SetActive()
+            return func(*args, **kwargs)
+
+
+class WeChatCoordinator:
+    def __init__(self, path: str, locale: str = "zh-CN", input_mode: str = "message"):
+        """
+        Args:
+            path: 微信打开路径
+            locale: 微信语言
+            input_mode: 各账号的输入方式，"message" 可以让多个账号并行发送
+        """
+        self.path = path
+        self.locale = locale
+        self.input_mode = input_mode
+        self.workers: Dict[str, AccountWorker] = {}
+
+    def add_account(self, account: str, handle: int = None, process_id: int = None) -> WeChat:
+        """
+        添加一个账号（微信窗口），handle 与 process_id 至少指定一个
+        """
+        wechat = WeChat(self.path, self.locale, handle=handle, process_id=process_id, input_mode=self.input_mode)
+        worker = AccountWorker(account, wechat)
+        worker.start()
+        self.workers[account] = worker
+        return wechat
+
+    def discover(self) -> List[str]:
+        """
+        自动添加桌面上所有的微信窗口，账号名使用进程 ID
+        """
+        known = {worker.wechat.handle for worker in self.workers.values()}
+        added = []
+        for window in find_windows():
+            if window["handle"] in known:
+                continue
+            account = str(window["process_id"])
+            self.add_account(account, handle=window["handle"])
+            added.append(account)
+        return added
+
+    def submit(self, account: str, method: str, *args, **kwargs) -> Future:
+        """
+        将任务提交到指定账号
+        Args:
+            account: 账号名
+            method: WeChat 的方法名，例如 "send_msg"
+        Return:
+            future: 任务结果
+        """
+        future = Future()
+        self.workers[account].jobs.put((method, args, kwargs, future, time.time()))
+        return future
+
+    def submit_any(self, method: str, *args, **kwargs) -> Future:
+        """
+        将任务提交到当前负载最低的账号，用于任意账号都可以完成的任务
+        """
+        account = min(self.workers, key=lambda name: self.workers[name].load())
+        return self.submit(account, method, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        各账号的吞吐统计
+        """
+        report = {account: worker.stats.to_dict() for account, worker in self.workers.items()}
+        for account, worker in self.workers.items():
+            report[account]["queued"] = worker.jobs.qsize()
+        return report
+
+    def shutdown(self, wait: bool = True) -> None:
+        for worker in self.workers.values():
+            worker.jobs.put(None)
+        if wait:
+            for worker in self.workers.values():
+                worker.join()
+        self.workers = {}
+
+
+if __name__ == '__main__':
+    path = r"D:\Program Files (x86)\WeChat\WeChat.exe"
+    coordinator = WeChatCoordinator(path)
+    print(coordinator.discover())
+
+    # futures = [coordinator.submit(account, "send_msg", "文件传输助手", None, "测试") for account in coordinator.workers]
+    # print([f.result() for f in futures])
+    # print(coordinator.stats())
+    coordinator.shutdown()
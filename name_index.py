@@ -0,0 +1,267 @@
+"""
+联系人和群聊名称的本地索引。
+名称按块追加（例如图形界面中工作线程每读取一批联系人就追加一次），每个名称以小写全名、拼音首字母以及别名（备注）作为键，
+所有键保存在一个有序列表中，前缀查询通过二分查找完成，开销只与命中的数量有关，与名称总数无关。
+键在第一次查询时才为新追加的名称生成，只显示不过滤的列表（例如几十万行的用户列表）不需要额外的内存。
+拼音首字母优先使用 pypinyin（可选依赖），没有安装时根据 GB2312 一级汉字的编码区间推算。
+FuzzyNameIndex 以昵称、备注和群名的二元组（bigram）建立倒排索引，在操作微信之前确认接收人确实存在，
+写错的名字给出最相近的候选，而不是由微信搜索结果的第一项决定发给谁。
+"""
+import bisect
+import math
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# GB2312 一级汉字按拼音排序，每个首字母对应的起始编码
+_GB2312_INITIALS = [
+    (0xB0A1, "a"), (0xB0C5, "b"), (0xB2C1, "c"), (0xB4EE, "d"), (0xB6EA, "e"), (0xB7A2, "f"),
+    (0xB8C1, "g"), (0xB9FE, "h"), (0xBBF7, "j"), (0xBFA6, "k"), (0xC0AC, "l"), (0xC2E8, "m"),
+    (0xC4C3, "n"), (0xC5B6, "o"), (0xC5BE, "p"), (0xC6DA, "q"), (0xC8BB, "r"), (0xC8F6, "s"),
+    (0xCBFA, "t"), (0xCDDA, "w"), (0xCEF4, "x"), (0xD1B9, "y"), (0xD4D1, "z"),
+]
+_GB2312_STARTS = [code for code, _ in _GB2312_INITIALS]
+_GB2312_END = 0xD7F9
+
+try:
+    from pypinyin import Style, pinyin as _pinyin
+except ImportError:
+    _pinyin = None
+
+
+def _initial(char: str) -> str:
+    if char.isascii():
+        return char.lower() if char.isalnum() else ""
+    try:
+        raw = char.encode("gb2312")
+    except UnicodeEncodeError:
+        return ""
+    if len(raw) != 2:
+        return ""
+    code = raw[0] << 8 | raw[1]
+    if not _GB2312_STARTS[0] <= code < _GB2312_END:
+        # 二级汉字按部首排序，无法推算首字母
+        return ""
+    return _GB2312_INITIALS[bisect.bisect_right(_GB2312_STARTS, code) - 1][1]
+
+
+def pinyin_initials(name: str) -> str:
+    """
+    名称的拼音首字母，例如 "张三abc" -> "zsabc"，无法识别的字符被忽略
+    """
+    if _pinyin is not None:
+        return "".join(s[0][:1] for s in _pinyin(name, style=Style.FIRST_LETTER, errors=lambda x: list(x))).lower()
+    return "".join(_initial(c) for c in name)
+
+
+# 名称，或者 (名称, [别名, ...])
+Entry = Union[str, Tuple[str, Sequence[str]]]
+
+
+class NameIndex:
+    def __init__(self):
+        self.names: List[str] = []
+        # (键, 名称的下标)，按键排序
+        self._keys: List[Tuple[str, int]] = []
+        # 已经生成键的名称数量，以及还没有生成键的名称的别名
+        self._indexed = 0
+        self._aliases: Dict[int, Sequence[str]] = {}
+        # 追加名称时调用 listener(start, end)，清空时调用 listener(0, 0)
+        self._listeners: List[Callable[[int, int], None]] = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def subscribe(self, listener: Callable[[int, int], None]) -> None:
+        self._listeners.append(listener)
+
+    def extend(self, entries: Iterable[Entry]) -> Tuple[int, int]:
+        """
+        追加一批名称
+        Return:
+            (start, end): 新名称的下标范围
+        """
+        start = len(self.names)
+        for entry in entries:
+            if isinstance(entry, str):
+                self.names.append(entry)
+            else:
+                name, aliases = entry
+                if aliases:
+                    self._aliases[len(self.names)] = aliases
+                self.names.append(name)
+        end = len(self.names)
+        if end > start:
+            for listener in self._listeners:
+                listener(start, end)
+        return start, end
+
+    def _build_keys(self) -> None:
+        """为还没有生成键的名称生成键"""
+        new_keys = []
+        for i in range(self._indexed, len(self.names)):
+            keys = set()
+            for text in (self.names[i], *self._aliases.pop(i, ())):
+                if text:
+                    keys.add(text.lower())
+                    initials = pinyin_initials(text)
+                    if initials:
+                        keys.add(initials)
+            new_keys.extend((key, i) for key in keys)
+        self._indexed = len(self.names)
+        # 已有的键是一段有序序列，追加排好序的新键后 Timsort 只需要一次归并
+        new_keys.sort()
+        self._keys.extend(new_keys)
+        self._keys.sort()
+
+    def clear(self) -> None:
+        self.names = []
+        self._keys = []
+        self._indexed = 0
+        self._aliases = {}
+        for listener in self._listeners:
+            listener(0, 0)
+
+    def search(self, query: str, start: int = 0) -> Optional[List[int]]:
+        """
+        按前缀查询名称（全名、拼音首字母或别名）
+        Args:
+            query: 查询内容，为空时代表全部
+            start: 只返回下标不小于 start 的名称
+        Return:
+            按原始顺序排列的下标，query 为空时返回 None
+        """
+        query = query.strip().lower()
+        if not query:
+            return None
+        if self._indexed < len(self.names):
+            self._build_keys()
+        hits = set()
+        pos = bisect.bisect_left(self._keys, (query, -1))
+        while pos < len(self._keys):
+            key, i = self._keys[pos]
+            if not key.startswith(query):
+                break
+            if i >= start:
+                hits.add(i)
+            pos += 1
+        return sorted(hits)
+
+
+def normalize_name(name: str) -> str:
+    """
+    比较名称时使用的形式：群名中的顿号替换为空格（与 find_all_groups 相同），忽略首尾空白和大小写
+    """
+    return name.replace("、", " ").strip().lower()
+
+
+def _grams(key: str) -> List[str]:
+    padded = f"^{key}$"
+    return [padded[i:i + 2] for i in range(len(padded) - 1)]
+
+
+class FuzzyNameIndex:
+    def __init__(self, threshold: float = 0.5, max_candidates: int = 5):
+        """
+        Args:
+            threshold: 候选名称的最低相似度（二元组的 Dice 系数）
+            max_candidates: 最多返回的候选数量
+        """
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        # 名称（昵称或群名） -> 该名称的所有叫法（名称本身以及备注）
+        self.aliases: Dict[str, set] = {}
+        # 规范化的叫法 -> 对应的名称
+        self._exact: Dict[str, set] = defaultdict(set)
+        # 二元组 -> 规范化的叫法
+        self._postings: Dict[str, set] = defaultdict(set)
+
+    def __len__(self):
+        return len(self.aliases)
+
+    def extend(self, entries: Iterable[Entry]) -> None:
+        """
+        追加名称，格式与 NameIndex.extend 相同：名称，或者 (名称, [备注, ...])
+        """
+        for entry in entries:
+            name, aliases = (entry, ()) if isinstance(entry, str) else entry
+            known = self.aliases.setdefault(name, set())
+            for text in (name, *aliases):
+                if not text:
+                    continue
+                known.add(text)
+                key = normalize_name(text)
+                if key not in self._exact:
+                    for gram in _grams(key):
+                        self._postings[gram].add(key)
+                self._exact[key].add(name)
+
+    def clear(self) -> None:
+        self.aliases.clear()
+        self._exact.clear()
+        self._postings.clear()
+
+    def names_for(self, query: str) -> set:
+        """完全匹配 query（昵称、备注或群名）的名称"""
+        return self._exact.get(normalize_name(query), set())
+
+    def similar(self, query: str) -> List[Tuple[str, float]]:
+        """
+        与 query 最相近的叫法及其相似度，按相似度从高到低排列
+        """
+        grams = set(_grams(normalize_name(query)))
+        # 相似度达到阈值至少需要共有的二元组数量；候选一定出现在最稀有的 len(grams) - need + 1 个二元组中，
+        # 因此只需要合并这几个倒排列表，不需要遍历数字、常见姓氏之类非常长的列表
+        need = max(1, math.ceil(self.threshold * len(grams) / (2 - self.threshold)))
+        ordered = sorted(grams, key=lambda g: len(self._postings.get(g, ())))
+        prefix, rest = ordered[:len(grams) - need + 1], ordered[len(grams) - need + 1:]
+        shared = Counter()
+        for gram in prefix:
+            shared.update(self._postings.get(gram, ()))
+        scored = []
+        for candidate, n in shared.items():
+            # 叫法的二元组数量按长度 + 1 计算，先用剩余二元组全部命中的上限排除不可能达到阈值的候选
+            total = len(grams) + len(candidate) + 1
+            if 2 * (n + len(rest)) < self.threshold * total:
+                continue
+            n += sum(1 for gram in rest if candidate in self._postings[gram])
+            score = 2 * n / total
+            if score >= self.threshold:
+                scored.append((candidate, score))
+        scored.sort(key=lambda x: -x[1])
+        result = []
+        for candidate, score in scored:
+            for name in sorted(self._exact[candidate]):
+                result.append((name, score))
+            if len(result) >= self.max_candidates:
+                break
+        return result[:self.max_candidates]
+
+    def resolve(self, query: str) -> Tuple[Optional[str], List[str]]:
+        """
+        Return:
+            (名称, 候选): 唯一完全匹配时返回对应的名称；否则名称为 None，候选为相近或重名的名称
+        """
+        exact = self.names_for(query)
+        if len(exact) == 1:
+            return next(iter(exact)), []
+        if exact:
+            # 多个联系人使用相同的备注或昵称，微信搜索结果无法确定是哪一个
+            return None, sorted(exact)[:self.max_candidates]
+        return None, [name for name, _ in self.similar(query)]
+
+    def validate(self, queries: Iterable[str]) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+        """
+        一次性检查整个接收人列表
+        Return:
+            (resolved, rejected): 可以确定的接收人 -> 名称；无法确定的接收人 -> 候选名称
+        """
+        resolved, rejected = {}, {}
+        for query in queries:
+            if query in resolved or query in rejected:
+                continue
+            name, candidates = self.resolve(query)
+            if name is None:
+                rejected[query] = candidates
+            else:
+                resolved[query] = name
+        return resolved, rejected
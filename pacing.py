@@ -0,0 +1,95 @@
+"""
+批量发送的自适应节奏（AIMD）。
+固定的发送间隔要么太慢，要么快到微信来不及处理而丢失输入。AdaptivePacer 记录每次发送的耗时以及是否确认发送成功
+（send_msg 的返回值）：连续确认成功时每次把速率加上一个固定值（加性增），发送失败或界面响应明显变慢时把速率乘以一个系数（乘性减），
+速率最终稳定在当前机器和账号能够承受的水平附近。
+    pacer = AdaptivePacer(initial_rate=30)
+    for name in names:
+        start = time.perf_counter()
+        ok = wechat.send_msg(name, text=text)
+        latency = time.perf_counter() - start
+        pacer.record(latency, ok)
+        time.sleep(pacer.delay(latency))
+"""
+import threading
+import time
+from collections import deque
+
+
+class AdaptivePacer:
+    def __init__(self, initial_rate: float = 30.0, min_rate: float = 2.0, max_rate: float = 60.0,
+                 increase: float = 2.0, decrease: float = 0.5, slow_factor: float = 2.0, min_slowdown: float = 0.5,
+                 warmup: int = 3):
+        """
+        Args:
+            initial_rate: 初始速率（条/分钟）
+            min_rate: 最低速率（条/分钟）
+            max_rate: 最高速率（条/分钟）
+            increase: 每次确认成功后增加的速率（条/分钟）
+            decrease: 发送失败或响应变慢时速率乘以的系数
+            slow_factor: 耗时超过平均耗时的多少倍算作响应变慢
+            min_slowdown: 耗时至少比平均耗时多出的秒数才算作响应变慢，避免很短的耗时因为抖动被误判
+            warmup: 前几次发送只用来估计平均耗时，不判断是否变慢
+        """
+        if not 0 < decrease < 1:
+            raise ValueError("decrease 必须在 0 和 1 之间")
+        if not 0 < min_rate <= max_rate:
+            raise ValueError("速率范围不正确")
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_factor = slow_factor
+        self.min_slowdown = min_slowdown
+        self.warmup = warmup
+        self.rate = min(max(initial_rate, min_rate), max_rate)
+        # 发送耗时的指数移动平均（秒）
+        self.avg_latency = None
+        self.sent = 0
+        self.failed = 0
+        self.slow = 0
+        # 最近一分钟内完成发送的时间，用于计算实际速率
+        self._completed = deque()
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, confirmed: bool) -> None:
+        """
+        记录一次发送
+        Args:
+            latency: 这次发送的耗时（秒）
+            confirmed: 是否确认发送成功
+        """
+        with self._lock:
+            self.sent += 1
+            now = time.monotonic()
+            self._completed.append(now)
+            while self._completed and now - self._completed[0] > 60:
+                self._completed.popleft()
+
+            slow = (self.avg_latency is not None and self.sent > self.warmup
+                    and latency > self.slow_factor * self.avg_latency
+                    and latency - self.avg_latency > self.min_slowdown)
+            if not confirmed or slow:
+                self.failed += not confirmed
+                self.slow += slow
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+            # 变慢的那一次只计入一部分，避免一次卡顿就抬高“正常”耗时
+            weight = 0.05 if slow else 0.2
+            self.avg_latency = latency if self.avg_latency is None else \
+                (1 - weight) * self.avg_latency + weight * latency
+
+    def delay(self, latency: float = 0.0) -> float:
+        """
+        下一次发送前需要等待的时间（秒）：两次发送开始的间隔为 60 / rate，发送本身的耗时计入间隔
+        """
+        return max(0.0, 60.0 / self.rate - latency)
+
+    def observed_rate(self) -> float:
+        """最近一分钟实际完成的发送数量（条/分钟），开始不到一分钟时按已经过的时间折算"""
+        with self._lock:
+            if len(self._completed) < 2:
+                return 0.0
+            span = self._completed[-1] - self._completed[0]
+            return (len(self._completed) - 1) * 60.0 / span if span > 0 else 0.0
@@ -0,0 +1,191 @@
+"""
+运行中的性能分析。
+所有界面操作都在 UIActuator 线程中执行，分析的对象就是这个线程，可以在批量发送进行中随时开始和结束，不需要重启：
+    - "sample"：后台线程每隔几毫秒读取一次 actuator 线程的调用栈，对运行中的操作几乎没有影响
+    - "cprofile"：通过 actuator 在它自己的线程中开启 cProfile，结束时同样通过 actuator 关闭，得到每个函数的精确调用次数和耗时
+同时通过 metrics 的 span 回调记录这段时间内所有 UIA 操作（send_msg、find:search_box、sleep 等）的时间线。
+结果可以导出为 speedscope JSON（https://www.speedscope.app 打开，采样结果和时间线分别是一个 profile），或者 pstats 文件（cprofile 方式）。
+    profiler = Profiler(actuator)
+    profiler.start()
+    ...
+    profiler.stop()
+    profiler.save("profile.speedscope.json")
+"""
+import cProfile
+import json
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import metrics
+
+MODES = ("sample", "cprofile")
+
+
+class Profiler:
+    def __init__(self, actuator, mode: str = "sample", interval: float = 0.005):
+        """
+        Args:
+            actuator: 执行界面操作的 UIActuator
+            mode: "sample" 为采样分析，"cprofile" 为 cProfile 分析
+            interval: 采样间隔（秒）
+        """
+        if mode not in MODES:
+            raise ValueError(f"不支持的分析方式：{mode}")
+        self.actuator = actuator
+        self.mode = mode
+        self.interval = interval
+        self.started_at = None
+        self.stopped_at = None
+        # 采样结果：(调用栈中各帧的下标，从最外层开始, 权重)
+        self.samples: List[Tuple[Tuple[int, ...], float]] = []
+        self.frames: List[Dict] = []
+        self._frame_ids: Dict[Tuple, int] = {}
+        # UIA 操作的时间线：(线程名, span 路径, 开始时间, 耗时)
+        self.spans: List[Tuple[str, str, float, float]] = []
+        self.profile = None
+        self._sampler = None
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self.started_at = time.perf_counter()
+        metrics.add_listener(self._on_span)
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample, daemon=True, name="profiler-sampler")
+            self._sampler.start()
+        else:
+            self.profile = cProfile.Profile()
+            # 在 actuator 线程中开启，之后它执行的每个操作都会被记录
+            self.actuator.call("profiler", self.profile.enable)
+
+    def stop(self) -> None:
+        if not self._running:
+            return
+        self._running = False
+        if self.mode == "sample":
+            self._sampler.join()
+        else:
+            self.actuator.call("profiler", self.profile.disable)
+        metrics.remove_listener(self._on_span)
+        self.stopped_at = time.perf_counter()
+
+    def run(self, seconds: float) -> "Profiler":
+        """分析接下来的 seconds 秒"""
+        self.start()
+        try:
+            time.sleep(seconds)
+        finally:
+            self.stop()
+        return self
+
+    def _on_span(self, path: str, start: float, seconds: float, thread: str) -> None:
+        self.spans.append((thread, path, start, seconds))
+
+    def _frame_id(self, frame) -> int:
+        code = frame.f_code
+        key = (code.co_filename, code.co_firstlineno, code.co_name)
+        index = self._frame_ids.get(key)
+        if index is None:
+            index = self._frame_ids[key] = len(self.frames)
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def _sample(self) -> None:
+        last = time.perf_counter()
+        while self._running:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            frame = sys._current_frames().get(self.actuator.ident)
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame))
+                frame = frame.f_back
+            if stack:
+                self.samples.append((tuple(reversed(stack)), now - last))
+            last = now
+
+    def _timeline(self, frames: List[Dict], frame_ids: Dict[str, int]) -> List[Dict]:
+        """把 span 转换为 speedscope 的 evented profile，每个线程一个"""
+        end = (self.stopped_at or time.perf_counter()) - self.started_at
+        by_thread = defaultdict(list)
+        for thread, path, start, seconds in self.spans:
+            begin = max(0.0, start - self.started_at)
+            by_thread[thread].append((begin, min(end, begin + seconds), path.rsplit("/", 1)[-1]))
+
+        profiles = []
+        for thread, spans in by_thread.items():
+            # 外层的 span 先开始，或者同时开始时持续更久
+            spans.sort(key=lambda s: (s[0], -s[1]))
+            events, stack = [], []
+            for begin, finish, name in spans:
+                while stack and stack[-1][0] <= begin:
+                    closing, frame = stack.pop()
+                    events.append({"type": "C", "frame": frame, "at": closing})
+                if stack:
+                    # 计时误差不能让内层的 span 超出外层
+                    finish = min(finish, stack[-1][0])
+                if name not in frame_ids:
+                    frame_ids[name] = len(frames)
+                    frames.append({"name": name})
+                events.append({"type": "O", "frame": frame_ids[name], "at": begin})
+                stack.append((finish, frame_ids[name]))
+            while stack:
+                closing, frame = stack.pop()
+                events.append({"type": "C", "frame": frame, "at": closing})
+            profiles.append({"type": "evented", "name": f"UIA 操作 ({thread})", "unit": "seconds",
+                             "startValue": 0, "endValue": end, "events": events})
+        return profiles
+
+    def to_speedscope(self) -> Dict:
+        """
+        speedscope 格式的结果：采样得到的调用栈（sample 方式）以及各线程 UIA 操作的时间线
+        """
+        frames = list(self.frames)
+        end = (self.stopped_at or time.perf_counter()) - self.started_at
+        profiles = []
+        if self.samples:
+            profiles.append({
+                "type": "sampled", "name": f"{self.actuator.name} 调用栈", "unit": "seconds",
+                "startValue": 0, "endValue": end,
+                "samples": [list(stack) for stack, _ in self.samples],
+                "weights": [weight for _, weight in self.samples],
+            })
+        profiles.extend(self._timeline(frames, {}))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"easyChat {time.strftime('%Y-%m-%d %H:%M:%S')}",
+            "exporter": "easyChat profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def to_pstats(self) -> bytes:
+        """
+        pstats 文件的内容（cprofile 方式），可以用 pstats.Stats、snakeviz 等工具打开
+        """
+        if self.profile is None:
+            raise ValueError("只有 cprofile 方式可以导出 pstats")
+        return marshal.dumps(pstats.Stats(self.profile).stats)
+
+    def save(self, path: str) -> None:
+        """
+        保存结果，扩展名为 .pstats 或 .prof 时保存为 pstats 文件，否则保存为 speedscope JSON
+        """
+        if path.endswith((".pstats", ".prof")):
+            data = self.to_pstats()
+        else:
+            data = json.dumps(self.to_speedscope(), ensure_ascii=False).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(data)
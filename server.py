@@ -0,0 +1,73 @@
+"""
+无界面的 Flask 服务入口，不加载 Qt、pandas、numpy 等只有图形界面或导出表格才需要的依赖。
+    python server.py --path "D:\\Program Files (x86)\\WeChat\\WeChat.exe" --port 6001
+启动时会输出导入耗时（目标在 1 秒以内），以及被意外导入的重量级模块。
+"""
+import argparse
+import sys
+import time
+
+_start = time.perf_counter()
+
+from flask_server import WeChatFlaskServer
+from ui_auto_wechat import WeChat
+
+IMPORT_SECONDS = time.perf_counter() - _start
+
+# 服务不应该在启动时导入的模块
+HEAVY_MODULES = ("PyQt5", "pandas", "numpy", "PIL", "pyautogui")
+
+
+def import_report() -> str:
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    report = f"imports took {IMPORT_SECONDS:.3f}s"
+    if loaded:
+        report += f", heavy modules loaded: {', '.join(loaded)}"
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EasyChat 无界面服务")
+    parser.add_argument("--path", required=True, help="微信打开路径")
+    parser.add_argument("--port", type=int, default=6001)
+    parser.add_argument("--locale", default="zh-CN", help='微信语言，"auto" 代表自动检测')
+    parser.add_argument("--handle", type=int, default=None, help="指定微信主窗口的句柄（多开微信时使用）")
+    parser.add_argument("--input-mode", default="mouse", choices=["mouse", "message"])
+    parser.add_argument("--trace", default=None, help="把每一步的耗时写入 JSON Lines 文件")
+    parser.add_argument("--record-ui", default=None,
+                        help="把对微信的每一次界面调用录制到轨迹文件，之后可以用 ui_trace.py 在没有微信的环境中回放")
+    parser.add_argument("--verify-contact", action="store_true",
+                        help="搜索联系人后确认打开的聊天名称与接收人一致，不一致时不发送（备注、表情可能导致误判）")
+    parser.add_argument("--dedupe-window", type=float, default=0,
+                        help="相同接收人、相同内容的消息在该时间（秒）内只发送一次，0 代表关闭")
+    parser.add_argument("--watch-interval", type=float, default=0,
+                        help="每隔多少秒扫描一次新消息并推送到 /events 和 webhook，0 代表不扫描")
+    parser.add_argument("--health-interval", type=float, default=30,
+                        help="每隔多少秒检查一次微信是否卡死或退出登录，异常时暂停队列，0 代表不检查")
+    parser.add_argument("--keepalive-interval", type=float, default=3600,
+                        help="空闲多少秒后执行一次防掉线操作，0 代表不执行")
+    args = parser.parse_args()
+
+    print(import_report())
+    if IMPORT_SECONDS > 1.0:
+        print("warning: imports took longer than 1s")
+
+    if args.record_ui:
+        from ui_trace import Recorder
+        Recorder(args.record_ui).install()
+
+    wechat = WeChat(args.path, locale=args.locale, handle=args.handle, input_mode=args.input_mode,
+                    verify_contact=args.verify_contact)
+    server = WeChatFlaskServer(wechat, port=args.port, trace_path=args.trace, dedupe_window=args.dedupe_window)
+    if args.watch_interval > 0:
+        server.start_watcher(args.watch_interval)
+    if args.health_interval > 0:
+        server.start_watchdog(args.health_interval, args.keepalive_interval or None,
+                              on_change=lambda healthy, reason: print("wechat recovered" if healthy else f"wechat unhealthy: {reason}"))
+    print(f"ready in {time.perf_counter() - _start:.3f}s, listening on {server.get_status()['url']}")
+    # 在前台运行 Flask，而不是像图形界面那样放在后台线程中
+    server.app.run(host="0.0.0.0", port=args.port, debug=False, use_reloader=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""
+测试直接导入仓库根目录下的模块，不需要打开微信，也不需要安装 uiautomation、PyQt5
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
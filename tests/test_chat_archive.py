@@ -0,0 +1,126 @@
+from datetime import datetime
+
+import pytest
+
+import chat_archive
+from chat_archive import TIME_TYPE, ChatArchive, parse_time_header
+from time_header import to_datetime
+
+
+class FakeWeChat:
+    """只提供 ChatArchive 用到的 get_dialogs，聊天记录从早到晚保存在 histories 中"""
+    def __init__(self):
+        self.histories = {}
+        self.calls = []
+
+    def add(self, chat, *texts, sender="张三"):
+        self.histories.setdefault(chat, []).extend(("用户发送", sender, text) for text in texts)
+
+    def add_header(self, chat, header):
+        self.histories.setdefault(chat, []).append((TIME_TYPE, "", header))
+
+    def get_dialogs(self, chat, n_msg, search_user=True):
+        self.calls.append(n_msg)
+        return list(self.histories[chat][-n_msg:])
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = ChatArchive(str(tmp_path / "archive.db"))
+    yield archive
+    archive.close()
+
+
+@pytest.fixture
+def today(monkeypatch):
+    """固定“现在”的时间，相对的时间信息（“18:30”、“昨天 18:30”）相对于它解析"""
+    now = [datetime(2024, 6, 12, 20, 0)]
+    monkeypatch.setattr(chat_archive, "to_datetime", lambda header, _=None: to_datetime(header, now[0]))
+    return now
+
+
+def _texts(archive, chat):
+    return [m["text"] for m in reversed(archive.search(chat=chat, limit=1000))]
+
+
+def test_first_sync_then_only_new_messages(archive, today):
+    wechat = FakeWeChat()
+    wechat.add_header("a", "18:00")
+    wechat.add("a", "m0", "m1")
+    assert archive.sync(wechat, "a") == 3
+    assert archive.sync(wechat, "a") == 0
+    wechat.add("a", "m2", "m3")
+    assert archive.sync(wechat, "a") == 2
+    assert _texts(archive, "a") == ["18:00", "m0", "m1", "m2", "m3"]
+    assert archive.high_water_mark("a") == 5
+
+
+def test_messages_before_a_new_header_keep_the_stored_timestamp(archive, today):
+    wechat = FakeWeChat()
+    wechat.add_header("a", "18:30")
+    wechat.add("a", "m0")
+    archive.sync(wechat, "a")
+    # 第二天同一段聊天记录的时间信息显示为“昨天 18:30”，新消息仍然属于这段时间
+    today[0] = datetime(2024, 6, 13, 9, 0)
+    wechat.histories["a"][0] = (TIME_TYPE, "", "昨天 18:30")
+    wechat.add("a", "m1")
+    assert archive.sync(wechat, "a") == 1
+    latest = archive.search(chat="a", limit=1)[0]
+    assert latest["text"] == "m1"
+    assert latest["ts"] == datetime(2024, 6, 12, 18, 30).timestamp()
+
+
+def test_anchor_is_found_by_doubling_the_batch(archive, today):
+    wechat = FakeWeChat()
+    wechat.add("a", *[f"m{i}" for i in range(10)])
+    archive.sync(wechat, "a", initial=10)
+    wechat.add("a", *[f"n{i}" for i in range(30)])
+    wechat.calls.clear()
+    assert archive.sync(wechat, "a", batch=8) == 30
+    assert wechat.calls == [8, 16, 32, 64]
+    assert _texts(archive, "a")[-31:] == ["m9"] + [f"n{i}" for i in range(30)]
+
+
+def test_missing_anchor_skips_messages_already_stored(archive, today):
+    wechat = FakeWeChat()
+    wechat.add_header("a", "18:00")
+    wechat.add("a", "m0", "m1", "m2")
+    archive.sync(wechat, "a")
+    # 已保存的最后一条消息被撤回，衔接点找不到，只保存真正新的消息
+    del wechat.histories["a"][-1]
+    wechat.add("a", "new")
+    assert archive.sync(wechat, "a", batch=2, max_msgs=8) == 1
+    assert _texts(archive, "a") == ["18:00", "m0", "m1", "m2", "new"]
+
+
+def test_skipped_types_are_not_stored(archive, today):
+    wechat = FakeWeChat()
+    wechat.histories["a"] = [('"查看更多消息"标志', "", "查看更多消息"), ("用户发送", "张三", "m0"),
+                             ('"以下是新消息"标志', "", "以下为新消息")]
+    assert archive.sync(wechat, "a") == 1
+
+
+def test_search_by_keyword_sender_and_time(archive, today):
+    wechat = FakeWeChat()
+    wechat.add_header("a", "昨天 12:00")
+    wechat.add("a", "中午一起吃饭吗", sender="李四")
+    wechat.add_header("a", "18:00")
+    wechat.add("a", "晚上吃饭", "好的 100%", sender="张三")
+    wechat.add("b", "吃饭了吗")
+    archive.sync(wechat, "a")
+    archive.sync(wechat, "b")
+
+    assert [m["text"] for m in archive.search(chat="a", keyword="吃饭")] == ["晚上吃饭", "中午一起吃饭吗"]
+    assert [m["text"] for m in archive.search(chat="a", keyword="一起吃饭")] == ["中午一起吃饭吗"]
+    assert [m["text"] for m in archive.search(keyword="吃饭")][-1] == "吃饭了吗"
+    assert [m["text"] for m in archive.search(keyword="100%")] == ["好的 100%"]
+    assert [m["text"] for m in archive.search(sender="李四")] == ["中午一起吃饭吗"]
+    start = datetime(2024, 6, 12).timestamp()
+    assert [m["text"] for m in archive.search(chat="a", start=start) if m["type"] != TIME_TYPE] == \
+        ["好的 100%", "晚上吃饭"]
+    assert {c["chat"]: c["count"] for c in archive.chats()} == {"a": 5, "b": 1}
+
+
+def test_parse_time_header():
+    assert parse_time_header("2024年6月5日 18:30") == datetime(2024, 6, 5, 18, 30).timestamp()
+    assert parse_time_header("以下为新消息") is None
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from idempotency import DuplicateWindow, IdempotencyCache, IdempotencyConflict
+
+
+def test_replays_the_first_result():
+    cache = IdempotencyCache()
+    calls = []
+    assert cache.run("k", lambda: calls.append(1) or "ok") == ("ok", False)
+    assert cache.run("k", lambda: calls.append(1) or "other") == ("ok", True)
+    assert calls == [1]
+
+
+def test_concurrent_duplicate_waits_for_the_running_request():
+    cache = IdempotencyCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def send():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "sent"
+
+    first = []
+    thread = threading.Thread(target=lambda: first.append(cache.run("k", send)))
+    thread.start()
+    started.wait(5)
+    second = []
+    waiter = threading.Thread(target=lambda: second.append(cache.run("k", send)))
+    waiter.start()
+    release.set()
+    thread.join(5)
+    waiter.join(5)
+    assert first == [("sent", False)]
+    assert second == [("sent", True)]
+    assert calls == [1]
+
+
+def test_running_request_is_never_purged():
+    # 发送在队列中等待的时间超过 ttl，期间又有更多的新键挤占容量，重试仍然不能再次发送
+    cache = IdempotencyCache(ttl=0.05, max_entries=2)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_send():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "sent"
+
+    thread = threading.Thread(target=cache.run, args=("k", slow_send))
+    thread.start()
+    started.wait(5)
+    time.sleep(0.1)
+    for i in range(5):
+        cache.run(f"other-{i}", lambda: "x")
+    retry = []
+    waiter = threading.Thread(target=lambda: retry.append(cache.run("k", slow_send)))
+    waiter.start()
+    release.set()
+    thread.join(5)
+    waiter.join(5)
+    assert retry == [("sent", True)]
+    assert calls == [1]
+
+
+def test_ttl_starts_when_the_result_is_stored():
+    cache = IdempotencyCache(ttl=0.2)
+    cache.run("k", lambda: time.sleep(0.3) or "first")
+    # 执行用了 0.3 秒，比 ttl 长，但结果刚刚产生，仍然有效
+    assert cache.run("k", lambda: "second") == ("first", True)
+    time.sleep(0.25)
+    assert cache.run("k", lambda: "second") == ("second", False)
+
+
+def test_max_entries_drops_oldest_results():
+    cache = IdempotencyCache(max_entries=2)
+    for key in "abc":
+        cache.run(key, lambda key=key: key)
+    assert cache.run("a", lambda: "again") == ("again", False)
+    assert cache.run("c", lambda: "again") == ("c", True)
+
+
+def test_errors_and_uncacheable_results_are_not_cached():
+    cache = IdempotencyCache()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.run("k", fail)
+    assert cache.run("k", lambda: ("failed", 500), cacheable=lambda r: r[1] < 300) == (("failed", 500), False)
+    assert cache.run("k", lambda: ("ok", 200), cacheable=lambda r: r[1] < 300) == (("ok", 200), False)
+    assert cache.run("k", lambda: ("again", 200)) == (("ok", 200), True)
+
+
+def test_reused_key_with_different_payload_conflicts():
+    cache = IdempotencyCache()
+    first = IdempotencyCache.fingerprint("张三", "你好", None)
+    cache.run("k", lambda: "ok", fingerprint=first)
+    assert cache.run("k", lambda: "x", fingerprint=IdempotencyCache.fingerprint("张三", "你好", None)) == ("ok", True)
+    with pytest.raises(IdempotencyConflict):
+        cache.run("k", lambda: "x", fingerprint=IdempotencyCache.fingerprint("李四", "你好", None))
+
+
+def test_duplicate_window():
+    window = DuplicateWindow(window=0.1)
+    assert window.check("张三", "你好") is None
+    assert window.check("张三", "你好") is not None
+    assert window.check("张三", "你好", ["李四"]) is None
+    assert window.check("李四", "你好") is None
+    time.sleep(0.15)
+    assert window.check("张三", "你好") is None
+
+
+def test_duplicate_window_release():
+    window = DuplicateWindow(window=60)
+    window.check("张三", "你好")
+    window.release("张三", "你好")
+    assert window.check("张三", "你好") is None
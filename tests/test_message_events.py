@@ -0,0 +1,127 @@
+import queue
+
+from message_events import TIME_TYPE, EventBus, MessageWatcher
+
+
+class FakeWeChat:
+    """只提供 MessageWatcher 用到的 check_new_msg 和 iter_dialogs，聊天记录从早到晚保存在 histories 中"""
+    def __init__(self):
+        self.histories = {}
+        self.unread = []
+        self.reads = 0
+
+    def receive(self, chat, *texts, sender="张三"):
+        self.histories.setdefault(chat, []).extend(("用户发送", sender, text) for text in texts)
+        if chat not in self.unread:
+            self.unread.append(chat)
+
+    def iter_dialogs(self, name, n_msg=None, search_user=True):
+        for msg in reversed(self.histories[name]):
+            self.reads += 1
+            yield msg
+
+    def check_new_msg(self, on_new_msg=None, n_msg=0):
+        names, self.unread = self.unread, []
+        for name in names:
+            on_new_msg(name, [])
+        return names
+
+
+def _watcher(n_msg=5, max_msgs=200):
+    wechat, bus = FakeWeChat(), EventBus()
+    events = bus.subscribe()
+    return wechat, MessageWatcher(wechat, bus, n_msg=n_msg, max_msgs=max_msgs), events
+
+
+def _texts(events):
+    result = []
+    while True:
+        try:
+            event = events.get_nowait()
+        except queue.Empty:
+            return result
+        result.append(([m["text"] for m in event["messages"]], event.get("truncated", False)))
+
+
+def test_first_event_carries_last_n_messages():
+    wechat, watcher, events = _watcher(n_msg=3)
+    wechat.receive("a", *[f"m{i}" for i in range(10)])
+    assert watcher.scan() == ["a"]
+    assert _texts(events) == [(["m7", "m8", "m9"], False)]
+
+
+def test_publishes_only_messages_after_the_anchor():
+    wechat, watcher, events = _watcher(n_msg=3)
+    wechat.receive("a", "m0", "m1", "m2")
+    watcher.scan()
+    _texts(events)
+    # 两次扫描之间收到的消息比 n_msg 多，也不会遗漏
+    wechat.receive("a", *[f"n{i}" for i in range(8)])
+    watcher.scan()
+    assert _texts(events) == [([f"n{i}" for i in range(8)], False)]
+
+
+def test_repeated_texts_are_matched_as_a_sequence():
+    # 单条消息的内容重复时，衔接点按连续的几条消息匹配
+    wechat, watcher, events = _watcher()
+    wechat.receive("a", "好", "收到", "好")
+    watcher.scan()
+    _texts(events)
+    wechat.receive("a", "好")
+    watcher.scan()
+    assert _texts(events) == [(["好"], False)]
+
+
+def test_time_headers_are_not_part_of_the_anchor():
+    wechat, watcher, events = _watcher()
+    wechat.receive("a", "m0", "m1")
+    watcher.scan()
+    _texts(events)
+    wechat.histories["a"].append((TIME_TYPE, "", "18:30"))
+    wechat.receive("a", "m2")
+    watcher.scan()
+    assert _texts(events) == [(["18:30", "m2"], False)]
+
+
+def test_reads_stop_at_the_anchor():
+    wechat, watcher, events = _watcher()
+    wechat.receive("a", *[f"m{i}" for i in range(1000)])
+    watcher.scan()
+    wechat.reads = 0
+    wechat.receive("a", "new")
+    watcher.scan()
+    assert _texts(events)[-1] == (["new"], False)
+    assert wechat.reads == 1 + MessageWatcher.ANCHOR_SIZE
+
+
+def test_missing_anchor_is_truncated_at_max_msgs():
+    wechat, watcher, events = _watcher(max_msgs=4)
+    wechat.receive("a", "m0", "m1", "m2")
+    watcher.scan()
+    _texts(events)
+    # 已经发布的消息被撤回，衔接点找不到了
+    wechat.histories["a"] = [("用户发送", "张三", f"x{i}") for i in range(10)]
+    wechat.unread.append("a")
+    watcher.scan()
+    assert _texts(events) == [(["x6", "x7", "x8", "x9"], True)]
+
+
+def test_chats_are_tracked_separately():
+    wechat, watcher, events = _watcher(n_msg=1)
+    wechat.receive("a", "a0")
+    wechat.receive("b", "b0", "b1")
+    assert watcher.scan() == ["a", "b"]
+    wechat.receive("b", "b2")
+    watcher.scan()
+    assert _texts(events) == [(["a0"], False), (["b1"], False), (["b2"], False)]
+
+
+def test_event_bus_drops_oldest_for_slow_subscribers():
+    bus = EventBus(subscriber_queue_size=2)
+    q = bus.subscribe()
+    for i in range(3):
+        bus.publish({"n": i})
+    assert [q.get_nowait()["n"] for _ in range(2)] == [1, 2]
+    bus.unsubscribe(q)
+    bus.publish({"n": 3})
+    assert q.empty() and bus.published == 4
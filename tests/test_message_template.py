@@ -0,0 +1,79 @@
+import pytest
+
+from message_template import MessageTemplate, PreRenderer, iter_recipients
+
+
+def test_render_fields_and_escaped_braces():
+    template = MessageTemplate("你好 {name}，订单 {order_id} 已发货 {{不是字段}}")
+    assert template.fields == ["name", "order_id"]
+    assert template.render({"name": "张三", "order_id": 42}) == "你好 张三，订单 42 已发货 {不是字段}"
+
+
+def test_repeated_field_is_listed_once():
+    template = MessageTemplate("{name}{name}")
+    assert template.fields == ["name"]
+    assert template.render({"name": "a"}) == "aa"
+
+
+@pytest.mark.parametrize("text", ["{name!r}", "{amount:.2f}", "{0}", "{user.name}"])
+def test_unsupported_fields(text):
+    with pytest.raises(ValueError):
+        MessageTemplate(text)
+
+
+def test_check_missing_columns():
+    template = MessageTemplate("{name} {order_id} {city}")
+    template.check(["name", "order_id", "city", "extra"])
+    with pytest.raises(KeyError, match="order_id, city"):
+        template.check(["name"])
+
+
+def test_iter_recipients_csv(tmp_path):
+    path = tmp_path / "recipients.csv"
+    path.write_text("﻿联系人,order_id\n张三,1\n,2\n  李四 ,3\n", encoding="utf-8")
+    rows = list(iter_recipients(str(path)))
+    assert [(row["name"], row["order_id"]) for row in rows] == [("张三", "1"), ("李四", "3")]
+    assert rows[0]["联系人"] == "张三"
+
+
+def test_iter_recipients_name_column(tmp_path):
+    path = tmp_path / "recipients.csv"
+    path.write_text("order_id,微信名\n1,张三\n", encoding="utf-8")
+    assert [row["name"] for row in iter_recipients(str(path), name_column="微信名")] == ["张三"]
+
+
+def test_iter_recipients_rejects_other_files(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_recipients(str(tmp_path / "recipients.txt")))
+
+
+def test_prerenderer_keeps_order():
+    rows = ({"name": f"用户{i}", "n": i} for i in range(500))
+    result = list(PreRenderer(MessageTemplate("第 {n} 条"), rows, ahead=10))
+    assert result == [(f"用户{i}", f"第 {i} 条") for i in range(500)]
+
+
+def test_prerenderer_reports_missing_field():
+    renderer = PreRenderer(MessageTemplate("{name} {order_id}"), [{"name": "张三"}])
+    with pytest.raises(KeyError):
+        list(renderer)
+
+
+def test_prerenderer_stops_when_consumer_stops():
+    renderer = PreRenderer(MessageTemplate("{name}"), ({"name": str(i)} for i in range(10 ** 6)), ahead=5)
+    for i, (name, _) in enumerate(renderer):
+        if i == 3:
+            break
+    renderer.join(2)
+    assert not renderer.is_alive()
+
+
+def test_iter_recipients_xlsx(tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    path = tmp_path / "recipients.xlsx"
+    workbook = openpyxl.Workbook()
+    workbook.active.append(["name", "amount"])
+    workbook.active.append(["张三", 12])
+    workbook.active.append([None, 3])
+    workbook.save(path)
+    assert [(row["name"], row["amount"]) for row in iter_recipients(str(path))] == [("张三", "12")]
@@ -0,0 +1,92 @@
+from name_index import FuzzyNameIndex, NameIndex, normalize_name, pinyin_initials
+
+
+def test_pinyin_initials():
+    assert pinyin_initials("张三abc") == "zsabc"
+    assert pinyin_initials("Tom 李") == "toml"
+
+
+def test_search_by_prefix_initials_and_alias():
+    index = NameIndex()
+    index.extend(["张三", ("李四", ["老李"]), "Alice", "张三丰"])
+    assert index.search("张三") == [0, 3]
+    assert index.search("zs") == [0, 3]
+    assert index.search("老") == [1]
+    assert index.search("ALI") == [2]
+    assert index.search("  ") is None
+    assert index.search("王") == []
+
+
+def test_search_indexes_names_appended_later():
+    index = NameIndex()
+    index.extend(["张三"])
+    assert index.search("z") == [0]
+    start_end = index.extend(["赵六", "Zed"])
+    assert start_end == (1, 3)
+    assert index.search("z") == [0, 1, 2]
+    assert index.search("z", start=2) == [2]
+
+
+def test_listeners_and_clear():
+    index = NameIndex()
+    events = []
+    index.subscribe(lambda start, end: events.append((start, end)))
+    index.extend(["a", "b"])
+    index.extend([])
+    index.clear()
+    assert events == [(0, 2), (0, 0)]
+    assert len(index) == 0 and index.search("a") == []
+
+
+def test_normalize_name():
+    assert normalize_name("  产品、研发 群 ") == "产品 研发 群"
+    assert normalize_name("Alice") == "alice"
+
+
+def _directory():
+    directory = FuzzyNameIndex()
+    directory.extend([("张三", ["三哥"]), ("李四", ["老李"]), ("王五", ["老李"]), "产品、研发群", "Alice Wang"])
+    return directory
+
+
+def test_resolve_exact_name_and_remark():
+    directory = _directory()
+    assert directory.resolve("张三") == ("张三", [])
+    assert directory.resolve("三哥") == ("张三", [])
+    # 群名中的顿号与搜索时使用的空格等价，大小写不敏感
+    assert directory.resolve("产品 研发群") == ("产品、研发群", [])
+    assert directory.resolve("alice wang") == ("Alice Wang", [])
+    assert directory.names_for("三哥") == {"张三"}
+
+
+def test_resolve_shared_remark_is_ambiguous():
+    assert _directory().resolve("老李") == (None, ["李四", "王五"])
+
+
+def test_resolve_typo_returns_candidates():
+    name, candidates = _directory().resolve("Alice Wong")
+    assert name is None
+    assert candidates[0] == "Alice Wang"
+    assert _directory().resolve("完全无关") == (None, [])
+
+
+def test_validate_whole_recipient_list():
+    resolved, rejected = _directory().validate(["张三", "三哥", "老李", "Alice Wong", "张三"])
+    assert resolved == {"张三": "张三", "三哥": "张三"}
+    assert rejected["老李"] == ["李四", "王五"]
+    assert rejected["Alice Wong"][0] == "Alice Wang"
+
+
+def test_similar_respects_threshold_and_limit():
+    directory = FuzzyNameIndex(threshold=0.5, max_candidates=2)
+    directory.extend([f"测试群{i}" for i in range(10)])
+    result = directory.similar("测试群")
+    assert len(result) == 2
+    assert all(score >= 0.5 for _, score in result)
+
+
+def test_clear():
+    directory = _directory()
+    directory.clear()
+    assert len(directory) == 0
+    assert directory.resolve("张三") == (None, [])
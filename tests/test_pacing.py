@@ -0,0 +1,90 @@
+import pytest
+
+from pacing import AdaptivePacer
+
+
+def test_additive_increase_up_to_max_rate():
+    pacer = AdaptivePacer(initial_rate=30, max_rate=36, increase=2)
+    for _ in range(2):
+        pacer.record(0.5, True)
+    assert pacer.rate == 34
+    for _ in range(5):
+        pacer.record(0.5, True)
+    assert pacer.rate == 36
+
+
+def test_failure_halves_rate_down_to_min_rate():
+    pacer = AdaptivePacer(initial_rate=20, min_rate=4, decrease=0.5)
+    pacer.record(0.5, False)
+    assert pacer.rate == 10
+    for _ in range(5):
+        pacer.record(0.5, False)
+    assert pacer.rate == 4
+    assert pacer.failed == 6
+
+
+def test_slow_send_after_warmup_decreases_rate():
+    pacer = AdaptivePacer(initial_rate=30, increase=2, warmup=3)
+    for _ in range(3):
+        pacer.record(1.0, True)
+    rate = pacer.rate
+    pacer.record(3.0, True)
+    assert pacer.rate == rate * 0.5
+    assert pacer.slow == 1
+
+
+def test_slow_send_during_warmup_is_not_counted():
+    pacer = AdaptivePacer(initial_rate=30, increase=2, warmup=3)
+    pacer.record(1.0, True)
+    pacer.record(5.0, True)
+    assert pacer.slow == 0
+    assert pacer.rate == 34
+
+
+def test_jitter_on_short_sends_is_not_slow():
+    # 耗时翻倍但只多出 0.1 秒，小于 min_slowdown，不算变慢
+    pacer = AdaptivePacer(initial_rate=30, increase=2, warmup=0, min_slowdown=0.5)
+    pacer.record(0.1, True)
+    pacer.record(0.25, True)
+    assert pacer.slow == 0
+
+
+def test_slow_send_barely_moves_average_latency():
+    pacer = AdaptivePacer(warmup=0)
+    pacer.record(1.0, True)
+    pacer.record(10.0, True)
+    assert pacer.avg_latency == pytest.approx(0.95 * 1.0 + 0.05 * 10.0)
+
+
+def test_delay_counts_send_time_into_the_interval():
+    pacer = AdaptivePacer(initial_rate=30)
+    assert pacer.delay() == 2.0
+    assert pacer.delay(0.5) == 1.5
+    assert pacer.delay(5.0) == 0.0
+
+
+def test_initial_rate_is_clamped():
+    assert AdaptivePacer(initial_rate=100, max_rate=60).rate == 60
+    assert AdaptivePacer(initial_rate=0.5, min_rate=2).rate == 2
+
+
+@pytest.mark.parametrize("kwargs", [{"decrease": 1.0}, {"decrease": 0}, {"min_rate": 10, "max_rate": 5}])
+def test_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        AdaptivePacer(**kwargs)
+
+
+def test_observed_rate(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("pacing.time.monotonic", lambda: clock[0])
+    pacer = AdaptivePacer()
+    assert pacer.observed_rate() == 0.0
+    for _ in range(4):
+        pacer.record(0.5, True)
+        clock[0] += 2.0
+    # 4 次发送相隔 2 秒，共 6 秒，折算为每分钟 30 条
+    assert pacer.observed_rate() == pytest.approx(30.0)
+    # 一分钟以前的发送不再计入
+    clock[0] += 120
+    pacer.record(0.5, True)
+    assert pacer.observed_rate() == 0.0
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+
+from time_header import to_datetime
+
+# 2024-06-12 是星期三
+NOW = datetime(2024, 6, 12, 20, 0)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("18:30", datetime(2024, 6, 12, 18, 30)),
+    ("下午6:30", datetime(2024, 6, 12, 18, 30)),
+    ("上午12:05", datetime(2024, 6, 12, 0, 5)),
+    ("6:30 PM", datetime(2024, 6, 12, 18, 30)),
+    ("中午12:10", datetime(2024, 6, 12, 12, 10)),
+    ("昨天 18:30", datetime(2024, 6, 11, 18, 30)),
+    ("Yesterday 9:15", datetime(2024, 6, 11, 9, 15)),
+    ("前天 07:00", datetime(2024, 6, 10, 7, 0)),
+    ("星期一 18:30", datetime(2024, 6, 10, 18, 30)),
+    ("週二 18:30", datetime(2024, 6, 11, 18, 30)),
+    ("Thursday 08:00", datetime(2024, 6, 6, 8, 0)),
+    ("Tue", datetime(2024, 6, 11)),
+    ("2024年6月5日 18:30", datetime(2024, 6, 5, 18, 30)),
+    ("2023/12/31 23:59", datetime(2023, 12, 31, 23, 59)),
+    ("6/5/24 18:30", datetime(2024, 6, 5, 18, 30)),
+    ("Jun 5, 2024 18:30", datetime(2024, 6, 5, 18, 30)),
+    ("5 June 2023", datetime(2023, 6, 5)),
+    ("6月5日 18:30", datetime(2024, 6, 5, 18, 30)),
+])
+def test_formats(header, expected):
+    assert to_datetime(header, NOW) == expected
+
+
+def test_same_weekday_is_a_week_ago():
+    # 今天是星期三，显示“星期三”的只能是 7 天前
+    assert to_datetime("星期三 10:00", NOW) == datetime(2024, 6, 5, 10, 0)
+
+
+def test_month_day_later_than_today_is_last_year():
+    assert to_datetime("12月30日 08:00", NOW) == datetime(2023, 12, 30, 8, 0)
+    assert to_datetime("Dec 30 08:00", NOW) == datetime(2023, 12, 30, 8, 0)
+
+
+def test_full_width_colon_and_extra_spaces():
+    assert to_datetime("  昨天   18：30 ", NOW) == datetime(2024, 6, 11, 18, 30)
+
+
+@pytest.mark.parametrize("header", ["", None, "以下为新消息", "25:00", "2024年2月30日", "hello world"])
+def test_unrecognized(header):
+    assert to_datetime(header, NOW) is None
@@ -0,0 +1,60 @@
+import pytest
+
+import wechat_locale
+from wechat_locale import WeChatLocale
+
+
+def test_module_docstring():
+    assert "UI 元素" in wechat_locale.__doc__
+
+
+def test_attributes_per_locale():
+    assert WeChatLocale("zh-CN").contacts == "通讯录"
+    assert WeChatLocale("zh-TW").contacts == "通訊錄"
+    assert WeChatLocale("en-US").contacts == "Contacts"
+    assert set(WeChatLocale.getSupportedLocales()) == {"en-US", "zh-CN", "zh-TW"}
+
+
+def test_lookup_and_key_of():
+    assert WeChatLocale.lookup("微信") == {("weixin", "zh-CN"), ("weixin", "zh-TW")}
+    assert WeChatLocale.key_of("Weixin") == "weixin"
+    assert WeChatLocale.key_of("不是界面文字") is None
+
+
+@pytest.mark.parametrize("names, expected", [
+    (["Weixin", "Chats", "Contacts"], "en-US"),
+    (["微信", "聊天", "通讯录", "搜索"], "zh-CN"),
+    (["微信", "聊天", "通訊錄", "搜尋"], "zh-TW"),
+    (["张三", "", "随便什么"], None),
+    ([], None),
+])
+def test_vote(names, expected):
+    assert WeChatLocale.vote(names) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("查看更多消息", "view_more_messages"),
+    ("  View more messages ", "view_more_messages"),
+    ("查看更多訊息", "view_more_messages"),
+    # 只有整段文字才是“查看更多消息”按钮，引用它的系统提示不是
+    ("群公告：点击查看更多消息", None),
+    ("收到红包，请在手机上查看", "red_packet"),
+    ("Red Packet", "red_packet"),
+    ("张三撤回了一条消息", "recalled"),
+    ("Tom recalled a message", "recalled"),
+    ("以下为新消息", "new_messages_below"),
+    ("普通的消息", None),
+    ("", None),
+    (None, None),
+])
+def test_find_marker(text, expected):
+    assert WeChatLocale.find_marker(text) == expected
+
+
+def test_detect_uses_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(WeChatLocale, "CACHE_PATH", str(tmp_path / "cache.json"))
+    exe = tmp_path / "WeChat.exe"
+    exe.write_bytes(b"")
+    wechat_locale._save_cache({str(exe): {"locale": "zh-TW", "mtime": exe.stat().st_mtime}})
+    # 命中缓存时不需要 uiautomation，也不会读取窗口
+    assert WeChatLocale.detect(str(exe), window=object()) == "zh-TW"
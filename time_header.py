@@ -0,0 +1,144 @@
+"""
+聊天记录中时间信息的解析。
+微信按消息距离现在的时间显示不同格式的时间信息，所有界面语言都可以解析：
+    - 当天："18:30"、"下午6:30"、"6:30 PM"
+    - 昨天、前天："昨天 18:30"、"Yesterday 18:30"
+    - 一周以内："星期二 18:30"、"周二"、"週二 18:30"、"Tuesday 18:30"、"Tue"
+    - 更早："2024年6月5日 18:30"、"6月5日 18:30"（今年）、"2024/6/5 18:30"、"6/5/24 18:30"、"Jun 5, 2024 18:30"
+没有时间部分的按当天 0 点计算。时间信息是它下面一组消息中第一条的发送时间，这组消息都按这个时间计算。
+    to_datetime("昨天 18:30")    # datetime(..., 18, 30)
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Optional
+
+_CLOCK = re.compile(r"(\d{1,2}):(\d{2})(?::(\d{2}))?")
+_FULL_DATE = re.compile(r"(\d{4})\s*[年/.-]\s*(\d{1,2})\s*[月/.-]\s*(\d{1,2})\s*日?")
+_MONTH_DAY = re.compile(r"(\d{1,2})\s*月\s*(\d{1,2})\s*日")
+# 英文界面的 月/日/年
+_US_DATE = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{2,4})")
+
+_MONTHS = {name: i + 1 for i, names in enumerate([
+    ("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"), ("may",), ("jun", "june"),
+    ("jul", "july"), ("aug", "august"), ("sep", "sept", "september"), ("oct", "october"), ("nov", "november"),
+    ("dec", "december")]) for name in names}
+_MONTH_NAME_DATE = re.compile(r"([A-Za-z]+)\.?\s+(\d{1,2})(?:st|nd|rd|th)?,?(?:\s+(\d{4}))?"
+                              r"|(\d{1,2})\s+([A-Za-z]+)\.?,?(?:\s+(\d{4}))?")
+
+# 星期几，星期一为 0
+_WEEKDAYS = {}
+for _i, _names in enumerate([
+        ("一", "monday", "mon"), ("二", "tuesday", "tue", "tues"), ("三", "wednesday", "wed"),
+        ("四", "thursday", "thu", "thur", "thurs"), ("五", "friday", "fri"), ("六", "saturday", "sat"),
+        ("日", "天", "sunday", "sun")]):
+    for _name in _names:
+        _WEEKDAYS[_name] = _i
+_CN_WEEKDAY = re.compile(r"(?:星期|礼拜|禮拜|周|週)([一二三四五六日天])")
+_EN_WORD = re.compile(r"[A-Za-z]+")
+
+# 距离今天的天数
+_RELATIVE_DAYS = {"今天": 0, "today": 0, "昨天": 1, "yesterday": 1, "前天": 2}
+
+# 12 小时制的时段
+_PM = ("下午", "晚上", "傍晚", "pm", "p.m.")
+_AM = ("上午", "凌晨", "早上", "清晨", "am", "a.m.")
+_NOON = "中午"
+
+
+def _clock(text: str):
+    """
+    取出时间部分，返回 ((时, 分, 秒), 去掉时间后剩下的文字)，没有时间部分时为 (None, text)
+    """
+    match = _CLOCK.search(text)
+    if match is None:
+        return None, text
+    hour, minute, second = int(match.group(1)), int(match.group(2)), int(match.group(3) or 0)
+    rest = (text[:match.start()] + " " + text[match.end():]).strip()
+    lowered = rest.lower()
+    if any(marker in lowered for marker in _PM):
+        hour = hour + 12 if hour < 12 else hour
+    elif any(marker in lowered for marker in _AM):
+        hour = 0 if hour == 12 else hour
+    elif _NOON in rest and hour < 11:
+        hour += 12
+    for marker in _PM + _AM + (_NOON,):
+        rest = re.sub(re.escape(marker), " ", rest, flags=re.IGNORECASE)
+    if hour > 23 or minute > 59 or second > 59:
+        return None, text
+    return (hour, minute, second), rest.strip(" ,")
+
+
+def _year(value: str) -> int:
+    year = int(value)
+    return year + 2000 if year < 100 else year
+
+
+def _date(text: str, now: datetime):
+    """解析日期部分，无法识别时返回 None"""
+    text = text.strip()
+    if not text:
+        return now.date()
+    lowered = text.lower()
+    if lowered in _RELATIVE_DAYS:
+        return (now - timedelta(days=_RELATIVE_DAYS[lowered])).date()
+
+    match = _FULL_DATE.search(text)
+    if match:
+        return datetime(*map(int, match.groups())).date()
+    match = _US_DATE.search(text)
+    if match:
+        month, day, year = match.groups()
+        return datetime(_year(year), int(month), int(day)).date()
+
+    match = _MONTH_DAY.search(text)
+    if match:
+        month, day, year = int(match.group(1)), int(match.group(2)), None
+    else:
+        month = day = year = None
+        match = _MONTH_NAME_DATE.search(text)
+        if match:
+            name, day, year = (match.group(1), match.group(2), match.group(3)) if match.group(1) \
+                else (match.group(5), match.group(4), match.group(6))
+            month = _MONTHS.get(name.lower())
+            if month is not None:
+                day, year = int(day), int(year) if year else None
+    if month is not None:
+        if year is not None:
+            return datetime(year, month, day).date()
+        # 不带年份的日期是今年的，晚于今天时是去年的
+        date = datetime(now.year, month, day).date()
+        return date if date <= now.date() else date.replace(year=now.year - 1)
+
+    match = _CN_WEEKDAY.search(text)
+    weekday = _WEEKDAYS[match.group(1)] if match else None
+    if weekday is None:
+        words = _EN_WORD.findall(lowered)
+        weekday = _WEEKDAYS.get(words[0]) if len(words) == 1 else None
+    if weekday is not None:
+        # 一周以内、今天和昨天以外的日期才显示星期几，与今天同一个星期几时是 7 天前
+        days = (now.weekday() - weekday) % 7 or 7
+        return (now - timedelta(days=days)).date()
+    return None
+
+
+def to_datetime(header: str, now: datetime = None) -> Optional[datetime]:
+    """
+    把时间信息转换为 datetime，无法识别时返回 None
+    Args:
+        header: 时间信息的文字
+        now: 显示这条时间信息时的当前时间，“昨天”、“星期二”等相对于它计算，默认为现在
+    """
+    if not header:
+        return None
+    now = now or datetime.now()
+    text = " ".join(header.replace("：", ":").split())
+    clock, rest = _clock(text)
+    try:
+        date = _date(rest, now)
+    except ValueError:
+        # 例如 2 月 30 日这样不存在的日期
+        return None
+    if date is None:
+        return None
+    hour, minute, second = clock or (0, 0, 0)
+    return datetime(date.year, date.month, date.day, hour, minute, second)
@@ -0,0 +1,263 @@
+"""
+控件树快速导出与比较工具。
+通过 UIAutomation 的 CacheRequest 一次性批量获取整棵子树的属性，避免逐个控件跨进程读取，
+导出结果为 JSON Lines（文件名以 .gz 结尾时使用 gzip 压缩），可以离线比较微信更新前后的控件深度变化。
+"""
+import gzip
+import json
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DUMP_FORMAT = "easychat-tree"
+DUMP_VERSION = 1
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _parse_filter(subtree: Optional[str]) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    解析子树过滤条件，格式为 "ControlType" 或 "ControlType:Name"，例如 "ListControl:消息"
+    """
+    if not subtree:
+        return None
+    control_type, _, name = subtree.partition(":")
+    return control_type, (name if name else None)
+
+
+def _matches(record: Dict, flt: Optional[Tuple[str, Optional[str]]]) -> bool:
+    if flt is None:
+        return True
+    control_type, name = flt
+    return record["type"] == control_type and (name is None or record["name"] == name)
+
+
+def _locate(control) -> Tuple[int, List[int]]:
+    """
+    计算控件相对于桌面根控件的深度以及下标路径（每一层在父控件子控件中的下标）
+    """
+    import uiautomation as auto
+
+    chain = []
+    while control:
+        chain.insert(0, control)
+        control = control.GetParentControl()
+
+    path = []
+    for parent, child in zip(chain, chain[1:]):
+        for index, sibling in enumerate(parent.GetChildren()):
+            if auto.ControlsAreSame(sibling, child):
+                path.append(index)
+                break
+        else:
+            path.append(-1)
+    return len(chain) - 1, path
+
+
+def _cached_walk(element, depth: int, path: List[int], max_depth: int) -> Iterator[Dict]:
+    """
+    遍历已经缓存好的元素树，此时读取属性不再产生跨进程调用
+    """
+    import uiautomation as auto
+
+    rect = element.CachedBoundingRectangle
+    yield {
+        "depth": depth,
+        "path": path,
+        "type": auto.ControlTypeNames.get(element.CachedControlType, "Control"),
+        "name": element.CachedName or "",
+        "class": element.CachedClassName or "",
+        "aid": element.CachedAutomationId or "",
+        "rect": [rect.left, rect.top, rect.right, rect.bottom],
+        "pid": element.CachedProcessId,
+    }
+    if max_depth <= 0:
+        return
+
+    children = element.GetCachedChildren()
+    if not children:
+        return
+    for index in range(children.Length):
+        yield from _cached_walk(children.GetElement(index), depth + 1, path + [index], max_depth - 1)
+
+
+def _slow_walk(control, depth: int, path: List[int], max_depth: int) -> Iterator[Dict]:
+    """
+    当缓存请求不可用时退回到逐个控件读取属性
+    """
+    rect = control.BoundingRectangle
+    yield {
+        "depth": depth,
+        "path": path,
+        "type": control.ControlTypeName,
+        "name": control.Name or "",
+        "class": control.ClassName or "",
+        "aid": control.AutomationId or "",
+        "rect": [rect.left, rect.top, rect.right, rect.bottom],
+        "pid": control.ProcessId,
+    }
+    if max_depth <= 0:
+        return
+    for index, child in enumerate(control.GetChildren()):
+        yield from _slow_walk(child, depth + 1, path + [index], max_depth - 1)
+
+
+def iter_tree(control, max_depth: int = 0xFFFFFFFF) -> Iterator[Dict]:
+    """
+    批量获取控件子树的属性并逐个返回控件记录
+    Args:
+        control: 开始遍历的控件
+        max_depth: 相对于开始控件的最大遍历深度
+    """
+    import uiautomation as auto
+
+    depth, path = _locate(control)
+    try:
+        client = auto._AutomationClient.instance()
+        request = client.IUIAutomation.CreateCacheRequest()
+        for property_id in (auto.PropertyId.NamePropertyId, auto.PropertyId.ControlTypePropertyId,
+                            auto.PropertyId.ClassNamePropertyId, auto.PropertyId.AutomationIdPropertyId,
+                            auto.PropertyId.BoundingRectanglePropertyId, auto.PropertyId.ProcessIdPropertyId):
+            request.AddProperty(property_id)
+        # 与 uiautomation 的 GetChildren 保持一致，使用 Raw View，这样导出的深度可以直接用于 Depth= 参数
+        request.TreeFilter = client.IUIAutomation.RawViewCondition
+        request.TreeScope = auto.TreeScope.Subtree
+        cached = control.Element.BuildUpdatedCache(request)
+    except Exception:
+        cached = None
+
+    if cached is not None:
+        yield from _cached_walk(cached, depth, path, max_depth)
+    else:
+        yield from _slow_walk(control, depth, path, max_depth)
+
+
+def dump_tree(control, out_path: str, max_depth: int = 0xFFFFFFFF, subtree: str = None, **meta) -> int:
+    """
+    将控件树导出为 JSON Lines 文件，第一行为文件信息，之后每行一个控件
+    Args:
+        control: 开始导出的控件
+        out_path: 导出文件路径，以 .gz 结尾时进行压缩
+        max_depth: 相对于开始控件的最大导出深度
+        subtree: 只导出满足条件的子树（以及它们的祖先控件），格式为 "ControlType:Name"
+        meta: 额外写入文件信息的内容，例如微信版本和语言
+    Return:
+        count: 导出的控件数量
+    """
+    flt = _parse_filter(subtree)
+    start = time.time()
+    count = 0
+    with _open(out_path, "w") as f:
+        header = {"format": DUMP_FORMAT, "version": DUMP_VERSION, "created": start, "subtree": subtree}
+        header.update(meta)
+        f.write(json.dumps({"meta": header}, ensure_ascii=False) + "\n")
+
+        # 记录当前所在的祖先链，命中子树过滤条件时先补写尚未写出的祖先
+        ancestors: List[Dict] = []
+        written = set()
+        inside_depth = None
+        lines = []
+        base = None
+        for record in iter_tree(control, max_depth):
+            depth = record["depth"]
+            if base is None:
+                base = depth
+            if inside_depth is not None and depth <= inside_depth:
+                inside_depth = None
+            del ancestors[depth - base:]
+
+            if inside_depth is None and _matches(record, flt):
+                inside_depth = depth
+                for ancestor in ancestors:
+                    key = tuple(ancestor["path"])
+                    if key not in written:
+                        written.add(key)
+                        lines.append(json.dumps(ancestor, ensure_ascii=False))
+                        count += 1
+
+            if inside_depth is not None:
+                written.add(tuple(record["path"]))
+                lines.append(json.dumps(record, ensure_ascii=False))
+                count += 1
+                # 分批写入，减少小块 IO
+                if len(lines) >= 1000:
+                    f.write("\n".join(lines) + "\n")
+                    lines = []
+            ancestors.append(record)
+
+        if lines:
+            f.write("\n".join(lines) + "\n")
+    return count
+
+
+def load_dump(path: str) -> Tuple[Dict, List[Dict]]:
+    """
+    读取导出的控件树
+    Return:
+        meta: 文件信息
+        records: 控件记录列表
+    """
+    meta = {}
+    records = []
+    with _open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "meta" in record:
+                meta = record["meta"]
+            else:
+                records.append(record)
+    return meta, records
+
+
+def diff_dumps(old: List[Dict], new: List[Dict], control_type: str = None) -> List[Tuple[str, str]]:
+    """
+    比较两次导出的控件树，找出深度发生变化、名称发生变化、新增以及消失的控件
+    Args:
+        old: 旧的控件记录
+        new: 新的控件记录
+        control_type: 只比较指定类型的控件
+    Return:
+        changes: (变化类型, 描述) 列表，变化类型为 moved / renamed / added / removed
+    """
+    if control_type is not None:
+        old = [r for r in old if r["type"] == control_type]
+        new = [r for r in new if r["type"] == control_type]
+
+    def by_key(records):
+        index: Dict[Tuple[str, str], List[int]] = {}
+        for r in records:
+            index.setdefault((r["type"], r["name"]), []).append(r["depth"])
+        return index
+
+    old_keys, new_keys = by_key(old), by_key(new)
+    old_paths = {tuple(r["path"]): r for r in old}
+    new_paths = {tuple(r["path"]): r for r in new}
+
+    changes = []
+    # 同一位置、同一类型但名称变化的控件
+    renamed_keys = set()
+    for path, r in new_paths.items():
+        o = old_paths.get(path)
+        if o is not None and o["type"] == r["type"] and o["name"] != r["name"]:
+            if (o["type"], o["name"]) not in new_keys and (r["type"], r["name"]) not in old_keys:
+                renamed_keys.add((o["type"], o["name"]))
+                renamed_keys.add((r["type"], r["name"]))
+                changes.append(("renamed", f"{r['type']} depth {r['depth']}: '{o['name']}' -> '{r['name']}'"))
+
+    for key in sorted(set(old_keys) | set(new_keys)):
+        if key in renamed_keys:
+            continue
+        control_type_name, name = key
+        if key not in new_keys:
+            changes.append(("removed", f"{control_type_name} '{name}' depth {sorted(set(old_keys[key]))}"))
+        elif key not in old_keys:
+            changes.append(("added", f"{control_type_name} '{name}' depth {sorted(set(new_keys[key]))}"))
+        elif set(old_keys[key]) != set(new_keys[key]):
+            changes.append(("moved", f"{control_type_name} '{name}' depth {sorted(set(old_keys[key]))} -> {sorted(set(new_keys[key]))}"))
+    return changes
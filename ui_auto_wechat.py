@@ -1,21 +1,24 @@
-import time
+import re
+import threading
 import uiautomation as auto
 import subprocess
-import numpy as np
-import pandas as pd
 import pyperclip
 import os
-import pyautogui
 
 
 from ctypes import *
-from PIL import ImageGrab
-from clipboard import setClipboardFiles
-from PyQt5.QtWidgets import QApplication
-from PyQt5.QtCore import QMimeData, QUrl
-from typing import List
+from ctypes import wintypes
+from datetime import datetime
+from clipboard import encodeClipboardFiles, setClipboardPayload, clipboard_lock
+from typing import Callable, Dict, List, Sequence
 
+# pandas、PIL、pyautogui 和 PyQt5 导入较慢，只在需要它们的函数中导入，保证无界面的服务可以快速启动
+
+import metrics
 from wechat_locale import WeChatLocale
+from locator import Locator, LocatorTable
+from name_index import normalize_name
+from time_header import to_datetime
 
 
 # 鼠标移动到控件上
@@ -26,24 +29,95 @@ def move(element):
 
 # 鼠标快速点击控件
 def click(element):
+    metrics.count("clicks")
     x, y = element.GetPosition()
     auto.Click(x, y)
 
 
 # 鼠标右键点击控件
 def right_click(element):
+    metrics.count("clicks")
     x, y = element.GetPosition()
     auto.RightClick(x, y)
 
 
 # 鼠标快速点击两下控件
 def double_click(element):
+    metrics.count("clicks")
     x, y = element.GetPosition()
     auto.SetCursorPos(x, y)
     element.DoubleClick()
 
 
+# 真实鼠标、键盘以及前台窗口是全局资源，多个微信同时操作时需要串行使用
+input_lock = threading.RLock()
+
+WM_KEYDOWN = 0x0100
+WM_KEYUP = 0x0101
+WM_CHAR = 0x0102
+WM_LBUTTONDOWN = 0x0201
+WM_LBUTTONUP = 0x0202
+MK_LBUTTON = 0x0001
+
+
+# 通过窗口消息点击控件，不移动鼠标，也不需要窗口处于前台
+def post_click(hwnd, element):
+    metrics.count("clicks")
+    x, y = element.GetPosition()
+    point = wintypes.POINT(x, y)
+    windll.user32.ScreenToClient(hwnd, byref(point))
+    lparam = (point.y << 16) | (point.x & 0xFFFF)
+    auto.PostMessage(hwnd, WM_LBUTTONDOWN, MK_LBUTTON, lparam)
+    auto.PostMessage(hwnd, WM_LBUTTONUP, 0, lparam)
+
+
+# 通过窗口消息输入文字，不占用剪切板
+def post_text(hwnd, text):
+    data = text.encode("utf-16-le")
+    # 按 UTF-16 编码单元逐个发送，保证表情等字符也能正确输入
+    for i in range(0, len(data), 2):
+        auto.PostMessage(hwnd, WM_CHAR, int.from_bytes(data[i:i + 2], "little"), 0)
+
+
+# 通过窗口消息发送按键，格式与 auto.SendKeys 相同，例如 "@{UP}{enter}"
+def post_keys(hwnd, keys):
+    for special, char in re.findall(r"\{(\w+)\}|(.)", keys, re.S):
+        if special:
+            vk = auto.SpecialKeyNames[special.upper()]
+            auto.PostMessage(hwnd, WM_KEYDOWN, vk, 0)
+            auto.PostMessage(hwnd, WM_KEYUP, vk, 0)
+        else:
+            post_text(hwnd, char)
+
+
+# 通过 InvokePattern 触发控件，不移动鼠标；控件不支持时返回 False
+def invoke(element) -> bool:
+    try:
+        pattern = element.GetPattern(auto.PatternId.InvokePattern)
+        if pattern is None:
+            return False
+        metrics.count("pattern_calls")
+        pattern.Invoke()
+    except Exception:
+        return False
+    return True
+
+
+# 通过 ValuePattern 设置输入框的内容，不占用剪切板；控件不支持或只读时返回 False
+def set_value(element, text: str) -> bool:
+    try:
+        pattern = element.GetPattern(auto.PatternId.ValuePattern)
+        if pattern is None or pattern.IsReadOnly:
+            return False
+        metrics.count("pattern_calls")
+        pattern.SetValue(text)
+    except Exception:
+        return False
+    return True
+
+
 # 微信的控件介绍。注意"depth"是直接调用auto进行控件搜索的深度（见函数内部代码示例）
+# 控件的定位信息保存在 locators.json 中，微信更新后可以通过 locator.py 重新学习
 # 以群名“测试”为例：
 # 左侧聊天列表“测试”群               Name: '测试'     ControlType: ListItemControl    depth: 10
 # 左侧聊天列表“测试”群               Name: '测试'     ControlType: ButtonControl      depth: 12
@@ -55,12 +129,38 @@ def double_click(element):
 
 
 class WeChat:
-    def __init__(self, path, locale="zh-CN"):
+    def __init__(self, path, locale="zh-CN", locator_table: str = None,
+                 handle: int = None, process_id: int = None, input_mode: str = "mouse",
+                 verify_contact: bool = False, use_patterns: bool = True):
+        """
+        Args:
+            path: 微信打开路径
+            locale: 微信语言，"auto" 代表自动检测
+            locator_table: 控件定位表路径，默认使用 locators.json
+            handle: 指定微信主窗口的句柄（多开微信时使用）
+            process_id: 指定微信进程 ID（多开微信时使用）
+            input_mode: "mouse" 使用真实鼠标和剪切板；"message" 对指定窗口发送窗口消息，需要指定窗口
+            verify_contact: 搜索联系人后确认打开的聊天名称与要找的一致，不一致时抛出 LookupError，不会发给错误的人；
+                            鼠标模式读取输入框的名称，窗口消息模式查找聊天标题。
+                            备注、表情等会让名称不一致，开启前应当设置非空的 directory
+            use_patterns: 优先通过 UIA 的 ValuePattern 输入文字、InvokePattern 点击发送按钮和列表项，
+                          不移动鼠标、不占用剪切板；控件不支持时退回 input_mode 指定的方式
+        """
         # 微信打开路径
         self.path = path
         
-        # 用于复制内容到剪切板
-        self.app = QApplication([])
+        # 指定的微信窗口，为空时操作桌面上找到的第一个微信窗口
+        self.handle = handle
+        self.process_id = process_id
+        assert input_mode in ("mouse", "message")
+        assert input_mode == "mouse" or handle is not None or process_id is not None
+        self.input_mode = input_mode
+        self.use_patterns = use_patterns
+        
+        # 搜索联系人后是否确认打开的聊天
+        self.verify_contact = verify_contact
+        # 通讯录目录（name_index.FuzzyNameIndex），用于确认聊天名称时识别备注等其他叫法，可以为空
+        self.directory = None
         
         # 自动回复的联系人列表
         self.auto_reply_contacts = []
@@ -68,69 +168,195 @@ class WeChat:
         # 自动回复的内容
         self.auto_reply_msg = "[自动回复]您好，我现在正在忙，稍后会主动联系您，感谢理解。"
 
+        # 自动检测微信的语言（需要微信已经打开），检测结果会按微信安装路径缓存。
+        # 指定窗口时只检测该窗口，多开不同语言的微信时不会检测到其他窗口
+        if locale == "auto":
+            self.open_wechat()
+            window = self.get_wechat() if handle is not None or process_id is not None else None
+            locale = WeChatLocale.detect(path, window=window) or "zh-CN"
+
         assert locale in WeChatLocale.getSupportedLocales()
         self.lc = WeChatLocale(locale)
         
+        # 控件定位器，优先使用定位表中缓存的路径查找控件。指定窗口时查找限制在该窗口内
+        bound = handle is not None or process_id is not None
+        self.locator = Locator(self.lc, LocatorTable(locator_table) if locator_table else None,
+                               window=self.get_wechat if bound else None)
+        
+    # QApplication 只在第一次用到时创建（多开时共享同一个），无界面的服务不需要 Qt
+    @property
+    def app(self):
+        from PyQt5.QtWidgets import QApplication
+        return QApplication.instance() or QApplication([])
+    
     # 打开微信客户端
+    @metrics.timed()
     def open_wechat(self):
-        subprocess.Popen(self.path)
+        if self.handle is None and self.process_id is None:
+            subprocess.Popen(self.path)
+        elif self.input_mode == "message":
+            # 窗口消息模式只需要窗口没有最小化，不抢占前台
+            handle = self.get_wechat().NativeWindowHandle
+            if auto.IsIconic(handle):
+                auto.ShowWindow(handle, auto.SW.ShowNoActivate)
+        else:
+            self.get_wechat().SetActive()
     
     # 搜寻微信客户端控件
+    @metrics.timed()
     def get_wechat(self):
-        return auto.WindowControl(Depth=1, Name=self.lc.weixin)
+        if self.handle is not None:
+            return auto.ControlFromHandle(self.handle)
+        if self.process_id is not None:
+            metrics.count("uia_searches")
+            # 按任意语言的窗口标题匹配，检测语言之前（self.lc 还不存在时）也能找到窗口
+            window = auto.WindowControl(
+                Depth=1, Compare=lambda control, depth: control.ProcessId == self.process_id
+                and WeChatLocale.key_of(control.Name) == "weixin")
+            self.handle = window.NativeWindowHandle
+            return window
+        return self.locator.find("main_window")
+
+    # 需要真实键盘输入时把指定的微信窗口切换到前台（调用时需持有 input_lock）
+    def _activate(self):
+        if self.input_mode == "message":
+            self.get_wechat().SetActive()
+
+    # 点击主窗口内的控件
+    def _click(self, element):
+        if self.input_mode == "message":
+            post_click(self.handle, element)
+        else:
+            click(element)
+
+    # 触发按钮或列表项：优先使用 InvokePattern，不支持时使用 fallback（默认为 _click，窗口消息模式下不移动真实鼠标）
+    def _invoke(self, element, fallback=None):
+        if not (self.use_patterns and invoke(element)):
+            (fallback or self._click)(element)
+
+    # 发送按键
+    def _send_keys(self, keys):
+        if self.input_mode == "message":
+            post_keys(self.handle, keys)
+        else:
+            auto.SendKeys(keys)
 
     # 获取当前聊天对象的昵称
+    @metrics.timed()
     def get_current_name(self):
-        wechat.open_wechat()
-        wechat.get_wechat()
+        self.open_wechat()
+        self.get_wechat()
         # 等待焦点锁定在微信窗口
-        time.sleep(1)
+        metrics.sleep(1)
 
         # 获取聊天窗口
         window = auto.GetFocusedControl()
         return window.Name
     
     # 防止微信长时间挂机导致掉线
+    @metrics.timed()
     def prevent_offline(self):
         self.open_wechat()
         self.get_wechat()
         
-        search_box = auto.EditControl(Depth=8, Name=self.lc.search)
-        click(search_box)
+        search_box = self.locator.find("search_box")
+        self._click(search_box)
     
     # 搜索指定用户
+    @metrics.timed()
     def get_contact(self, name):
         self.open_wechat()
         self.get_wechat()
         
-        search_box = auto.EditControl(Depth=8, Name=self.lc.search)
-        click(search_box)
-        
-        pyperclip.copy(name)
-        auto.SendKeys("{Ctrl}v")
-        
+        search_box = self.locator.find("search_box")
+        # 鼠标模式下直接设置搜索框的内容，回车时 SendKeys 会让搜索框获得焦点；
+        # 窗口消息模式的按键发给窗口内的焦点控件，仍然需要先点击搜索框
+        if not (self.use_patterns and self.input_mode == "mouse" and set_value(search_box, name)):
+            self._click(search_box)
+            
+            if self.input_mode == "message":
+                post_text(self.handle, name)
+            else:
+                with clipboard_lock:
+                    pyperclip.copy(name)
+                    metrics.count("clipboard_writes")
+                    auto.SendKeys("{Ctrl}v")
         
         # 等待客户端搜索联系人
-        time.sleep(0.3)
-        search_box.SendKeys("{enter}")
+        metrics.sleep(0.3)
+        if self.input_mode == "message":
+            post_keys(self.handle, "{enter}")
+        else:
+            search_box.SendKeys("{enter}")
+        if self.verify_contact:
+            self._verify_contact(name)
+    
+    # 确认搜索后打开的是要找的聊天。鼠标模式下打开聊天后焦点位于输入框，输入框的名称就是聊天名称；
+    # 窗口消息模式下微信不在前台，焦点不可靠，改为在指定窗口内查找名称一致的聊天标题
+    def _verify_contact(self, name: str) -> None:
+        aliases = {name}
+        if self.directory is not None:
+            for real_name in self.directory.names_for(name):
+                aliases.update(self.directory.aliases[real_name])
+        expected = {normalize_name(alias) for alias in aliases}
+        
+        current = ""
+        for _ in range(10):
+            if self.input_mode == "message":
+                if any(self.locator.find("chat_title", alias).Exists(0, 0) for alias in aliases):
+                    return
+            else:
+                focused = auto.GetFocusedControl()
+                current = focused.Name if focused is not None else ""
+                if normalize_name(current) in expected:
+                    return
+            # 等待界面切换到聊天
+            metrics.sleep(0.1)
+        if self.input_mode == "message":
+            raise LookupError(f"搜索“{name}”后没有找到名称一致的聊天标题，已取消操作")
+        raise LookupError(f"搜索“{name}”后打开的聊天是“{current}”，已取消操作")
     
     # 鼠标移动到发送按钮处点击发送消息
+    @metrics.timed()
     def press_enter(self):
         # 获取发送按钮
-        send_button = auto.ButtonControl(Depth=15, Name=self.lc.send)
-        click(send_button)
+        send_button = self.locator.find("send_button")
+        self._invoke(send_button)
 
+    @metrics.timed()
     def paste_text(self, text: str) -> None:
         """
         封装文本粘贴逻辑
         Args:
             text: 待发送文本
         """
-        pyperclip.copy(text)
-        # 等待粘贴
-        time.sleep(0.3)
-        auto.SendKeys("{Ctrl}v")
+        # 窗口消息无法输入换行（回车会直接发送），含换行的文本仍然使用剪切板
+        if self.use_patterns and self.input_mode == "mouse" and self._set_message(text):
+            return
+
+        if self.input_mode == "message" and "\n" not in text:
+            post_text(self.handle, text)
+            return
+
+        with clipboard_lock, input_lock:
+            self._activate()
+            pyperclip.copy(text)
+            metrics.count("clipboard_writes")
+            # 等待粘贴
+            metrics.sleep(0.3)
+            auto.SendKeys("{Ctrl}v")
+
+    # 通过 ValuePattern 填写输入框。搜索联系人后焦点位于输入框；输入框中已经有 @ 等内容时不覆盖，返回 False
+    def _set_message(self, text: str) -> bool:
+        edit = auto.GetFocusedControl()
+        if edit is None or edit.ControlTypeName != "EditControl":
+            return False
+        pattern = edit.GetPattern(auto.PatternId.ValuePattern)
+        if pattern is None or pattern.IsReadOnly or pattern.Value:
+            return False
+        return set_value(edit, text)
 
+    @metrics.timed()
     def send_msg(self, name, at_names: List[str] = None, text: str = None, search_user: bool = True) -> bool:
         """
         搜索指定用户名的联系人发送信息, 同时可以在指定群聊中@他人（若@所有人需具备@所有人权限）
@@ -149,12 +375,12 @@ class WeChat:
             for at_name in at_names:
                 # 如果at_name为 "所有人" 则代表@所有人
                 if at_name == "所有人":
-                    auto.SendKeys("@{UP}{enter}")
+                    self._send_keys("@{UP}{enter}")
 
                 elif at_name != "":
-                    auto.SendKeys(f"@{at_name}")
+                    self._send_keys(f"@{at_name}")
                     # 按下回车键确认要at的人
-                    auto.SendKeys("{enter}")
+                    self._send_keys("{enter}")
 
         # 如果发送信息不为空，则发送信息
         if text is not None:
@@ -164,15 +390,15 @@ class WeChat:
 
         # 发送消息后马上获取聊天记录，判断是否发送成功
         try:
-            if self.get_dialogs(name, 1, False)[0][2] == text:
-                return True
-            else:
-                return False
+            last = self.get_dialogs(name, 1, False)[0][2]
+            # @他人时消息以 “@名字” 开头
+            return last == text or (bool(at_names) and text is not None and last.endswith(text))
 
         except Exception:
             return False
 
     # 搜索指定用户名的联系人发送文件
+    @metrics.timed()
     def send_file(self, name: str, path: str, search_user: bool = True) -> None:
         """
         Args:
@@ -183,20 +409,72 @@ class WeChat:
         if search_user:
             self.get_contact(name)
         
-        # 将文件复制到剪切板
-        setClipboardFiles([path])
-        
-        auto.SendKeys("{Ctrl}v")
+        self._paste_files(encodeClipboardFiles([path]))
         self.press_enter()
     
+    # 微信单个文件的大小上限
+    MAX_FILE_SIZE = 1024 ** 3
+    
+    # 将编码好的文件列表复制到剪切板并粘贴
+    def _paste_files(self, payload: bytes) -> None:
+        with clipboard_lock, input_lock:
+            self._activate()
+            setClipboardPayload(payload)
+            auto.SendKeys("{Ctrl}v")
+    
+    @metrics.timed()
+    def send_files(self, names: Sequence[str], paths: Sequence[str], search_user: bool = True) -> Dict[str, str]:
+        """
+        把同一批文件发送给多个联系人或群聊，每个聊天只粘贴一次（所有文件一起粘贴、一起发送）
+        Args:
+            names: 接收人列表
+            paths: 文件的本地地址列表
+            search_user: 是否需要搜索用户
+        Return:
+            failed: 发送失败的接收人及原因，全部成功时为空字典
+        """
+        # 在操作界面之前检查所有文件，文件有问题时一个也不发送
+        paths = [os.path.abspath(path) for path in paths]
+        if not paths:
+            raise ValueError("没有需要发送的文件")
+        for path in paths:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"文件不存在：{path}")
+            size = os.path.getsize(path)
+            if size == 0:
+                raise ValueError(f"不能发送空文件：{path}")
+            if size > self.MAX_FILE_SIZE:
+                raise ValueError(f"文件超过微信的大小上限：{path}")
+        
+        # 剪切板数据只编码一次，所有接收人共用
+        payload = encodeClipboardFiles(paths)
+        failed = {}
+        for name in names:
+            try:
+                if search_user:
+                    self.get_contact(name)
+                self._paste_files(payload)
+                self.press_enter()
+            except Exception as e:
+                failed[name] = str(e)
+        return failed
+    
     # 获取所有通讯录中所有联系人
-    def find_all_contacts(self) -> pd.DataFrame:
+    @metrics.timed()
+    def find_all_contacts(self, as_dataframe: bool = True, on_batch: Callable = None):
+        """
+        Args:
+            as_dataframe: 是否返回 pandas.DataFrame，为 False 时返回字典列表，不需要导入 pandas
+            on_batch: 每次滚动读到新的联系人时调用，参数为新联系人的字典列表，用于边读取边显示
+        Return:
+            contacts: 联系人的昵称、备注以及标签
+        """
         self.open_wechat()
         self.get_wechat()
         
         # 获取通讯录管理界面
-        click(auto.ButtonControl(Name=self.lc.contacts))
-        list_control = auto.ListControl(Name=self.lc.contact)
+        click(self.locator.find("contacts_button"))
+        list_control = self.locator.find("contact_list")
         # scroll_pattern = list_control.GetScrollPattern()
         # scroll_pattern.SetScrollPercent(-1, 0)
         contacts_menu = list_control.ButtonControl(Name=self.lc.manage_contacts)
@@ -207,40 +485,78 @@ class WeChat:
         list_control = contacts_window.ListControl()
         scroll_pattern = list_control.GetScrollPattern()
         
-        # 读取用户
-        contacts = pd.DataFrame(columns=["昵称", "备注", "标签"])
-        # 如果不存在滑轮则直接读取
-        if scroll_pattern is None:
+        # 读取用户，根据昵称进行去重（保留第一次出现的记录）
+        contacts = {}
+        # 如果不存在滑轮则直接读取，否则逐步滚动读取
+        percents = [None] if scroll_pattern is None else [i / 1000 for i in range(1001)]
+        for percent in percents:
+            if percent is not None:
+                scroll_pattern.SetScrollPercent(-1, percent)
+            batch = []
             for contact in contacts_window.ListControl().GetChildren():
                 # 获取用户的昵称备注以及标签
+                metrics.count("uia_searches", 3)
                 name = contact.TextControl().Name
                 note = contact.ButtonControl(foundIndex=2).Name
                 label = contact.ButtonControl(foundIndex=3).Name
 
-                contacts = contacts._append({"昵称": name, "备注": note, "标签": label}, ignore_index=True)
-        else:
-            for percent in np.arange(0, 1.001, 0.001):
-                scroll_pattern.SetScrollPercent(-1, percent)
-                for contact in contacts_window.ListControl().GetChildren():
-                    # 获取用户的昵称备注以及标签
-                    name = contact.TextControl().Name
-                    note = contact.ButtonControl(foundIndex=2).Name
-                    label = contact.ButtonControl(foundIndex=3).Name
+                if name not in contacts:
+                    contacts[name] = {"昵称": name, "备注": note, "标签": label}
+                    batch.append(contacts[name])
+            if batch and on_batch is not None:
+                on_batch(batch)
 
-                    contacts = contacts._append({"昵称": name, "备注": note, "标签": label}, ignore_index=True)
-
-        # 对用户根据昵称进行去重
-        contacts = contacts.drop_duplicates(subset=["昵称"])
+        contacts = list(contacts.values())
+        if as_dataframe:
+            import pandas as pd
+            return pd.DataFrame(contacts, columns=["昵称", "备注", "标签"])
         return contacts
     
+    # 按深度优先顺序返回控件所有后代中 TextControl 的名称
+    @staticmethod
+    def _descendant_texts(control):
+        for child in control.GetChildren():
+            if child.ControlTypeName == "TextControl":
+                yield child.Name
+            else:
+                yield from WeChat._descendant_texts(child)
+
+    # 读取通讯录管理界面中群聊列表的一行：群名以及成员数量
+    @staticmethod
+    def _read_group_row(row):
+        metrics.count("uia_searches")
+        texts = [c.Name for c in row.GetChildren() if c.ControlTypeName == "TextControl"]
+        if not texts:
+            # 文字不是行的直接子控件（例如包在 Pane 中）时按深度优先查找所有后代
+            texts = list(WeChat._descendant_texts(row))
+        if not texts:
+            return None, None
+        # 群名中的顿号替换成空格，这样才能在搜索框搜索到
+        name = texts[0].replace("、", " ")
+        members = None
+        for text in texts[1:]:
+            match = re.fullmatch(r"\((\d+)\)", text.strip())
+            if match:
+                members = int(match.group(1))
+        return name, members
+
     # 获取所有群聊
-    def find_all_groups(self):
+    @metrics.timed()
+    def find_all_groups(self, on_batch: Callable = None, with_members: bool = False):
+        """
+        Args:
+            on_batch: 每次滚动读到新的群聊时调用，参数为新群聊名称的列表，用于边读取边显示
+            with_members: 是否同时返回成员数量
+        Return:
+            groups: 按界面中的顺序排列的群名（已去重）；with_members 为 True 时为 {"群名", "人数"} 的字典列表。
+                按显示的群名去重，名称相同的不同群聊只保留第一个（通过搜索框也无法区分它们）
+        """
         self.open_wechat()
         self.get_wechat()
         
         # 获取通讯录管理界面
-        click(auto.ButtonControl(Name=self.lc.contacts))
-        list_control = auto.ListControl(Name=self.lc.contact)
+        click(self.locator.find("contacts_button"))
+        list_control = self.locator.find("contact_list")
         scroll_pattern = list_control.GetScrollPattern()
         scroll_pattern.SetScrollPercent(-1, 0)
         contacts_menu = list_control.ButtonControl(Name=self.lc.manage_contacts)
@@ -250,66 +566,117 @@ class WeChat:
         contacts_window = auto.GetForegroundControl()
         
         # 点击最近群聊
-        click(contacts_window.ButtonControl(Name="最近群聊"))
+        click(contacts_window.ButtonControl(Name=self.lc.recent_group_chats))
         
         # 获取群聊列表
         list_control = contacts_window.ListControl()
         scroll_pattern = list_control.GetScrollPattern()
         
-        # 读取群聊
-        contacts = []
-        # 如果不存在滑轮则直接读取
-        if scroll_pattern is None:
-            for contact in contacts_window.ListControl().GetChildren():
-                # 获取群聊的名称 (将所有的顿号替换成了空格，这样才能在搜索框搜索到)
-                name = contact.TextControl().Name.replace("、", " ")
-                contacts.append(name)
-
+        # 群名 -> 成员数量，字典保持第一次出现的顺序，插入时即完成去重
+        groups = {}
+
+        def read_screen():
+            return [row for row in map(self._read_group_row, contacts_window.ListControl().GetChildren())
+                    if row[0] is not None]
+
+        def harvest(rows):
+            batch = [name for name, _ in rows if name not in groups]
+            for name, members in rows:
+                groups.setdefault(name, members)
+            if batch and on_batch is not None:
+                on_batch(batch)
+            return batch
+
+        view = (scroll_pattern.VerticalViewSize or 0) / 100 if scroll_pattern is not None else 1
+        if view >= 1:
+            # 不存在滑轮或者整个列表都可见时直接读取
+            harvest(read_screen())
         else:
-            for percent in np.arange(0, 1.002, 0.01):
-                scroll_pattern.SetScrollPercent(-1, percent)
-                for contact in contacts_window.ListControl().GetChildren():
-                    # 获取群聊的名称 (将所有的顿号替换成了空格，这样才能在搜索框搜索到)
-                    name = contact.TextControl().Name.replace("、", " ")
-                    contacts.append(name)
-        
-        # 返回去重过后的群聊
-        return list(set(contacts))
+            # 每次大约滚动 80% 屏，相邻两屏有重叠；取不到可见比例时从 1% 开始，根据实际读到的新行数调整步长。
+            # 列表的末尾由行本身判断：滚动后没有新的行，最后一行也没有变化
+            step = view * 0.8 if view > 0 else 0.01
+            percent = 0.0
+            scroll_pattern.SetScrollPercent(-1, percent)
+            rows = read_screen()
+            harvest(rows)
+            last = rows[-1] if rows else None
+            while True:
+                target = min(1.0, percent + step)
+                scroll_pattern.SetScrollPercent(-1, target)
+                rows = read_screen()
+                if rows and step > 0.001 and not any(name in groups for name, _ in rows):
+                    # 与已读取的行没有重叠，说明中间有行被跳过，减小步长重新滚动
+                    step /= 2
+                    continue
+                batch = harvest(rows)
+                tail = rows[-1] if rows else None
+                if not batch and tail == last:
+                    # 可见内容没有变化：已经在底部时到达末尾，否则是步长太小
+                    if percent >= 1:
+                        break
+                    step *= 2
+                elif batch and len(batch) < len(rows):
+                    # 按这次滚动带来的新行数调整步长，使新行约占一屏的 80%
+                    step = min(1.0, step * 0.8 * len(rows) / len(batch))
+                percent, last = target, tail
+
+        if with_members:
+            return [{"群名": name, "人数": members} for name, members in groups.items()]
+        return list(groups)
     
     # 检测微信是否收到新消息
-    def check_new_msg(self):
+    @metrics.timed()
+    def check_new_msg(self, on_new_msg: Callable = None, n_msg: int = 0) -> List[str]:
+        """
+        Args:
+            on_new_msg: 收到新消息时的回调，参数为 (会话名称, 最后 n_msg 条聊天记录)
+            n_msg: 同时读取每个新消息会话最后的消息数量，0 代表不读取
+        Return:
+            names: 有新消息的会话名称
+        """
         self.open_wechat()
         self.get_wechat()
         
         # 获取左侧聊天按钮
-        chat_btn = auto.ButtonControl(Name=self.lc.chats)
+        chat_btn = self.locator.find("chats_button")
         double_click(chat_btn)
         
         # 持续点击聊天按钮，直到获取完全部新消息
-        item = auto.ListItemControl(Depth=10)
+        item = self.locator.find("chat_list_item")
         prev_name = item.ButtonControl().Name
+        names = []
         
         while True:
             # 判断该联系人是否有新消息
             pane_control = item.PaneControl()
-            if len(pane_control.GetChildren()) == 3:
-                print(f"{item.ButtonControl().Name} 有新消息")
+            has_new = len(pane_control.GetChildren()) == 3
+            if has_new:
+                print(f"{prev_name} 有新消息")
                 # 判断该联系人是否需要自动回复
-                if item.ButtonControl().Name in self.auto_reply_contacts:
-                    print(f"自动回复 {item.ButtonControl().Name}")
+                if prev_name in self.auto_reply_contacts:
+                    print(f"自动回复 {prev_name}")
                     self._auto_reply(item, self.auto_reply_msg)
                 
-            click(item)
+            self._invoke(item)
+            
+            # 进入会话后读取最新的聊天记录
+            if has_new:
+                names.append(prev_name)
+                if on_new_msg is not None:
+                    on_new_msg(prev_name, self.get_dialogs(prev_name, n_msg, False) if n_msg else [])
             
             # 跳转到下一个新消息
             double_click(chat_btn)
-            item = auto.ListItemControl(Depth=10)
+            item = self.locator.find("chat_list_item")
             
             # 已经完成遍历，退出循环
-            if prev_name == item.ButtonControl().Name:
+            name = item.ButtonControl().Name
+            if prev_name == name:
                 break
             
-            prev_name = item.ButtonControl().Name
+            prev_name = name
+        
+        return names
     
     # 设置自动回复的联系人
     def set_auto_reply(self, contacts):
@@ -317,40 +684,39 @@ class WeChat:
         self.auto_reply_contacts = contacts
     
     # 自动回复
+    @metrics.timed()
     def _auto_reply(self, element, text):
-        click(element)
-        pyperclip.copy(text)
-        auto.SendKeys("{Ctrl}v")
+        self._invoke(element)
+        self.paste_text(text)
         self.press_enter()
     
+    # 聊天内容类型的说明
+    _type_info = {0: '用户发送', 1: '时间信息', 2: '红包信息', 3: '"查看更多消息"标志', 4: '撤回消息', 5: "System Notification", 6: '"以下是新消息"标志'}
+    
+    # 提示文字对应的聊天内容类型
+    _marker_types = {"view_more_messages": 3, "red_packet": 2, "recalled": 4, "new_messages_below": 6}
+
     # 识别聊天内容的类型
     # 0：用户发送    1：时间信息  2：红包信息  3：”查看更多消息“标志 4：撤回消息
     def _detect_type(self, list_item_control: auto.ListItemControl) -> int:
         value = None
         # 判断内容框是否为时间框，如果是时间框则子控件不是PaneControl
-        if not isinstance(list_item_control.GetFirstChildControl(), auto.PaneControl):
+        first_child = list_item_control.GetFirstChildControl()
+        if first_child is None or first_child.ControlTypeName != "PaneControl":
             value = 1
         
         else:
             cnt = 0
+            metrics.count("uia_searches")
             for child in list_item_control.PaneControl().GetChildren():
                 cnt += len(child.GetChildren())
             
             # 判断是否为用户发送的信息
             if cnt > 0:
                 value = 0
-            # 判断是否为“查看更多消息”
-            elif list_item_control.Name == "查看更多消息":
-                value = 3
-            # 或者是红包信息
-            elif "红包" in list_item_control.Name or "red packet" in list_item_control.Name.lower():
-                value = 2
-            # 或者是撤回消息
-            elif "撤回了一条消息" in list_item_control.Name:
-                value = 4
-            # 或者是新消息通知
-            elif "以下为新消息" in list_item_control.Name:
-                value = 6
+            # 否则根据提示文字判断（“查看更多消息”、红包信息、撤回消息或新消息通知），支持所有语言
+            else:
+                value = self._marker_types.get(WeChatLocale.find_marker(list_item_control.Name))
 
                 
         if value is None:
@@ -361,8 +727,9 @@ class WeChat:
     # 获取聊天窗口
     def _get_chat_frame(self, name: str):
         self.get_contact(name)
-        return auto.ListControl(Name=self.lc.message)
+        return self.locator.find("message_list")
     
+    @metrics.timed()
     def save_dialog_pictures(self, name: str, num: int, save_dir: str) -> None:
         """
         保存指定聊天记录中的图片。图片的名字代表图片在聊天记录中的顺序，从1开始代表最新的图片。
@@ -374,11 +741,11 @@ class WeChat:
         
         # 进入图片聊天记录界面
         self.get_contact(name)
-        click(auto.ButtonControl(Name=self.lc.chat_history, Depth=14))
-        click(auto.TabItemControl(Name=self.lc.photos_n_videos, Depth=6))
+        click(self.locator.find("chat_history_button"))
+        click(self.locator.find("photos_tab"))
         
         # 图片栏控件
-        list_control = auto.ListControl(Name=self.lc.photos_n_videos, Depth=6)
+        list_control = self.locator.find("photos_list")
         
         # 如果图片数量 < num，则继续往上翻直到满足条件或无法上翻为止
         move(list_control.GetLastChildControl())
@@ -394,15 +761,16 @@ class WeChat:
                 if cnt < num:
                     # 复制图片到剪切板
                     right_click(list_item_control)
-                    menu = auto.ListControl(Depth=4)
+                    menu = self.locator.find("context_menu")
                     copy = menu.GetFirstChildControl()
                     # 如果图片已经被清理则跳过
                     if copy.Name != self.lc.copy:
                         continue
                     else:
-                        click(auto.MenuItemControl(Name=self.lc.copy, Depth=5))
+                        click(self.locator.find("copy_menu_item"))
                     
                     # 获取图片路径防止重复存储
+                    from PIL import ImageGrab
                     pic_hash = ImageGrab.grabclipboard()[0]
 
                     # 获取后缀
@@ -415,12 +783,14 @@ class WeChat:
                         save_path = os.path.join(save_dir, f"{cnt}.{suffix}")
                         os.system(f"copy \"{pic_hash}\" \"{save_path}\"")
             # 上滑
+            import pyautogui
             pyautogui.scroll(300)
             # 如果无法上滑则退出
             if ori_cnt == cnt:
                 break
             
     # 获取指定聊天窗口的聊天记录
+    @metrics.timed()
     def get_dialogs(self, name: str, n_msg: int, search_user: bool = True) -> List:
         """
         Args:
@@ -434,7 +804,7 @@ class WeChat:
         if search_user:
             list_control = self._get_chat_frame(name)
         else:
-            list_control = auto.ListControl(Name=self.lc.message)
+            list_control = self.locator.find("message_list")
         scroll_pattern = list_control.GetScrollPattern()
 
         # 如果聊天记录数量 < n_msg，则继续往上翻直到满足条件或无法上翻为止
@@ -448,11 +818,11 @@ class WeChat:
                 break
             # 否则点击“查看更多消息”
             else:
-                click(first_item)
+                self._invoke(first_item)
 
         cnt = 0
         dialogs = []
-        value_to_info = {0: '用户发送', 1: '时间信息', 2: '红包信息', 3: '"查看更多消息"标志', 4: '撤回消息', 5: "System Notification", 6: '"以下是新消息"标志'}
+        value_to_info = self._type_info
         # 从下往上依次记录聊天内容。
         for list_item_control in list_control.GetChildren()[::-1]:
             v = self._detect_type(list_item_control)
@@ -470,6 +840,72 @@ class WeChat:
         dialogs = dialogs[::-1]
         return dialogs
 
+    def iter_dialogs(self, name: str, n_msg: int = None, search_user: bool = True, skip: int = 0):
+        """
+        从最后一条消息往上逐条返回聊天记录，边翻页边返回，不需要等全部聊天记录加载完
+        Args:
+            name: 聊天窗口的姓名
+            n_msg: 返回的最大数量，为空时一直翻到最早的消息
+            search_user: 是否需要搜索用户
+            skip: 跳过最新的若干条消息（用于分页）
+        Yield:
+            (信息类型，发送人，发送内容)，不包含“查看更多消息”标志
+        """
+        if search_user:
+            list_control = self._get_chat_frame(name)
+        else:
+            list_control = self.locator.find("message_list")
+        scroll_pattern = list_control.GetScrollPattern()
+
+        # 已经处理过的消息数量（从下往上数，不包含“查看更多消息”标志）
+        seen = 0
+        count = 0
+        children = list_control.GetChildren()
+        while True:
+            for list_item_control in children[len(children) - seen - 1::-1] if seen < len(children) else []:
+                v = self._detect_type(list_item_control)
+                if v == 3:
+                    continue
+                seen += 1
+                if seen <= skip:
+                    continue
+                sender = list_item_control.ButtonControl().Name if v == 0 else ''
+                yield self._type_info[v], sender, list_item_control.Name
+                count += 1
+                if n_msg is not None and count >= n_msg:
+                    return
+
+            # 点击“查看更多消息”继续加载，无法上翻时结束
+            if not children or self._detect_type(children[0]) != 3:
+                return
+            if scroll_pattern:
+                scroll_pattern.SetScrollPercent(-1, 0)
+            self._invoke(children[0])
+            # 加载后的列表直接用于下一轮，不重复读取
+            loaded = list_control.GetChildren()
+            if len(loaded) <= len(children):
+                return
+            children = loaded
+
+    def _iter_time_blocks(self, name: str, search_user: bool = True, now: datetime = None):
+        """
+        从最后一条消息往上按时间信息分块返回聊天记录，边翻页边返回
+        Yield:
+            (时间信息, 时间信息对应的 datetime, 这个时间信息下面的消息列表)，消息从早到晚排列；
+            最早的时间信息上面还有消息时，最后返回 (None, None, 这些消息)
+        """
+        now = now or datetime.now()
+        block = []
+        for msg in self.iter_dialogs(name, None, search_user):
+            if msg[0] == self._type_info[1]:
+                yield msg, to_datetime(msg[2], now), block[::-1]
+                block = []
+            else:
+                block.append(msg)
+        if block:
+            yield None, None, block[::-1]
+
+    @metrics.timed()
     def get_dialogs_by_time_blocks(self, name: str, n_time_blocks: int, search_user: bool = True) -> List[List]:
         """
         获取指定聊天窗口的聊天记录，并按时间信息分组。
@@ -478,49 +914,39 @@ class WeChat:
             n_time_blocks: 获取的时间分块数量
             search_user: 是否需要搜索用户
         Return:
-            groups: 聊天记录列表，每个元素为一个时间分块内的消息列表
+            groups: 聊天记录列表，每个元素为一个时间分块内的消息列表（第一条是时间信息）
         """
-        n_msg = n_time_blocks * 5
-        prev_dialogs = None
+        # 读到第 n_time_blocks 个时间信息就停止，不需要估计消息数量反复重新读取
         groups = []
-        while True:
-            dialogs = self.get_dialogs(name, n_msg, search_user)
-
-            # 如果获取的dialogs和之前一样，说明没有更多消息了，退出循环
-            if prev_dialogs == dialogs:
+        for header, _, messages in self._iter_time_blocks(name, search_user):
+            # 最早的时间信息上面的消息不属于任何分块
+            if header is None:
                 break
-            # 分组逻辑调整：处理顺序改为从最新消息到最早消息
-            groups = []
-            current_group = None
-
-            # 遍历所有消息，按照时间信息分组
-            for msg in dialogs:
-                # 遇见时间信息则新建一个分组
-                if msg[0] == '时间信息':
-                    # 将上一个分组加入到groups中
-                    if current_group is not None:
-                        groups.append(current_group)
-
-                    # 初始化新的分组
-                    current_group = [msg]
-
-                elif current_group is not None:
-                    current_group.append(msg)
-
-            # 将最后一个分组加入到groups中
-            if current_group is not None:
-                groups.append(current_group)
-
-            # 获取n_time_blocks个时间块，取groups的最后n_time_blocks个元素
-            if len(groups) >= n_time_blocks:
-                groups = groups[-n_time_blocks:]
+            groups.append([header] + messages)
+            if len(groups) == n_time_blocks:
                 break
-            else:
-                prev_dialogs = dialogs
-                n_msg *= 2
-                search_user = False  # 后续不需要再次搜索用户
+        return groups[::-1]
 
-        return groups
+    @metrics.timed()
+    def get_dialogs_since(self, name: str, since: datetime, search_user: bool = True, now: datetime = None) -> List:
+        """
+        获取指定时间之后的聊天记录，往上翻到早于 since 的时间信息就停止，读取的消息数量与返回的数量相当。
+        Args:
+            name: 聊天窗口的姓名
+            since: 起始时间，例如 datetime.now() - timedelta(days=1)
+            search_user: 是否需要搜索用户
+            now: 聊天记录显示时的当前时间，“昨天”、“星期二”等时间信息相对于它计算，默认为现在
+        Return:
+            dialogs: 聊天记录列表，从早到晚排列，内部元素为四元组（信息类型，发送人，发送内容，发送时间），
+                发送时间为所在时间分块的时间信息，无法识别时为 None
+        """
+        blocks = []
+        for header, when, messages in self._iter_time_blocks(name, search_user, now):
+            if when is not None and when < since:
+                break
+            rows = [header] + messages if header is not None else messages
+            blocks.append([(msg_type, sender, text, when) for msg_type, sender, text in rows])
+        return [msg for block in blocks[::-1] for msg in block]
 
 
 if __name__ == '__main__':
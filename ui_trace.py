@@ -0,0 +1,453 @@
+"""
+界面调用的录制与回放。
+Recorder 替换 ui_auto_wechat、clipboard 中的 uiautomation、pyperclip、subprocess 和 win32clipboard（locator 在函数内导入 uiautomation，
+因此 sys.modules 中的 uiautomation 同样被替换），
+记录每一次控件搜索、属性读取、GetChildren、点击、按键和剪切板操作的参数、结果和耗时，逐行写入 JSON Lines 轨迹文件。
+Replayer 在没有微信的环境（例如 Linux）中按轨迹返回同样的结果，并按原来的耗时（或乘以 scale）等待，
+可以用真实的控件树形状检查 get_dialogs、find_all_contacts 等操作的优化。
+
+    recorder = Recorder("ui.jsonl")
+    recorder.install()          # 之后对微信的操作都会被录制
+    ...
+    recorder.uninstall()
+
+    python ui_trace.py replay ui.jsonl get_dialogs 测试群 100 --scale 0
+
+回放时按 (对象, 操作, 名称, 参数) 查找录制的结果，同一个键出现多次时按录制的顺序返回，用完后一直返回最后一次的结果，
+因此调用顺序可以与录制时不同（例如减少了重复的属性读取）；录制中没有出现过的调用会抛出 LookupError。
+"""
+import argparse
+import base64
+import builtins
+import contextlib
+import inspect
+import json
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from typing import Dict, List, Tuple
+
+import metrics
+
+# 被替换的模块属性：(模块名, 属性名)，属性名同时作为轨迹中的对象名
+TARGETS = (
+    ("ui_auto_wechat", "auto"),
+    ("ui_auto_wechat", "pyperclip"),
+    ("ui_auto_wechat", "subprocess"),
+    ("clipboard", "win32clipboard"),
+)
+
+_PRIMITIVES = (type(None), bool, int, float, str)
+
+
+def _encode_bytes(value: bytes) -> Dict:
+    return {"bytes": base64.b64encode(value).decode("ascii")}
+
+
+def _encode_arg(value):
+    """参数在轨迹中的形式，录制和回放使用同一种形式，回放时据此查找录制的结果"""
+    if isinstance(value, (_RecordingProxy, _ReplayProxy)):
+        return {"ref": value._oid}
+    if isinstance(value, _PRIMITIVES):
+        return value
+    if isinstance(value, bytes):
+        return _encode_bytes(value)
+    if isinstance(value, (list, tuple)):
+        return {"list": [_encode_arg(v) for v in value]}
+    if callable(value):
+        # 例如搜索时的 Compare 函数，回放时无法比较，只记录名称
+        return {"callable": getattr(value, "__qualname__", type(value).__name__)}
+    return {"repr": repr(value)}
+
+
+def _key(obj, op: str, name: str, args, kwargs) -> str:
+    return json.dumps([obj, op, name, args, kwargs], ensure_ascii=False, sort_keys=True)
+
+
+class _RecordingProxy:
+    """录制对象的属性读取和方法调用，返回的对象同样被包装"""
+    __slots__ = ("_recorder", "_oid", "_target")
+
+    def __init__(self, recorder: "Recorder", oid, target):
+        object.__setattr__(self, "_recorder", recorder)
+        object.__setattr__(self, "_oid", oid)
+        object.__setattr__(self, "_target", target)
+
+    def __getattr__(self, name):
+        return self._recorder._get(self, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __call__(self, *args, **kwargs):
+        return self._recorder._call(self._oid, "__call__", self._target, args, kwargs)
+
+    def __enter__(self):
+        return self._target.__enter__()
+
+    def __exit__(self, *exc):
+        return self._target.__exit__(*exc)
+
+    def __repr__(self):
+        return f"<recorded {self._oid}: {self._target!r}>"
+
+
+class Recorder:
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 轨迹文件路径，已经存在时覆盖
+        """
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._next_oid = 0
+        self._start = None
+        self._patched = []
+        # 类（例如 auto.TextControl）只包装一次，轨迹中使用同一个对象
+        self._classes: Dict[int, _RecordingProxy] = {}
+        self._last_seq: Dict[str, int] = {}
+
+    def install(self) -> None:
+        import importlib
+
+        if self._file is not None:
+            return
+        self._file = open(self.path, "w", encoding="utf-8", buffering=1)
+        self._start = time.perf_counter()
+        self._file.write(json.dumps({"version": 1, "created": time.time()}) + "\n")
+        proxies = {}
+        for module_name, attr in TARGETS:
+            module = importlib.import_module(module_name)
+            original = getattr(module, attr)
+            self._patched.append((module, attr, original))
+            proxies[attr] = _RecordingProxy(self, attr, original)
+            setattr(module, attr, proxies[attr])
+        self._patched.append((sys.modules, "uiautomation", sys.modules["uiautomation"]))
+        sys.modules["uiautomation"] = proxies["auto"]
+        # 最外层的操作（send_msg、get_dialogs 等）结束时记录位置，回放时可以只回放其中一次操作
+        metrics.add_listener(self._on_span)
+
+    def uninstall(self) -> None:
+        metrics.remove_listener(self._on_span)
+        for target, attr, original in reversed(self._patched):
+            if target is sys.modules:
+                sys.modules[attr] = original
+            else:
+                setattr(target, attr, original)
+        self._patched = []
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc):
+        self.uninstall()
+
+    def _wrap(self, value) -> Tuple[object, object]:
+        """返回 (交给调用方的值, 写入轨迹的值)"""
+        if isinstance(value, _PRIMITIVES):
+            return value, value
+        if isinstance(value, bytes):
+            return value, _encode_bytes(value)
+        if isinstance(value, (list, tuple)):
+            pairs = [self._wrap(v) for v in value]
+            kind = "list" if isinstance(value, list) else "tuple"
+            return type(value)(p[0] for p in pairs), {kind: [p[1] for p in pairs]}
+        if isinstance(value, dict) and all(isinstance(k, str) for k in value):
+            pairs = {k: self._wrap(v) for k, v in value.items()}
+            return {k: p[0] for k, p in pairs.items()}, {"dict": {k: p[1] for k, p in pairs.items()}}
+        if isinstance(value, type) and id(value) in self._classes:
+            proxy = self._classes[id(value)]
+            return proxy, {"ref": proxy._oid, "type": value.__name__}
+        with self._lock:
+            oid = self._next_oid
+            self._next_oid += 1
+        proxy = _RecordingProxy(self, oid, value)
+        if isinstance(value, type):
+            self._classes[id(value)] = proxy
+        return proxy, {"ref": oid, "type": type(value).__name__}
+
+    @staticmethod
+    def _unwrap(value):
+        if isinstance(value, _RecordingProxy):
+            return value._target
+        if isinstance(value, (list, tuple)) and any(isinstance(v, _RecordingProxy) for v in value):
+            return type(value)(Recorder._unwrap(v) for v in value)
+        return value
+
+    def _write(self, obj, op: str, name: str, args, kwargs, result, latency: float) -> None:
+        with self._lock:
+            if self._file is None:
+                return
+            self._seq += 1
+            record = {"seq": self._seq, "t": round(time.perf_counter() - self._start, 6), "obj": obj, "op": op,
+                      "name": name, "args": args, "kwargs": kwargs, "result": result, "latency": round(latency, 6),
+                      "thread": threading.current_thread().name}
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _on_span(self, path: str, start: float, seconds: float, thread: str) -> None:
+        if "/" in path:
+            return
+        with self._lock:
+            if self._file is not None and self._last_seq.get(thread) != self._seq:
+                self._last_seq[thread] = self._seq
+                self._file.write(json.dumps({"span": path, "thread": thread, "end": self._seq}, ensure_ascii=False) + "\n")
+
+    def _get(self, proxy: _RecordingProxy, name: str):
+        start = time.perf_counter()
+        try:
+            value = getattr(proxy._target, name)
+        except Exception as e:
+            self._write(proxy._oid, "get", name, [], {}, {"error": type(e).__name__, "message": str(e)},
+                        time.perf_counter() - start)
+            raise
+        if inspect.isroutine(value):
+            # 方法只在调用时记录一次
+            return lambda *args, **kwargs: self._call(proxy._oid, name, value, args, kwargs)
+        latency = time.perf_counter() - start
+        wrapped, encoded = self._wrap(value)
+        self._write(proxy._oid, "get", name, [], {}, encoded, latency)
+        return wrapped
+
+    def _call(self, oid, name: str, func, args, kwargs):
+        encoded_args = [_encode_arg(a) for a in args]
+        encoded_kwargs = {k: _encode_arg(v) for k, v in kwargs.items()}
+        args = [self._unwrap(a) for a in args]
+        kwargs = {k: self._unwrap(v) for k, v in kwargs.items()}
+        start = time.perf_counter()
+        try:
+            value = func(*args, **kwargs)
+        except Exception as e:
+            self._write(oid, "call", name, encoded_args, encoded_kwargs,
+                        {"error": type(e).__name__, "message": str(e)}, time.perf_counter() - start)
+            raise
+        latency = time.perf_counter() - start
+        wrapped, encoded = self._wrap(value)
+        self._write(oid, "call", name, encoded_args, encoded_kwargs, encoded, latency)
+        return wrapped
+
+
+class _ReplayProxy:
+    """按轨迹返回属性和调用结果的对象"""
+    __slots__ = ("_replayer", "_oid")
+
+    def __init__(self, replayer: "Replayer", oid):
+        object.__setattr__(self, "_replayer", replayer)
+        object.__setattr__(self, "_oid", oid)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._replayer._get(self._oid, name)
+
+    def __setattr__(self, name, value):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return self._replayer._call(self._oid, "__call__", args, kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __repr__(self):
+        return f"<replayed {self._oid}>"
+
+
+# 录制开始前就已经用到、回放时不需要结果的属性
+_REPLAY_DEFAULTS = {
+    ("auto", "UIAutomationInitializerInThread"): contextlib.nullcontext,
+}
+
+
+class Replayer:
+    def __init__(self, path: str, scale: float = 1.0, operation: str = None, occurrence: int = 0):
+        """
+        Args:
+            path: 轨迹文件路径
+            scale: 等待时间为录制耗时乘以 scale，0 代表不等待
+            operation: 只回放某次操作（例如 "get_dialogs"）发起的调用，为空时回放整个轨迹
+            occurrence: 该操作的第几次调用，从 0 开始
+        """
+        self.scale = scale
+        self.events: List[Dict] = []
+        # 最外层操作结束的位置：(操作名, 线程名, 最后一条调用的序号)
+        self.spans: List[Tuple[str, str, int]] = []
+        # 键 -> [(结果, 耗时), ...]
+        self._results: Dict[str, deque] = defaultdict(deque)
+        # 对象 -> 录制中调用过的方法名
+        self._methods: Dict[object, set] = defaultdict(set)
+        self._proxies: Dict[object, _ReplayProxy] = {}
+        self._patched = []
+        self._lock = threading.Lock()
+        self.served = 0
+        self.missed = Counter()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if "seq" in record:
+                    self.events.append(record)
+                elif "span" in record:
+                    self.spans.append((record["span"], record["thread"], record["end"]))
+
+        for record in self._select(operation, occurrence):
+            key = _key(record["obj"], record["op"], record["name"], record["args"], record["kwargs"])
+            self._results[key].append((record["result"], record["latency"]))
+            if record["op"] == "call":
+                self._methods[record["obj"]].add(record["name"])
+
+    def _select(self, operation: str, occurrence: int) -> List[Dict]:
+        """某次操作在它的线程中发起的调用：从该线程上一次操作结束之后，到这次操作结束为止"""
+        if operation is None:
+            return self.events
+        found = [i for i, span in enumerate(self.spans) if span[0] == operation]
+        if occurrence >= len(found):
+            raise LookupError(f"轨迹中没有第 {occurrence + 1} 次 {operation}")
+        name, thread, end = self.spans[found[occurrence]]
+        start = max((s[2] for s in self.spans[:found[occurrence]] if s[1] == thread), default=0)
+        return [r for r in self.events if start < r["seq"] <= end and r["thread"] == thread]
+
+    def recorded_path(self):
+        """录制时打开微信使用的路径，没有录制到时返回 None"""
+        popen = None
+        for record in self.events:
+            if record["obj"] == "subprocess" and record["name"] == "Popen" and isinstance(record["result"], dict):
+                popen = record["result"].get("ref")
+            elif popen is not None and record["obj"] == popen and record["args"]:
+                return record["args"][0]
+        return None
+
+    def install(self) -> None:
+        """替换 uiautomation、win32clipboard 等模块，可以在导入 ui_auto_wechat 之前调用"""
+        import importlib
+
+        for name, oid in (("uiautomation", "auto"), ("win32clipboard", "win32clipboard")):
+            self._patched.append((sys.modules, name, sys.modules.get(name)))
+            sys.modules[name] = self._proxy(oid)
+        for module_name, attr in TARGETS:
+            module = importlib.import_module(module_name)
+            self._patched.append((module, attr, getattr(module, attr)))
+            setattr(module, attr, self._proxy(attr))
+
+    def uninstall(self) -> None:
+        for target, attr, original in reversed(self._patched):
+            if target is not sys.modules:
+                setattr(target, attr, original)
+            elif original is None:
+                sys.modules.pop(attr, None)
+            else:
+                sys.modules[attr] = original
+        self._patched = []
+
+    def _proxy(self, oid) -> _ReplayProxy:
+        proxy = self._proxies.get(oid)
+        if proxy is None:
+            proxy = self._proxies[oid] = _ReplayProxy(self, oid)
+        return proxy
+
+    def _decode(self, value):
+        if not isinstance(value, dict):
+            return value
+        if "ref" in value:
+            return self._proxy(value["ref"])
+        if "list" in value:
+            return [self._decode(v) for v in value["list"]]
+        if "tuple" in value:
+            return tuple(self._decode(v) for v in value["tuple"])
+        if "dict" in value:
+            return {k: self._decode(v) for k, v in value["dict"].items()}
+        if "bytes" in value:
+            return base64.b64decode(value["bytes"])
+        if "error" in value:
+            error = getattr(builtins, value["error"], None)
+            if not (isinstance(error, type) and issubclass(error, Exception)):
+                error = RuntimeError
+            raise error(value["message"])
+        return value
+
+    def _serve(self, key: str, description: str):
+        with self._lock:
+            results = self._results.get(key)
+            if not results:
+                self.missed[description] += 1
+                raise LookupError(f"轨迹中没有记录：{description}")
+            # 同一个键按录制的顺序返回，最后一次的结果一直保留
+            result, latency = results.popleft() if len(results) > 1 else results[0]
+            self.served += 1
+        if self.scale > 0 and latency > 0:
+            time.sleep(latency * self.scale)
+        return self._decode(result)
+
+    def _get(self, oid, name: str):
+        key = _key(oid, "get", name, [], {})
+        if key in self._results:
+            return self._serve(key, f"{oid}.{name}")
+        if name in self._methods.get(oid, ()):
+            return lambda *args, **kwargs: self._call(oid, name, args, kwargs)
+        if (oid, name) in _REPLAY_DEFAULTS:
+            return _REPLAY_DEFAULTS[(oid, name)]
+        if isinstance(oid, str):
+            # 模块上的属性（例如只在类型标注中用到的控件类），用到时才报错
+            return self._proxy(f"{oid}.{name}")
+        self.missed[f"{oid}.{name}"] += 1
+        raise LookupError(f"轨迹中没有记录：{oid}.{name}")
+
+    def _call(self, oid, name: str, args, kwargs):
+        encoded_args = [_encode_arg(a) for a in args]
+        encoded_kwargs = {k: _encode_arg(v) for k, v in kwargs.items()}
+        key = _key(oid, "call", name, encoded_args, encoded_kwargs)
+        return self._serve(key, f"{oid}.{name}({', '.join(map(str, encoded_args))})")
+
+
+def replay_main(argv=None):
+    parser = argparse.ArgumentParser(description="回放界面调用轨迹，在没有微信的环境中运行 WeChat 的操作")
+    parser.add_argument("command", choices=["replay"])
+    parser.add_argument("trace", help="Recorder 录制的轨迹文件")
+    parser.add_argument("method", help="要运行的 WeChat 方法，例如 get_dialogs")
+    parser.add_argument("args", nargs="*", help="方法的参数，数字按整数传入")
+    parser.add_argument("--scale", type=float, default=1.0, help="等待时间为录制耗时乘以 scale，0 代表不等待")
+    parser.add_argument("--occurrence", type=int, default=0, help="回放录制中该方法的第几次调用，从 0 开始")
+    parser.add_argument("--whole", action="store_true", help="使用整个轨迹，而不只是该方法那一次调用的部分")
+    parser.add_argument("--path", default=None, help="WeChat 的路径，默认使用录制时打开微信的路径")
+    args = parser.parse_args(argv)
+
+    replayer = Replayer(args.trace, scale=args.scale, operation=None if args.whole else args.method,
+                        occurrence=args.occurrence)
+    replayer.install()
+    from ui_auto_wechat import WeChat
+
+    wechat = WeChat(args.path or replayer.recorded_path() or "WeChat.exe")
+    method_args = [int(a) if a.lstrip("-").isdigit() else a for a in args.args]
+    start = time.perf_counter()
+    error = None
+    try:
+        result = getattr(wechat, args.method)(*method_args)
+    except LookupError as e:
+        result, error = None, e
+    seconds = time.perf_counter() - start
+
+    if result is not None:
+        print(f"result: {len(result) if hasattr(result, '__len__') else result!r}")
+    if error is not None:
+        print(f"error: {error}")
+    counters = metrics.snapshot()["counters"]
+    print(f"{args.method} took {seconds:.3f}s, served {replayer.served} recorded calls, "
+          f"missed {sum(replayer.missed.values())}, "
+          f"uia_searches {sum(counters.get('uia_searches', {}).values()):.0f}, "
+          f"sleep_seconds {sum(counters.get('sleep_seconds', {}).values()):.3f}")
+    for description, n in replayer.missed.most_common(10):
+        print(f"  missed {n}x {description}")
+    return 1 if error is not None else 0
+
+
+if __name__ == "__main__":
+    sys.exit(replay_main())
@@ -4,7 +4,6 @@
 import sys
 import os
 import time
-import json
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QLabel, QLineEdit, QTextEdit, QPushButton, QComboBox, 
                              QCheckBox, QFileDialog, QMessageBox, QTabWidget, QGroupBox,
@@ -15,13 +14,27 @@ from PyQt5.QtGui import QFont, QIcon, QPalette, QColor
 
 from ui_auto_wechat import WeChat
 from flask_server import WeChatFlaskServer
+from actuator import UIActuator
+from profiler import Profiler
+from pacing import AdaptivePacer
+from name_index import NameIndex, FuzzyNameIndex
+from message_template import MessageTemplate, PreRenderer, TABLE_EXTENSIONS, iter_recipients
+from module import NameListView, NameComboBox
 
 
 class WeChatAutomationThread(QThread):
     """微信自动化工作线程"""
     progress_updated = pyqtSignal(int)
     status_updated = pyqtSignal(str)
-    finished_signal = pyqtSignal(bool, str)
+    # (是否成功, 结果)，结果直接传递 Python 对象（文本内容、提示信息等），不经过 JSON 序列化
+    finished_signal = pyqtSignal(bool, object)
+    # 分块加载的结果：(类型, 列表)
+    chunk_ready = pyqtSignal(str, object)
+    # 自适应发送的速率：(目标速率, 最近一分钟的实际速率)，单位为条/分钟
+    rate_updated = pyqtSignal(float, float)
+    
+    # 两次发送分块之间的最短间隔（秒），避免每次滚动都刷新界面
+    CHUNK_INTERVAL = 0.2
     
     def __init__(self, wechat_instance, operation_type, **kwargs):
         super().__init__()
@@ -29,23 +42,31 @@ class WeChatAutomationThread(QThread):
         self.operation_type = operation_type
         self.kwargs = kwargs
         self.running = True
+        # 搜索结果与接收人不一致而跳过的接收人
+        self.skipped = []
+        # 自适应发送节奏，为空时按固定的 interval 发送
+        self.pacer = kwargs.get('pacer')
+        self.last_latency = 0.0
     
     def run(self):
         try:
+            result = None
             if self.operation_type == "send_msg":
-                self.send_messages()
+                result = self.send_messages()
             elif self.operation_type == "send_at_msg":
-                self.send_at_messages()
+                result = self.send_at_messages()
+            elif self.operation_type == "send_template":
+                result = self.send_template_messages()
             elif self.operation_type == "load_contacts":
                 self.load_contacts()
             elif self.operation_type == "load_groups":
                 self.load_groups()
             elif self.operation_type == "load_txt":
-                self.load_txt_content()
+                result = self.load_txt_content()
             elif self.operation_type == "load_users_txt":
-                self.load_users_txt()
+                result = self.load_users_txt()
             
-            self.finished_signal.emit(True, "操作完成")
+            self.finished_signal.emit(True, "操作完成" if result is None else result)
             
         except Exception as e:
             self.finished_signal.emit(False, str(e))
@@ -53,11 +74,42 @@ class WeChatAutomationThread(QThread):
     def stop(self):
         self.running = False
     
+    def _send_one(self, name, at_names, message):
+        """发送一条消息，搜索后打开的聊天不是要找的人时跳过该接收人而不是中止整个批次"""
+        start = time.perf_counter()
+        future = self.wechat.submit("send_msg", name, at_names, message)
+        try:
+            confirmed = future.result()
+        except LookupError as e:
+            self.skipped.append(name)
+            self.status_updated.emit(str(e))
+            return
+        # 两次发送的间隔按实际经过的时间计算，速率只根据发送本身的耗时调整，
+        # 排在 HTTP 请求等其他操作后面等待的时间不算作微信变慢
+        self.last_latency = time.perf_counter() - start
+        if self.pacer is not None:
+            self.pacer.record(future.run_seconds, bool(confirmed))
+            self.rate_updated.emit(self.pacer.rate, self.pacer.observed_rate())
+    
+    def _pause(self):
+        """两次发送之间的等待，停止操作时立即结束"""
+        if self.pacer is not None:
+            seconds = self.pacer.delay(self.last_latency)
+        else:
+            seconds = self.kwargs.get('interval', 1)
+        deadline = time.time() + seconds
+        while self.running and time.time() < deadline:
+            time.sleep(min(0.1, deadline - time.time()))
+    
+    def _send_summary(self):
+        if not self.skipped:
+            return None
+        return f"操作完成，{len(self.skipped)} 个接收人未找到，已跳过：{'、'.join(self.skipped[:20])}"
+    
     def send_messages(self):
         """发送普通消息"""
         recipients = self.kwargs.get('recipients', [])
         message = self.kwargs.get('message', '')
-        interval = self.kwargs.get('interval', 1)
         
         total = len(recipients)
         for i, recipient in enumerate(recipients):
@@ -65,20 +117,20 @@ class WeChatAutomationThread(QThread):
                 break
             
             self.status_updated.emit(f"正在发送给 {recipient}...")
-            self.wechat.send_msg(recipient, [], message)
+            self._send_one(recipient, [], message)
             
             progress = int((i + 1) / total * 100)
             self.progress_updated.emit(progress)
             
             if i < total - 1:
-                time.sleep(interval)
+                self._pause()
+        return self._send_summary()
     
     def send_at_messages(self):
         """发送@消息"""
         recipients = self.kwargs.get('recipients', [])
         groups = self.kwargs.get('groups', [])
         message = self.kwargs.get('message', '')
-        interval = self.kwargs.get('interval', 1)
         
         total = len(recipients) * len(groups)
         count = 0
@@ -89,26 +141,66 @@ class WeChatAutomationThread(QThread):
                     break
                 
                 self.status_updated.emit(f"正在 {group} 中@ {recipient}...")
-                self.wechat.send_msg(group, [recipient], message)
+                self._send_one(group, [recipient], message)
                 
                 count += 1
                 progress = int(count / total * 100)
                 self.progress_updated.emit(progress)
                 
                 if count < total:
-                    time.sleep(interval)
+                    self._pause()
+        return self._send_summary()
+    
+    def send_template_messages(self):
+        """按模板为每个接收人渲染消息并发送，渲染在后台线程中提前完成"""
+        template = self.kwargs['template']
+        rows = self.kwargs['rows']
+        # 接收人从文件逐行读取时总数可能未知，此时不更新进度
+        total = self.kwargs.get('total', 0)
+        
+        renderer = PreRenderer(template, rows)
+        for i, (recipient, message) in enumerate(renderer):
+            if not self.running:
+                break
+            if i > 0:
+                self._pause()
+            
+            self.status_updated.emit(f"正在发送给 {recipient}...")
+            self._send_one(recipient, [], message)
+            
+            if total:
+                self.progress_updated.emit(min(int((i + 1) / total * 100), 100))
+        return self._send_summary()
+    
+    def _chunk_emitter(self, kind):
+        """返回一个缓冲函数，攒够一段时间的结果后再发送到界面线程"""
+        pending = []
+        last_emit = [0.0]
+        
+        def emit(items, flush=False):
+            pending.extend(items)
+            now = time.time()
+            if pending and (flush or now - last_emit[0] >= self.CHUNK_INTERVAL):
+                self.chunk_ready.emit(kind, pending[:])
+                pending.clear()
+                last_emit[0] = now
+        
+        return emit
     
     def load_contacts(self):
-        """加载联系人"""
+        """加载联系人，读取的同时分块发送到界面（名称以及作为别名的备注）"""
         self.status_updated.emit("正在加载联系人...")
-        contacts = self.wechat.get_all_contacts()
-        self.finished_signal.emit(True, json.dumps(contacts, ensure_ascii=False))
+        emit = self._chunk_emitter("contacts")
+        self.wechat.find_all_contacts(
+            as_dataframe=False, on_batch=lambda batch: emit([(c["昵称"], [c["备注"]]) for c in batch]))
+        emit([], flush=True)
     
     def load_groups(self):
-        """加载群聊"""
+        """加载群聊，读取的同时分块发送到界面"""
         self.status_updated.emit("正在加载群聊...")
-        groups = self.wechat.get_all_groups()
-        self.finished_signal.emit(True, json.dumps(groups, ensure_ascii=False))
+        emit = self._chunk_emitter("groups")
+        self.wechat.find_all_groups(on_batch=emit)
+        emit([], flush=True)
     
     def load_txt_content(self):
         """加载TXT内容"""
@@ -116,29 +208,78 @@ class WeChatAutomationThread(QThread):
         self.status_updated.emit("正在加载TXT文件...")
         
         with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        self.finished_signal.emit(True, content)
+            return f.read()
     
     def load_users_txt(self):
-        """加载用户列表TXT"""
+        """逐行读取用户列表TXT，分块发送到界面，并按读取的字节数更新进度"""
         file_path = self.kwargs.get('file_path', '')
         self.status_updated.emit("正在加载用户列表...")
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            users = [line.strip() for line in f if line.strip()]
+        # CSV / XLSX 只读取接收人一列用于显示，其余字段在发送时再逐行读取
+        if os.path.splitext(file_path)[1].lower() in TABLE_EXTENSIONS:
+            emit = self._chunk_emitter("users")
+            count = 0
+            for row in iter_recipients(file_path):
+                if not self.running:
+                    break
+                count += 1
+                emit([row["name"]])
+            emit([], flush=True)
+            return f"已加载 {count} 个用户"
         
-        self.finished_signal.emit(True, json.dumps(users, ensure_ascii=False))
+        total = max(os.path.getsize(file_path), 1)
+        emit = self._chunk_emitter("users")
+        read = 0
+        count = 0
+        progress = 0
+        batch = []
+        # 以二进制读取才能按字节统计进度，文本模式迭代时不能调用 tell()
+        with open(file_path, 'rb') as f:
+            for raw in f:
+                if not self.running:
+                    break
+                read += len(raw)
+                # utf-8-sig 去掉记事本保存时文件开头的 BOM
+                user = raw.decode('utf-8-sig').strip()
+                if user:
+                    batch.append(user)
+                if len(batch) >= 1000:
+                    count += len(batch)
+                    emit(batch)
+                    batch = []
+                    if read * 100 // total > progress:
+                        progress = read * 100 // total
+                        self.progress_updated.emit(progress)
+        count += len(batch)
+        emit(batch, flush=True)
+        return f"已加载 {count} 个用户"
 
 
 class WeChatGUI(QMainWindow):
+    # 健康检查线程发出的状态变化 (是否正常, 原因)
+    health_changed = pyqtSignal(bool, str)
+
     def __init__(self):
         super().__init__()
         self.wechat = None
         self.http_server = None
+        # 唯一执行界面操作的线程，图形界面和HTTP服务的操作都在这里排队执行
+        self.actuator = None
+        # 正在进行的性能分析，可以在批量操作进行中开始和结束
+        self.profiler = None
         self.settings = QSettings('EasyChat', 'WeChatGUI')
         self.current_thread = None
         
+        # 联系人和群聊的名称索引，由管理页的列表和各个下拉框共用
+        self.contacts_index = NameIndex()
+        self.groups_index = NameIndex()
+        # 批量发送的用户列表，可能有几十万行，同样按块追加
+        self.users_index = NameIndex()
+        # 用户列表来自的文件
+        self.users_source = ""
+        # 联系人（昵称和备注）与群聊的模糊索引，发送前用来确认接收人是否存在
+        self.directory = FuzzyNameIndex()
+        
         self.init_ui()
         self.load_settings()
         
@@ -211,12 +352,25 @@ class WeChatGUI(QMainWindow):
         conn_layout.addWidget(self.disconnect_btn)
         left_layout.addLayout(conn_layout)
         
+        # 防掉线只在没有任何界面操作一段时间后执行，不会插入批量发送中
+        self.keep_alive_check = QCheckBox("空闲时防止掉线")
+        self.keep_alive_check.toggled.connect(self.update_keep_alive)
+        left_layout.addWidget(self.keep_alive_check)
+        self.health_changed.connect(self.on_health_changed)
+        
         # 操作间隔设置
         interval_group = QGroupBox("操作间隔设置")
         interval_layout = QVBoxLayout(interval_group)
         
+        # 自适应速率：发送确认成功时逐步加快，失败或微信响应变慢时减半
+        self.adaptive_check = QCheckBox("自适应发送速率")
+        self.adaptive_check.setChecked(True)
+        self.adaptive_check.toggled.connect(self.update_interval_label)
+        interval_layout.addWidget(self.adaptive_check)
+        
         interval_h_layout = QHBoxLayout()
-        interval_h_layout.addWidget(QLabel("发送间隔(秒):"))
+        self.interval_label = QLabel("初始间隔(秒):")
+        interval_h_layout.addWidget(self.interval_label)
         self.interval_spin = QDoubleSpinBox()
         self.interval_spin.setRange(0.1, 10.0)
         self.interval_spin.setSingleStep(0.1)
@@ -224,6 +378,9 @@ class WeChatGUI(QMainWindow):
         interval_h_layout.addWidget(self.interval_spin)
         interval_layout.addLayout(interval_h_layout)
         
+        self.rate_label = QLabel("当前速率：-")
+        interval_layout.addWidget(self.rate_label)
+        
         left_layout.addWidget(interval_group)
         
         # 进度条
@@ -243,6 +400,18 @@ class WeChatGUI(QMainWindow):
         self.stop_btn.setEnabled(False)
         left_layout.addWidget(self.stop_btn)
         
+        # 性能分析开关
+        profile_layout = QHBoxLayout()
+        self.profile_mode_combo = QComboBox()
+        self.profile_mode_combo.addItem("采样", "sample")
+        self.profile_mode_combo.addItem("cProfile", "cprofile")
+        profile_layout.addWidget(self.profile_mode_combo)
+        self.profile_btn = QPushButton("开始性能分析")
+        self.profile_btn.setCheckable(True)
+        self.profile_btn.toggled.connect(self.toggle_profiling)
+        profile_layout.addWidget(self.profile_btn)
+        left_layout.addLayout(profile_layout)
+        
         left_layout.addStretch(1)
         main_layout.addWidget(left_panel, 1)
         
@@ -275,8 +444,7 @@ class WeChatGUI(QMainWindow):
         # 常用联系人
         contacts_layout = QHBoxLayout()
         contacts_layout.addWidget(QLabel("常用联系人:"))
-        self.contacts_combo = QComboBox()
-        self.contacts_combo.setEditable(True)
+        self.contacts_combo = NameComboBox(self.contacts_index)
         self.load_contacts_btn = QPushButton("加载联系人")
         self.load_contacts_btn.clicked.connect(self.load_contacts)
         contacts_layout.addWidget(self.contacts_combo)
@@ -330,8 +498,7 @@ class WeChatGUI(QMainWindow):
         # 常用群聊
         groups_layout = QHBoxLayout()
         groups_layout.addWidget(QLabel("常用群聊:"))
-        self.groups_combo = QComboBox()
-        self.groups_combo.setEditable(True)
+        self.groups_combo = NameComboBox(self.groups_index)
         self.load_groups_btn = QPushButton("加载群聊")
         self.load_groups_btn.clicked.connect(self.load_groups)
         groups_layout.addWidget(self.groups_combo)
@@ -382,7 +549,7 @@ class WeChatGUI(QMainWindow):
         # 用户列表文件
         users_layout = QHBoxLayout()
         self.users_file_path = QLineEdit()
-        self.users_file_path.setPlaceholderText("选择用户列表文件（TXT格式，每行一个用户）")
+        self.users_file_path.setPlaceholderText("选择用户列表文件（TXT格式每行一个用户；CSV/XLSX格式第一列为用户，其余列可在消息中用{列名}引用）")
         users_layout.addWidget(self.users_file_path)
         users_browse_btn = QPushButton("浏览")
         users_browse_btn.clicked.connect(lambda: self.browse_file("users"))
@@ -396,7 +563,7 @@ class WeChatGUI(QMainWindow):
         # 消息内容文件
         content_layout = QHBoxLayout()
         self.content_file_path = QLineEdit()
-        self.content_file_path.setPlaceholderText("选择消息内容文件（TXT格式）")
+        self.content_file_path.setPlaceholderText("选择消息内容文件（TXT格式，可以用{name}等字段个性化）")
         content_layout.addWidget(self.content_file_path)
         content_browse_btn = QPushButton("浏览")
         content_browse_btn.clicked.connect(lambda: self.browse_file("content"))
@@ -416,8 +583,7 @@ class WeChatGUI(QMainWindow):
         # 用户列表预览
         users_preview_layout = QVBoxLayout()
         users_preview_layout.addWidget(QLabel("用户列表:"))
-        self.users_preview = QTextEdit()
-        self.users_preview.setMaximumHeight(100)
+        self.users_preview = NameListView(self.users_index, placeholder="按用户名过滤")
         users_preview_layout.addWidget(self.users_preview)
         preview_layout.addLayout(users_preview_layout)
         
@@ -448,8 +614,7 @@ class WeChatGUI(QMainWindow):
         contacts_group = QGroupBox("联系人管理")
         contacts_layout = QVBoxLayout(contacts_group)
         
-        self.contacts_display = QTextEdit()
-        self.contacts_display.setMaximumHeight(150)
+        self.contacts_display = NameListView(self.contacts_index)
         contacts_layout.addWidget(self.contacts_display)
         
         contacts_btn_layout = QHBoxLayout()
@@ -467,8 +632,7 @@ class WeChatGUI(QMainWindow):
         groups_group = QGroupBox("群聊管理")
         groups_layout = QVBoxLayout(groups_group)
         
-        self.groups_display = QTextEdit()
-        self.groups_display.setMaximumHeight(150)
+        self.groups_display = NameListView(self.groups_index)
         groups_layout.addWidget(self.groups_display)
         
         groups_btn_layout = QHBoxLayout()
@@ -482,7 +646,6 @@ class WeChatGUI(QMainWindow):
         
         layout.addWidget(groups_group)
         
-        layout.addStretch(1)
         self.tabs.addTab(manage_widget, "管理")
     
     def create_http_tab(self):
@@ -622,9 +785,18 @@ class WeChatGUI(QMainWindow):
                 QMessageBox.critical(self, "路径错误", f"微信程序路径不存在：{wechat_path}")
                 return
             
-            # 创建WeChat实例
-            self.wechat = WeChat(wechat_path)
-            self.http_server = WeChatFlaskServer(self.wechat)
+            # 创建WeChat实例，图形界面和HTTP服务通过同一个 actuator 轮流操作微信
+            wechat = WeChat(wechat_path)
+            self.actuator = UIActuator()
+            self.actuator.start()
+            self.wechat = self.actuator.bind(wechat, "gui")
+            # 确认搜索结果时把备注也当作联系人的名称，读取到联系人或群聊之后才开启确认（见 append_chunk）
+            self.wechat.directory = self.directory
+            self.wechat.verify_contact = len(self.directory) > 0
+            self.http_server = WeChatFlaskServer(wechat, actuator=self.actuator)
+            # 微信卡死、关闭或退出登录时暂停队列并提醒，恢复后继续执行
+            self.http_server.start_watchdog(keepalive_interval=self.keep_alive_interval(),
+                                            on_change=self.health_changed.emit)
             
             self.wechat.open_wechat()
             self.connection_status.setText("微信状态：已连接")
@@ -639,6 +811,13 @@ class WeChatGUI(QMainWindow):
         """断开微信连接"""
         try:
             # 清理WeChat实例
+            if self.profiler is not None:
+                self.profile_btn.setChecked(False)
+            if self.http_server is not None:
+                self.http_server.stop()
+            if self.actuator is not None:
+                self.actuator.stop()
+                self.actuator = None
             self.wechat = None
             self.http_server = None
             
@@ -671,10 +850,15 @@ class WeChatGUI(QMainWindow):
             return
         
         recipients = [r.strip() for r in recipients_text.split(",") if r.strip()]
-        interval = self.interval_spin.value()
+        rejected = self.check_recipients(recipients)
+        if rejected is None:
+            return
+        recipients = [r for r in recipients if r not in rejected]
+        if not recipients:
+            return
         
         self.start_operation("send_msg", "正在发送消息...", 
-                           recipients=recipients, message=message, interval=interval)
+                           recipients=recipients, message=message, **self.pacing_options())
     
     def send_at_message(self):
         """发送@消息"""
@@ -695,29 +879,79 @@ class WeChatGUI(QMainWindow):
         
         groups = [g.strip() for g in groups_text.splitlines() if g.strip()]
         recipients = [r.strip() for r in at_text.splitlines() if r.strip()]
-        interval = self.interval_spin.value()
+        rejected = self.check_recipients(groups)
+        if rejected is None:
+            return
+        groups = [g for g in groups if g not in rejected]
+        if not groups:
+            return
         
         self.start_operation("send_at_msg", "正在发送@消息...",
-                           recipients=recipients, groups=groups, message=message, interval=interval)
+                           recipients=recipients, groups=groups, message=message,
+                           **self.pacing_options())
     
     def batch_send(self):
         """批量发送"""
-        users_text = self.users_preview.toPlainText().strip()
         content_text = self.content_preview.toPlainText().strip()
         
-        if not users_text or not content_text:
+        if not len(self.users_index) or not content_text:
             QMessageBox.warning(self, "输入错误", "请先加载用户列表和消息内容")
             return
         
-        users = [u.strip() for u in users_text.splitlines() if u.strip()]
-        interval = self.interval_spin.value()
+        # 模板只解析一次，发送时由工作线程为每个接收人渲染
+        try:
+            template = MessageTemplate(content_text)
+        except ValueError as e:
+            QMessageBox.warning(self, "模板错误", str(e))
+            return
         
-        self.start_operation("send_msg", "正在批量发送消息...",
-                           recipients=users, message=content_text, interval=interval)
+        rejected = self.check_recipients(self.users_index.names)
+        if rejected is None:
+            return
+        
+        if os.path.splitext(self.users_source)[1].lower() in TABLE_EXTENSIONS:
+            # 表格中的字段在发送时重新逐行读取，不保存在内存中
+            rows = iter_recipients(self.users_source)
+        else:
+            # 重新加载时索引会换成新的列表，工作线程持有的列表不会被修改，不需要复制
+            rows = ({"name": user} for user in self.users_index.names)
+        if rejected:
+            rows = (row for row in rows if row["name"] not in rejected)
+        
+        self.start_operation("send_template", "正在批量发送消息...",
+                           template=template, rows=rows, total=len(self.users_index),
+                           **self.pacing_options())
+    
+    def check_recipients(self, names):
+        """
+        发送前用已加载的通讯录一次性检查所有接收人，不操作微信
+        Return:
+            需要跳过的接收人集合；用户取消发送时返回 None。没有加载通讯录时不检查
+        """
+        if not len(self.directory):
+            return set()
+        
+        _, rejected = self.directory.validate(names)
+        if not rejected:
+            return set()
+        
+        lines = []
+        for name, candidates in list(rejected.items())[:20]:
+            hint = f"（可能是：{'、'.join(candidates[:3])}）" if candidates else ""
+            lines.append(f"{name}{hint}")
+        if len(rejected) > 20:
+            lines.append(f"... 共 {len(rejected)} 个")
+        reply = QMessageBox.question(
+            self, "接收人确认", "以下接收人在通讯录中不存在或不唯一，是否跳过它们继续发送？\n\n" + "\n".join(lines),
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return None
+        return set(rejected)
     
     def browse_file(self, file_type):
         """浏览文件"""
-        file_path, _ = QFileDialog.getOpenFileName(self, "选择文件", "", "Text Files (*.txt)")
+        file_filter = "User Lists (*.txt *.csv *.xlsx)" if file_type == "users" else "Text Files (*.txt)"
+        file_path, _ = QFileDialog.getOpenFileName(self, "选择文件", "", file_filter)
         if file_path:
             if file_type == "users":
                 self.users_file_path.setText(file_path)
@@ -737,9 +971,10 @@ class WeChatGUI(QMainWindow):
         """加载用户列表TXT"""
         file_path = self.users_file_path.text().strip()
         if not file_path or not os.path.exists(file_path):
-            QMessageBox.warning(self, "文件错误", "请选择有效的TXT文件")
+            QMessageBox.warning(self, "文件错误", "请选择有效的TXT、CSV或XLSX文件")
             return
         
+        self.users_source = file_path
         self.start_operation("load_users_txt", "正在加载用户列表...", file_path=file_path)
     
     def refresh_contacts(self):
@@ -751,9 +986,12 @@ class WeChatGUI(QMainWindow):
         self.start_operation("load_groups", "正在刷新群聊...")
     
     def export_contacts(self):
-        """导出联系人"""
+        """导出已加载的联系人"""
+        if not len(self.contacts_index):
+            QMessageBox.warning(self, "导出失败", "请先加载联系人")
+            return
         try:
-            contacts = self.wechat.get_all_contacts()
+            contacts = self.contacts_index.names
             file_path, _ = QFileDialog.getSaveFileName(self, "保存联系人", "contacts.txt", "Text Files (*.txt)")
             if file_path:
                 with open(file_path, 'w', encoding='utf-8') as f:
@@ -764,9 +1002,12 @@ class WeChatGUI(QMainWindow):
             QMessageBox.critical(self, "导出失败", f"导出联系人失败：{str(e)}")
     
     def export_groups(self):
-        """导出群聊"""
+        """导出已加载的群聊"""
+        if not len(self.groups_index):
+            QMessageBox.warning(self, "导出失败", "请先加载群聊")
+            return
         try:
-            groups = self.wechat.get_all_groups()
+            groups = self.groups_index.names
             file_path, _ = QFileDialog.getSaveFileName(self, "保存群聊", "groups.txt", "Text Files (*.txt)")
             if file_path:
                 with open(file_path, 'w', encoding='utf-8') as f:
@@ -776,6 +1017,44 @@ class WeChatGUI(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "导出失败", f"导出群聊失败：{str(e)}")
     
+    def toggle_profiling(self, checked):
+        """开始或结束性能分析，结束时保存结果"""
+        if checked:
+            if self.actuator is None:
+                QMessageBox.warning(self, "未连接", "请先连接微信")
+                self.profile_btn.setChecked(False)
+                return
+            try:
+                self.profiler = Profiler(self.actuator, mode=self.profile_mode_combo.currentData())
+                self.profiler.start()
+            except Exception as e:
+                self.profiler = None
+                QMessageBox.critical(self, "性能分析失败", f"开始性能分析失败：{str(e)}")
+                self.profile_btn.setChecked(False)
+                return
+            self.profile_btn.setText("结束性能分析")
+            self.profile_mode_combo.setEnabled(False)
+            self.statusBar().showMessage("性能分析进行中")
+            return
+        
+        if self.profiler is None:
+            return
+        profiler, self.profiler = self.profiler, None
+        self.profile_btn.setText("开始性能分析")
+        self.profile_mode_combo.setEnabled(True)
+        try:
+            profiler.stop()
+            if profiler.mode == "cprofile":
+                default, file_filter = "easychat.pstats", "pstats (*.pstats);;Speedscope JSON (*.json)"
+            else:
+                default, file_filter = "easychat.speedscope.json", "Speedscope JSON (*.json)"
+            file_path, _ = QFileDialog.getSaveFileName(self, "保存性能分析结果", default, file_filter)
+            if file_path:
+                profiler.save(file_path)
+                self.statusBar().showMessage(f"性能分析结果已保存到 {file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "性能分析失败", f"保存性能分析结果失败：{str(e)}")
+    
     def start_operation(self, operation_type, status_text, **kwargs):
         """开始操作"""
         if not self.wechat:
@@ -790,6 +1069,16 @@ class WeChatGUI(QMainWindow):
         self.current_thread.progress_updated.connect(self.update_progress)
         self.current_thread.status_updated.connect(self.update_status)
         self.current_thread.finished_signal.connect(self.operation_finished)
+        self.current_thread.chunk_ready.connect(self.append_chunk)
+        self.current_thread.rate_updated.connect(self.update_rate)
+        
+        # 重新加载时清空之前的结果
+        if operation_type == "load_contacts":
+            self.contacts_index.clear()
+        elif operation_type == "load_groups":
+            self.groups_index.clear()
+        elif operation_type == "load_users_txt":
+            self.users_index.clear()
         
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
@@ -798,6 +1087,27 @@ class WeChatGUI(QMainWindow):
         
         self.current_thread.start()
     
+    def update_interval_label(self, adaptive):
+        """自适应时间隔只作为初始值"""
+        self.interval_label.setText("初始间隔(秒):" if adaptive else "发送间隔(秒):")
+    
+    def pacing_options(self):
+        """发送操作的节奏参数"""
+        interval = self.interval_spin.value()
+        if not self.adaptive_check.isChecked():
+            self.rate_label.setText(f"当前速率：{60 / interval:.1f} 条/分钟（固定）")
+            return {"interval": interval}
+        pacer = AdaptivePacer(initial_rate=60 / interval, max_rate=max(60.0, 60 / interval))
+        self.rate_label.setText(f"当前速率：{pacer.rate:.1f} 条/分钟")
+        return {"interval": interval, "pacer": pacer}
+    
+    def update_rate(self, rate, observed):
+        """显示自适应发送的速率"""
+        text = f"当前速率：{rate:.1f} 条/分钟"
+        if observed:
+            text += f"（实际 {observed:.1f}）"
+        self.rate_label.setText(text)
+    
     def update_progress(self, value):
         """更新进度"""
         self.progress_bar.setValue(value)
@@ -807,34 +1117,40 @@ class WeChatGUI(QMainWindow):
         self.status_label.setText(text)
         self.statusBar().showMessage(text)
     
+    def append_chunk(self, kind, names):
+        """追加工作线程发来的一批名称"""
+        index, desc = {
+            "contacts": (self.contacts_index, "联系人"),
+            "groups": (self.groups_index, "群聊"),
+            "users": (self.users_index, "用户"),
+        }[kind]
+        index.extend(names)
+        if kind in ("contacts", "groups"):
+            self.directory.extend(names)
+            # 目录为空时只能接受与搜索内容完全一致的聊天名称，备注、表情等会让发送被取消
+            if self.wechat is not None and len(self.directory):
+                self.wechat.verify_contact = True
+        self.statusBar().showMessage(f"已读取 {len(index)} 个{desc}")
+    
     def operation_finished(self, success, result):
         """操作完成"""
         self.progress_bar.setVisible(False)
         self.stop_btn.setEnabled(False)
         
         if success:
+            # 联系人和群聊已经通过 append_chunk 分块显示
             if self.current_thread.operation_type == "load_contacts":
-                contacts = json.loads(result)
-                self.contacts_display.setText('\n'.join(contacts))
-                self.contacts_combo.clear()
-                self.contacts_combo.addItems(contacts)
-                QMessageBox.information(self, "加载完成", f"已加载 {len(contacts)} 个联系人")
+                QMessageBox.information(self, "加载完成", f"已加载 {len(self.contacts_index)} 个联系人")
             
             elif self.current_thread.operation_type == "load_groups":
-                groups = json.loads(result)
-                self.groups_display.setText('\n'.join(groups))
-                self.groups_combo.clear()
-                self.groups_combo.addItems(groups)
-                QMessageBox.information(self, "加载完成", f"已加载 {len(groups)} 个群聊")
+                QMessageBox.information(self, "加载完成", f"已加载 {len(self.groups_index)} 个群聊")
             
             elif self.current_thread.operation_type == "load_txt":
                 self.content_preview.setText(result)
                 QMessageBox.information(self, "加载完成", "消息内容已加载")
             
             elif self.current_thread.operation_type == "load_users_txt":
-                users = json.loads(result)
-                self.users_preview.setText('\n'.join(users))
-                QMessageBox.information(self, "加载完成", f"已加载 {len(users)} 个用户")
+                QMessageBox.information(self, "加载完成", result)
             
             else:
                 QMessageBox.information(self, "操作完成", result)
@@ -867,9 +1183,34 @@ class WeChatGUI(QMainWindow):
         if template_name in templates:
             self.message_input.setText(templates[template_name])
     
+    def keep_alive_interval(self):
+        """防掉线的间隔（秒），None 代表不执行"""
+        return 3600 if self.keep_alive_check.isChecked() else None
+    
+    def update_keep_alive(self):
+        if self.http_server is not None and self.http_server.watchdog is not None:
+            self.http_server.watchdog.keepalive_interval = self.keep_alive_interval()
+    
+    def on_health_changed(self, healthy, reason):
+        """微信健康状态改变"""
+        if self.wechat is None:
+            return
+        if healthy:
+            self.connection_status.setText("微信状态：已连接")
+            self.connection_status.setStyleSheet("color: green; font-weight: bold;")
+            self.statusBar().showMessage("微信已恢复，继续执行排队的操作")
+        else:
+            self.connection_status.setText(f"微信状态：异常（{reason}）")
+            self.connection_status.setStyleSheet("color: orange; font-weight: bold;")
+            self.statusBar().showMessage(f"微信异常，操作已暂停：{reason}")
+            QMessageBox.warning(self, "微信异常",
+                                f"{reason}\n\n排队中的操作已暂停，微信恢复正常后会自动继续执行。")
+    
     def load_settings(self):
         """加载设置"""
         self.interval_spin.setValue(float(self.settings.value("interval", 1.0)))
+        self.adaptive_check.setChecked(str(self.settings.value("adaptive_rate", True)).lower() == "true")
+        self.keep_alive_check.setChecked(str(self.settings.value("keep_alive", False)).lower() == "true")
         
         # 加载微信路径
         saved_path = self.settings.value('wechat_path', '')
@@ -879,6 +1220,8 @@ class WeChatGUI(QMainWindow):
     def save_settings(self):
         """保存设置"""
         self.settings.setValue("interval", self.interval_spin.value())
+        self.settings.setValue("adaptive_rate", self.adaptive_check.isChecked())
+        self.settings.setValue("keep_alive", self.keep_alive_check.isChecked())
     
     def closeEvent(self, event):
         """关闭事件"""
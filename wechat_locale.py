@@ -1,9 +1,12 @@
-
-
 """
 This class defines the mapping of the WeChat UI elements to the English and Chinese names.
 这个类定义了微信程序 UI 元素到英文和中文名称的映射。
 """
+import json
+import os
+import re
+
+
 class WeChatLocale:
     MAPPING = {
         "weixin":       {"en-US": "Weixin",         "zh-CN": "微信",            "zh-TW": "微信"},
@@ -28,22 +31,156 @@ class WeChatLocale:
         "chat_history": {"en-US": "Chat History",   "zh-CN": "聊天记录",        "zh-TW": "聊天記錄"},
         "photos_n_videos":  {"en-US": "Photos & Videos", "zh-CN": "图片与视频", "zh-TW": "圖片與影片"},
         "copy":      {"en-US": "Copy",              "zh-CN": "复制",            "zh-TW": "複製"},
+        "recent_group_chats":   {"en-US": "Recent Group Chats", "zh-CN": "最近群聊", "zh-TW": "最近群聊"},
+
+        # 聊天记录中的提示文字，用于识别消息类型
+        "view_more_messages":   {"en-US": "View more messages", "zh-CN": "查看更多消息", "zh-TW": "查看更多訊息"},
+        "red_packet":   {"en-US": "Red Packet",     "zh-CN": "红包",            "zh-TW": "紅包"},
+        "recalled":     {"en-US": "recalled a message", "zh-CN": "撤回了一条消息", "zh-TW": "收回了一則訊息"},
+        "new_messages_below":   {"en-US": "Below are new messages", "zh-CN": "以下为新消息", "zh-TW": "以下為新訊息"},
     }
 
+    # keys recognized by find_marker; the strings of EXACT_MARKERS must be the whole text,
+    # the others may appear inside longer texts (e.g. "xxx recalled a message")
+    MARKERS = ["view_more_messages", "red_packet", "recalled", "new_messages_below"]
+    EXACT_MARKERS = ["view_more_messages"]
+
+    # per-install cache of detected locales, keyed by the WeChat executable path
+    CACHE_PATH = os.path.join(os.path.expanduser("~"), ".easychat", "locale_cache.json")
+
     """
     @param locale: the locale of the WeChat UI, either "en-US", "zh-CN", or "zh-TW"
     """
     def __init__(self, locale="en-US"):
-        for key, value in WeChatLocale.MAPPING.items():
-            setattr(self, key, value[locale])
+        self.locale = locale
+        self.__dict__.update(_TABLES[locale])
     
     @staticmethod
     def getSupportedLocales():
         return list(WeChatLocale.MAPPING.values())[0].keys()
 
+    """
+    @param text: a UI string in any supported locale
+    @return: set of (key, locale) pairs using this exact string
+    """
+    @staticmethod
+    def lookup(text):
+        return _REVERSE.get(text, set())
+
+    """
+    @param text: a UI string in any supported locale
+    @return: the logical key of the string, or None if it is not a known UI string
+    """
+    @staticmethod
+    def key_of(text):
+        for key, _ in _REVERSE.get(text, ()):
+            return key
+        return None
+
+    """
+    Find the marker (red packet, recalled message, ...) of any locale in text. "View more messages" only
+    matches the whole text, so a system notice quoting it is not mistaken for the button.
+    The substring markers are compiled into one regular expression, so the text is scanned once.
+    @return: the marker key, or None
+    """
+    @staticmethod
+    def find_marker(text):
+        if not text:
+            return None
+        key = _EXACT_MARKER_KEYS.get(text.strip().lower())
+        if key is not None:
+            return key
+        match = _MARKER_PATTERN.search(text)
+        if match is None:
+            return None
+        return _MARKER_KEYS[match.group(0).lower()]
+
+    """
+    Vote for the locale of a running WeChat client with the names of its controls.
+    All locales are probed at once: every control name is looked up in the reverse index a single time.
+    @param names: iterable of control names, e.g. window title and navigation buttons
+    @return: the best matching locale, or None if nothing matched
+    """
+    @staticmethod
+    def vote(names):
+        votes = dict.fromkeys(WeChatLocale.getSupportedLocales(), 0)
+        for name in names:
+            for _, locale in _REVERSE.get(name, ()):
+                votes[locale] += 1
+        best = max(votes, key=votes.get)
+        return best if votes[best] > 0 else None
+
+    """
+    Detect the locale of the running WeChat client by probing the top-level window title
+    and the controls below it. The result is cached per WeChat install.
+    @param install_path: path of the WeChat executable used as cache key, None to disable the cache
+    @param max_depth: how deep below the main window to collect anchor control names
+    @param window: the WeChat main window to probe, e.g. the window bound to one account when several
+                   are open; None to use the first WeChat window on the desktop
+    @return: the detected locale, or None if no WeChat window is found
+    """
+    @staticmethod
+    def detect(install_path=None, max_depth=8, window=None):
+        cache = _load_cache()
+        mtime = os.path.getmtime(install_path) if install_path and os.path.exists(install_path) else None
+        cached = cache.get(install_path) if install_path else None
+        if cached and cached.get("mtime") == mtime:
+            return cached["locale"]
+
+        import uiautomation as auto
+        import tree_dump
+
+        if window is None:
+            for control in auto.GetRootControl().GetChildren():
+                if WeChatLocale.key_of(control.Name) == "weixin":
+                    window = control
+                    break
+        if window is None:
+            return None
+
+        locale = WeChatLocale.vote(r["name"] for r in tree_dump.iter_tree(window, max_depth) if r["name"])
+        if locale is not None and install_path:
+            cache[install_path] = {"locale": locale, "mtime": mtime}
+            _save_cache(cache)
+        return locale
+
+
+def _load_cache():
+    try:
+        with open(WeChatLocale.CACHE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    os.makedirs(os.path.dirname(WeChatLocale.CACHE_PATH), exist_ok=True)
+    with open(WeChatLocale.CACHE_PATH, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=4)
+
+
+# per-locale attribute tables, built once at import instead of on every instantiation
+_TABLES = {locale: {key: value[locale] for key, value in WeChatLocale.MAPPING.items()}
+           for locale in WeChatLocale.getSupportedLocales()}
+
+# reverse index from UI string to the (key, locale) pairs using it
+_REVERSE = {}
+for _key, _values in WeChatLocale.MAPPING.items():
+    for _locale, _text in _values.items():
+        _REVERSE.setdefault(_text, set()).add((_key, _locale))
+
+_EXACT_MARKER_KEYS = {WeChatLocale.MAPPING[key][locale].lower(): key
+                      for key in WeChatLocale.EXACT_MARKERS for locale in WeChatLocale.getSupportedLocales()}
+_MARKER_KEYS = {WeChatLocale.MAPPING[key][locale].lower(): key
+                for key in WeChatLocale.MARKERS if key not in WeChatLocale.EXACT_MARKERS
+                for locale in WeChatLocale.getSupportedLocales()}
+_MARKER_PATTERN = re.compile("|".join(re.escape(text) for text in sorted(_MARKER_KEYS, key=len, reverse=True)),
+                             re.IGNORECASE)
+
 
 if __name__ == "__main__":
     print(WeChatLocale.getSupportedLocales())
 
     lc = WeChatLocale("zh-CN")
+    print(WeChatLocale.find_marker("收到红包，请在手机上查看"))
 
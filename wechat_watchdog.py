@@ -0,0 +1,176 @@
+"""
+微信的健康检查和空闲时的防掉线。
+以前的防掉线每隔固定时间重新打开微信并点击搜索框，批量发送进行中也会插进来；微信卡死或者退出登录时也没有任何提示，
+队列里的操作只能一个个失败。WeChatWatchdog 在自己的线程中定期做几项只读的检查：
+    - 窗口：微信主窗口是否存在
+    - 响应：读取窗口属性能否在 deadline 秒内返回，卡死的微信会让这一步超时
+    - 登录：窗口是否变成了登录窗口
+连续 failures 次检查失败时暂停 actuator 的执行（已提交的操作继续排队）并通过 on_change 发出提醒，检查恢复正常后继续执行。
+防掉线操作只在 actuator 空闲（没有正在执行和排队的操作）并且已经 keepalive_interval 秒没有任何界面操作时提交，
+有界面操作的时候微信本来就不会掉线。
+    watchdog = WeChatWatchdog(actuator, wechat, on_change=lambda healthy, reason: print(healthy, reason))
+    watchdog.start()
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# 微信退出登录后显示的登录窗口的类名
+LOGIN_WINDOW_CLASS = "WeChatLoginWndForPC"
+
+
+class WeChatWatchdog(threading.Thread):
+    def __init__(self, actuator, wechat, interval: float = 30, deadline: float = 5, failures: int = 2,
+                 keepalive_interval: Optional[float] = 3600, on_change: Callable[[bool, str], None] = None):
+        """
+        Args:
+            actuator: 执行界面操作的 UIActuator
+            wechat: WeChat 实例（不经过 actuator 的原对象）
+            interval: 两次检查之间的间隔（秒）
+            deadline: 读取窗口属性的时间上限（秒），超过时认为微信没有响应
+            failures: 连续多少次检查失败才认为微信异常，避免一次偶然的失败就暂停队列
+            keepalive_interval: 多久没有界面操作时执行一次防掉线操作（秒），None 代表不执行
+            on_change: 健康状态改变时调用 on_change(是否正常, 原因)
+        """
+        super().__init__(daemon=True, name="wechat-watchdog")
+        self.actuator = actuator
+        self.wechat = wechat
+        self.interval = interval
+        self.deadline = deadline
+        self.failures = failures
+        self.keepalive_interval = keepalive_interval
+        self.on_change = on_change
+        self.running = True
+        self.healthy = True
+        self.reason = ""
+        self.checks = 0
+        self.failed_checks = 0
+        self.keepalives = 0
+        self.last_latency = None
+        self._consecutive = 0
+        # 超时后仍然卡在微信里的检查线程，它返回之前不再开始新的检查
+        self._probe_thread = None
+        self._keepalive = None
+        self._stop = threading.Event()
+
+    def _read_window(self, result: Dict) -> None:
+        """在单独的线程中读取窗口状态，卡死时只会卡住这个线程"""
+        import uiautomation as auto
+
+        with auto.UIAutomationInitializerInThread():
+            try:
+                window = self.wechat.get_wechat()
+                if window is None or not window.Exists(0, 0):
+                    result["reason"] = "找不到微信窗口"
+                    return
+                start = time.perf_counter()
+                class_name = window.ClassName
+                window.Name
+                result["latency"] = time.perf_counter() - start
+                result["class_name"] = class_name
+            except Exception as e:
+                result["reason"] = f"读取微信窗口失败：{e}"
+
+    def probe(self) -> Tuple[bool, str]:
+        """
+        检查一次微信的状态
+        Return:
+            (是否正常, 异常的原因)
+        """
+        if self._probe_thread is not None and self._probe_thread.is_alive():
+            return False, f"微信超过 {self.deadline:g} 秒没有响应"
+
+        result = {}
+        self._probe_thread = threading.Thread(target=self._read_window, args=(result,), daemon=True,
+                                              name="wechat-watchdog-probe")
+        self._probe_thread.start()
+        self._probe_thread.join(self.deadline)
+        if self._probe_thread.is_alive():
+            return False, f"微信超过 {self.deadline:g} 秒没有响应"
+        if "reason" in result:
+            return False, result["reason"]
+        self.last_latency = result["latency"]
+        if result["class_name"] == LOGIN_WINDOW_CLASS:
+            return False, "微信已退出登录"
+        return True, ""
+
+    def check(self) -> bool:
+        """检查一次并更新健康状态，返回当前是否正常"""
+        ok, reason = self.probe()
+        self.checks += 1
+        if ok:
+            self._consecutive = 0
+            if not self.healthy:
+                self._set_health(True, "")
+        else:
+            self.failed_checks += 1
+            self._consecutive += 1
+            if self.healthy and self._consecutive >= self.failures:
+                self._set_health(False, reason)
+        return self.healthy
+
+    def _set_health(self, healthy: bool, reason: str) -> None:
+        if not self.running:
+            return
+        self.healthy = healthy
+        self.reason = reason
+        if healthy:
+            self.actuator.resume()
+        else:
+            self.actuator.pause(reason)
+        if self.on_change is not None:
+            try:
+                self.on_change(healthy, reason)
+            except Exception as e:
+                print(f"watchdog on_change failed: {e}")
+
+    def _idle(self) -> bool:
+        return self.actuator.current_source is None and not self.actuator.pending()
+
+    def keep_alive(self) -> None:
+        """
+        在空闲并且长时间没有界面操作时提交一次防掉线操作
+        """
+        if self.keepalive_interval is None or not self.healthy or not self._idle():
+            return
+        if self._keepalive is not None and not self._keepalive.done():
+            return
+        if time.time() - self.actuator.last_active < self.keepalive_interval:
+            return
+        self._keepalive = self.actuator.submit("watchdog", self._keep_alive)
+
+    def _keep_alive(self) -> bool:
+        # 提交之后其他来源有了新的操作时让出界面，这些操作本身就能防止掉线
+        if self.actuator.pending():
+            return False
+        self.wechat.prevent_offline()
+        self.keepalives += 1
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "healthy": self.healthy,
+            "reason": self.reason,
+            "checks": self.checks,
+            "failed_checks": self.failed_checks,
+            "keepalives": self.keepalives,
+            "last_latency": self.last_latency,
+            "idle_seconds": time.time() - self.actuator.last_active,
+        }
+
+    def stop(self) -> None:
+        self.running = False
+        self._stop.set()
+        # 不再检查之后不能让队列一直暂停
+        if not self.healthy:
+            self.healthy = True
+            self.actuator.resume()
+
+    def run(self):
+        while self.running:
+            try:
+                self.check()
+                self.keep_alive()
+            except Exception as e:
+                print(f"watchdog check failed: {e}")
+            self._stop.wait(self.interval)